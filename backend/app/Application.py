@@ -1,8 +1,13 @@
 from .services.VideosRepository import VideosRepository
 from .services.VideoFolderRepositoryFactory import VideoFolderRepositoryFactory
 from .translation.SignLlavaCache import SignLlavaCache
+from .services.VideoProcessingSettings import VideoProcessingSettings
+from .preprocessing.MediapipeWorkerPool import MediapipeWorkerPool
+from .preprocessing.MediapipeMemoryBudget import MediapipeMemoryBudget
+from .preprocessing.MediapipeChunkCache import MediapipeChunkCache
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 class Application:
     """
@@ -13,7 +18,8 @@ class Application:
     """
     def __init__(
         self,
-        storage_folder: Path
+        storage_folder: Path,
+        processing_settings: VideoProcessingSettings
     ):
         storage_folder.mkdir(parents=True, exist_ok=True)
         
@@ -25,7 +31,48 @@ class Application:
         )
         self.sign_llava_cache = SignLlavaCache()
 
+        self.processing_settings = processing_settings
+        "Configuration of the video processing pipeline"
+
         self.executor = ThreadPoolExecutor(
             max_workers=1
         )
         "Runs CPU-intensive tasks, such as video processing and LLM execution"
+
+        self.mediapipe_memory_budget: Optional[MediapipeMemoryBudget] = None
+        "Memory budget shared by the mediapipe workers of all videos, if set"
+        if processing_settings.mediapipe_memory_budget_mb > 0:
+            self.mediapipe_memory_budget = MediapipeMemoryBudget(
+                budget_bytes=(
+                    processing_settings.mediapipe_memory_budget_mb * 1024 ** 2
+                ),
+                worker_estimate_bytes=(
+                    processing_settings.mediapipe_worker_memory_mb * 1024 ** 2
+                )
+            )
+
+        self.mediapipe_worker_pool: Optional[MediapipeWorkerPool] = None
+        "Warm mediapipe workers shared by all videos, if enabled in settings"
+        if processing_settings.mediapipe_persistent_pool:
+            self.mediapipe_worker_pool = MediapipeWorkerPool(
+                worker_count=processing_settings.mediapipe_workers,
+                use_processes=processing_settings.mediapipe_processes,
+                max_jobs_per_worker=(
+                    processing_settings.mediapipe_recycle_after_jobs or None
+                ),
+                job_timeout_seconds=(
+                    processing_settings.mediapipe_job_timeout_seconds or None
+                ),
+                memory_budget=self.mediapipe_memory_budget
+            )
+            self.mediapipe_worker_pool.start()
+
+        self.mediapipe_chunk_cache: Optional[MediapipeChunkCache] = None
+        "Disk cache of mediapipe results shared by all videos, if enabled"
+        if processing_settings.mediapipe_cache_mb > 0:
+            self.mediapipe_chunk_cache = MediapipeChunkCache(
+                folder=storage_folder / "mediapipe_cache",
+                max_size_bytes=(
+                    processing_settings.mediapipe_cache_mb * 1024 ** 2
+                )
+            )
@@ -0,0 +1,133 @@
+from ..domain.VideoGeometry import VideoGeometry
+from typing import Dict, List, Iterator, Optional
+import numpy as np
+import struct
+import json
+
+
+GEOMETRY_PARTS = ["pose", "right_hand", "left_hand", "face"]
+"Landmark sets that can be requested from the geometry endpoint"
+
+BINARY_LANDMARK_DTYPES = ["float16", "float32"]
+
+BINARY_ALIGNMENT = 8
+"Arrays in the binary encoding start at offsets divisible by this"
+
+
+def select_geometry_arrays(
+    geometry: VideoGeometry,
+    parts: List[str],
+    face_step: int = 1
+) -> Dict[str, np.ndarray]:
+    """
+    Picks the arrays of the requested landmark sets (with their presence
+    masks and bounding boxes) plus the signing space. The face mesh can be
+    decimated to every face_step-th landmark.
+    """
+    arrays = {"sign_space": geometry.sign_space}
+    for part in parts:
+        landmarks = getattr(geometry, part + "_landmarks")
+        if part == "face" and face_step > 1:
+            landmarks = landmarks[:, ::face_step]
+        arrays[part + "_landmarks"] = landmarks
+        arrays[part + "_present"] = getattr(geometry, part + "_present")
+        if part != "pose":
+            arrays[part + "_bbox"] = getattr(geometry, part + "_bbox")
+            arrays[part + "_bbox_present"] = \
+                getattr(geometry, part + "_bbox_present")
+    return arrays
+
+
+def encode_geometry_json(arrays: Dict[str, np.ndarray]) -> Iterator[str]:
+    """
+    Yields a JSON list of frames in the FrameGeometry.to_json format,
+    with the landmark sets and boxes that were not selected set to null
+    """
+    def landmarks(name: str, i: int) -> Optional[list]:
+        if name + "_landmarks" not in arrays \
+        or not arrays[name + "_present"][i]:
+            return None
+        return arrays[name + "_landmarks"][i].astype(np.float64) \
+            .round(decimals=2).tolist()
+
+    def bbox(name: str, i: int) -> Optional[List[int]]:
+        if name + "_bbox" not in arrays or not arrays[name + "_bbox_present"][i]:
+            return None
+        return arrays[name + "_bbox"][i].tolist()
+
+    yield "["
+    for i in range(len(arrays["sign_space"])):
+        frame = json.dumps({
+            "pose_landmarks": landmarks("pose", i),
+            "right_hand_landmarks": landmarks("right_hand", i),
+            "left_hand_landmarks": landmarks("left_hand", i),
+            "face_landmarks": landmarks("face", i),
+            "sign_space": arrays["sign_space"][i].tolist(),
+            "right_hand_bbox": bbox("right_hand", i),
+            "left_hand_bbox": bbox("left_hand", i),
+            "face_bbox": bbox("face", i)
+        })
+        yield frame if i == 0 else ", " + frame
+    yield "]"
+
+
+def encode_geometry_binary(
+    arrays: Dict[str, np.ndarray],
+    start_frame: int,
+    landmark_dtype: str = "float32",
+    face_step: int = 1
+) -> bytes:
+    """
+    Encodes the arrays as typed arrays, so that a browser can view them
+    without parsing (e.g. as Float32Array). The layout is:
+
+    - uint32 (little-endian) byte length N of the header
+    - N bytes of the UTF-8 JSON header (padded with spaces, so that 4 + N
+      is divisible by 8): start_frame, frame_count, face_step and for each
+      array its dtype, shape and byte offset from the end of the header
+    - the arrays, C-ordered, little-endian, each at an offset divisible
+      by 8; landmarks in the requested dtype, bounding boxes and the sign
+      space as int32, presence masks as uint8
+    """
+    converted: Dict[str, np.ndarray] = {}
+    for name, array in arrays.items():
+        if name.endswith("_landmarks"):
+            dtype = landmark_dtype
+        elif str(array.dtype) == "bool":
+            dtype = "uint8"
+        else:
+            dtype = "int32"
+        converted[name] = np.ascontiguousarray(
+            array, dtype=np.dtype(dtype).newbyteorder("<")
+        )
+
+    def align(offset: int) -> int:
+        return -(-offset // BINARY_ALIGNMENT) * BINARY_ALIGNMENT
+
+    array_layout = {}
+    data_length = 0
+    for name, array in converted.items():
+        array_layout[name] = {
+            "dtype": str(array.dtype),
+            "shape": list(array.shape),
+            "offset": data_length
+        }
+        data_length = align(data_length + array.nbytes)
+    header_bytes = json.dumps({
+        "start_frame": start_frame,
+        "frame_count": len(arrays["sign_space"]),
+        "face_step": face_step,
+        "arrays": array_layout
+    }).encode("utf-8")
+
+    # pad the header with spaces, so that the data starts aligned
+    data_start = align(4 + len(header_bytes))
+    header_bytes = header_bytes.ljust(data_start - 4, b" ")
+
+    body = bytearray(data_start + data_length)
+    body[0:4] = struct.pack("<I", len(header_bytes))
+    body[4:data_start] = header_bytes
+    for name, array in converted.items():
+        offset = data_start + array_layout[name]["offset"]
+        body[offset:offset + array.nbytes] = array.tobytes()
+    return bytes(body)
@@ -4,6 +4,8 @@ from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app import __version__
 from .routers import videos
+from .application import ApplicationDependency
+from dataclasses import asdict
 
 
 description = """
@@ -34,4 +36,18 @@ def index():
         return f.read()
 
 
+@app.get("/health")
+def health(application: ApplicationDependency):
+    pool = application.mediapipe_worker_pool
+    if pool is None:
+        return {"mediapipe_worker_pool": None}
+    pool_health = pool.health()
+    return {
+        "mediapipe_worker_pool": {
+            **asdict(pool_health),
+            "is_healthy": pool_health.is_healthy
+        }
+    }
+
+
 app.include_router(videos.router, prefix="/videos", tags=["Videos"])
@@ -35,6 +35,7 @@ class VideoOut(BaseModel):
     created_at: datetime
     uploaded_file: Optional[VideoFileOut]
     normalized_file: Optional[VideoFileOut]
+    normalization_decision: Optional[str]
 
     @staticmethod
     def from_model(model: Video):
@@ -43,5 +44,9 @@ class VideoOut(BaseModel):
             title=model.title,
             created_at=model.created_at,
             uploaded_file=VideoFileOut.from_model(model.uploaded_file),
-            normalized_file=VideoFileOut.from_model(model.normalized_file)
+            normalized_file=VideoFileOut.from_model(model.normalized_file),
+            # videos stored before the field existed do not have it
+            normalization_decision=getattr(
+                model, "normalization_decision", None
+            )
         )
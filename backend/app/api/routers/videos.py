@@ -1,13 +1,15 @@
 from fastapi import APIRouter, HTTPException, UploadFile, HTTPException, \
     File, Form
 from fastapi.responses import FileResponse, StreamingResponse, Response
-from typing import List, Annotated
+from typing import List, Annotated, Optional
 import aiofiles
 import asyncio
 from ..models.VideoOut import VideoOut
 from ...domain.Video import Video
 from ...domain.VideoFile import VideoFile
 from ...domain.ClipsCollection import ClipsCollection
+from ...domain.ClipRecordStore import ClipRecordStore
+from ...domain.VideoGeometry import VideoGeometry
 from ..models.RetranslateClipRequest import RetranslateClipRequest
 from ..models.RetranslateClipResponse import RetranslateClipResponse
 from ..application import ApplicationDependency
@@ -18,14 +20,33 @@ import mimetypes
 from pathlib import Path
 from ...services.process_video import process_video
 from ...services.retranslate_clip import retranslate_clip
-import glob
+from ...video.FrameIndex import FrameIndex
+from ...video.FileFrameStream import FileFrameStream
+from ...video.PackedFrameStream import PackedFrameStream
+from ...video.FolderJpgFrameStream import FolderJpgFrameStream
+from ...video.crop_storage import packed_file_for
+from ...video.Frame import Frame
+from ...preprocessing.GeometryWriter import partial_geometry_file_for, \
+    read_partial_geometry
+from ..geometry_encoding import GEOMETRY_PARTS, BINARY_LANDMARK_DTYPES, \
+    select_geometry_arrays, encode_geometry_json, encode_geometry_binary
 import base64
+import json
+import itertools
+import cv2
 from ...follow_file import follow_file
 
 
 router = APIRouter()
 
 
+def encode_jpg(frame: Frame) -> bytes:
+    success, jpg = cv2.imencode(".jpg", frame.img)
+    if not success:
+        raise Exception("Encoding of the frame failed.")
+    return jpg.tobytes()
+
+
 def get_video_or_fail(video_id: str, app: ApplicationDependency) -> Video:
     """Fetches a video from the repository or throws a 404 error"""
     video = app.videos_repository.load(video_id)
@@ -105,19 +126,71 @@ def get_normalized_file(video_id: str, app: ApplicationDependency) -> VideoOut:
 def get_video_thumbnail(video_id: str, app: ApplicationDependency) -> VideoOut:
     video = get_video_or_fail(video_id, app)
     video_folder = app.video_folder_repository_factory.get_repository(video.id)
-    for cropped_frame_file in video_folder.CROPPED_IMAGES_FOLDER.glob("*.jpg"):
-        return FileResponse(
-            cropped_frame_file,
-            filename=f"{video_id}_thumbnail.jpg",
-            media_type="image/jpeg",
-            content_disposition_type="inline"
-        )
+
+    # packed crops are encoded on the fly
+    packed_file = packed_file_for(video_folder.CROPPED_IMAGES_FOLDER)
+    if packed_file.is_file():
+        stream = PackedFrameStream.open(packed_file)
+        try:
+            frame = stream.read_frame()
+        finally:
+            stream.close()
+        if frame is not None:
+            return Response(
+                content=encode_jpg(frame),
+                media_type="image/jpeg",
+                headers={
+                    "Content-Disposition":
+                        f'inline; filename="{video_id}_thumbnail.jpg"'
+                }
+            )
+
+    if FolderJpgFrameStream.exists(video_folder.CROPPED_IMAGES_FOLDER):
+        stream = FolderJpgFrameStream.open(video_folder.CROPPED_IMAGES_FOLDER)
+        for cropped_frame_file in stream.frame_paths()[:1]:
+            return FileResponse(
+                cropped_frame_file,
+                filename=f"{video_id}_thumbnail.jpg",
+                media_type="image/jpeg",
+                content_disposition_type="inline"
+            )
     raise HTTPException(
         status_code=404,
         detail="There is no thumbnail available for the video yet."
     )
 
 
+@router.get("/{video_id}/frames/{frame_index}")
+def get_video_frame(video_id: str, frame_index: int, app: ApplicationDependency):
+    video = get_video_or_fail(video_id, app)
+    video_folder = app.video_folder_repository_factory.get_repository(video.id)
+    if video.normalized_file is None \
+    or not video_folder.NORMALIZED_FILE.is_file():
+        raise HTTPException(
+            status_code=404,
+            detail="The video has not been normalized yet."
+        )
+    
+    # built lazily for videos normalized before the index existed
+    index = FrameIndex.load_or_build(
+        video_folder.NORMALIZED_FILE,
+        video_folder.FRAME_INDEX_FILE
+    )
+    if frame_index < 0 or frame_index >= len(index):
+        raise HTTPException(status_code=404, detail="No such frame.")
+
+    stream = FileFrameStream(video_folder.NORMALIZED_FILE, frame_index=index)
+    try:
+        stream.seek(frame_index)
+        frame = next(stream)
+    except StopIteration:
+        raise HTTPException(status_code=404, detail="No such frame.")
+    finally:
+        stream.close()
+
+    return Response(content=encode_jpg(frame), media_type="image/jpeg")
+
+
 @router.get("/{video_id}/log")
 async def get_video_log(video_id: str, app: ApplicationDependency) -> str:
     video = get_video_or_fail(video_id, app)
@@ -136,16 +209,81 @@ async def get_video_log(video_id: str, app: ApplicationDependency) -> str:
 
 
 @router.get("/{video_id}/geometry")
-def get_geometry(video_id: str, app: ApplicationDependency) -> VideoOut:
+def get_geometry(
+    video_id: str,
+    app: ApplicationDependency,
+    start: int = 0,
+    end: Optional[int] = None,
+    parts: str = ",".join(GEOMETRY_PARTS),
+    face_step: int = 1,
+    format: str = "json"
+):
+    """
+    Returns the geometry of the frames from start up to (excluding) end.
+    Parts is a comma-separated subset of the landmark sets (pose, right_hand,
+    left_hand, face), the others are omitted. The face mesh can be decimated
+    to every face_step-th landmark. The format is either "json" (a list
+    of frame geometry objects) or "float16"/"float32" for the binary
+    encoding with landmarks of that type (see encode_geometry_binary).
+    While mediapipe is still running, the frames processed so far
+    are returned and the X-Geometry-Complete header is "false".
+    """
+    part_list = [p for p in parts.split(",") if p != ""]
+    if any(p not in GEOMETRY_PARTS for p in part_list):
+        raise HTTPException(status_code=400, detail="Unknown geometry part.")
+    if format not in ["json"] + BINARY_LANDMARK_DTYPES:
+        raise HTTPException(status_code=400, detail="Unknown format.")
+    if start < 0 or face_step < 1 or (end is not None and end < start):
+        raise HTTPException(status_code=400, detail="Invalid frame range.")
+
     video = get_video_or_fail(video_id, app)
     video_folder = app.video_folder_repository_factory.get_repository(video.id)
-    file_path = video_folder.path("geometry.json")
-    if not file_path.is_file():
+    geometry_folder = video_folder.GEOMETRY_FOLDER
+    is_complete = True
+    if VideoGeometry.exists(geometry_folder):
+        geometry = VideoGeometry.load(geometry_folder)
+
+    # videos processed before the columnar geometry format
+    elif video_folder.GEOMETRY_FILE.is_file():
+        is_whole_file = start == 0 and end is None and face_step == 1 \
+            and format == "json" and set(part_list) == set(GEOMETRY_PARTS)
+        if is_whole_file:
+            return FileResponse(
+                video_folder.GEOMETRY_FILE, media_type="application/json"
+            )
+        geometry = VideoGeometry.load_json(video_folder.GEOMETRY_FILE)
+
+    # mediapipe is still running, return the frames processed so far
+    elif partial_geometry_file_for(geometry_folder).is_file():
+        is_complete = False
+        geometry = VideoGeometry.from_frame_geometries(list(
+            itertools.islice(read_partial_geometry(geometry_folder), end)
+        ))
+
+    else:
         raise HTTPException(
             status_code=404,
             detail="The video geometry has not been extracted yet."
         )
-    return FileResponse(file_path, media_type="application/json")
+
+    end = len(geometry) if end is None else min(end, len(geometry))
+    start = min(start, end)
+    arrays = select_geometry_arrays(
+        geometry.slice(start, end), part_list, face_step
+    )
+    headers = {"X-Geometry-Complete": "true" if is_complete else "false"}
+
+    if format == "json":
+        return StreamingResponse(
+            encode_geometry_json(arrays),
+            media_type="application/json",
+            headers=headers
+        )
+    return Response(
+        content=encode_geometry_binary(arrays, start, format, face_step),
+        media_type="application/octet-stream",
+        headers=headers
+    )
 
 
 @router.get("/{video_id}/cropped/{crop_name}")
@@ -155,20 +293,28 @@ def get_crops(video_id: str, crop_name: str, app: ApplicationDependency):
     video = get_video_or_fail(video_id, app)
     video_folder = app.video_folder_repository_factory.get_repository(video.id)
     folder_path = video_folder.path("cropped_" + crop_name)
-    if not folder_path.is_dir():
+
+    # build up the JSON response (because I couldn't get BSON to work)
+    packed_file = packed_file_for(folder_path)
+    if packed_file.is_file():
+        stream = PackedFrameStream.open(packed_file)
+        try:
+            return [
+                base64.b64encode(encode_jpg(frame)) for frame in stream
+            ]
+        finally:
+            stream.close()
+
+    if not FolderJpgFrameStream.exists(folder_path):
         raise HTTPException(
             status_code=404,
             detail="Request crops have not been extracted yet."
         )
     
-    # build up the JSON response (because I couldn't get BSON to work)
-    frame_files = sorted(glob.glob(
-        pathname="frame_*.jpg",
-        root_dir=folder_path
-    ))
+    stream = FolderJpgFrameStream.open(folder_path)
     return [
-        base64.b64encode(Path(folder_path, file).read_bytes())
-        for file in frame_files
+        base64.b64encode(frame_file.read_bytes())
+        for frame_file in stream.frame_paths()
     ]
 
 
@@ -176,7 +322,17 @@ def get_crops(video_id: str, crop_name: str, app: ApplicationDependency):
 def get_geometry(video_id: str, app: ApplicationDependency) -> VideoOut:
     video = get_video_or_fail(video_id, app)
     video_folder = app.video_folder_repository_factory.get_repository(video.id)
-    file_path = video_folder.path("clips_collection.json")
+
+    # read from the clip records, so clips show up translated one by one
+    if ClipRecordStore.exists(video_folder.CLIPS_FOLDER):
+        clips_collection = ClipRecordStore(video_folder.CLIPS_FOLDER).load()
+        return Response(
+            content=json.dumps(clips_collection.to_json()),
+            media_type="application/json"
+        )
+
+    # videos processed before the clip records
+    file_path = video_folder.CLIPS_COLLECTION_FILE
     if not file_path.is_file():
         raise HTTPException(
             status_code=404,
@@ -258,7 +414,11 @@ async def upload_new_video(
             video,
             app.videos_repository,
             video_folder,
-            app.sign_llava_cache
+            app.sign_llava_cache,
+            settings=app.processing_settings,
+            mediapipe_worker_pool=app.mediapipe_worker_pool,
+            mediapipe_memory_budget=app.mediapipe_memory_budget,
+            mediapipe_chunk_cache=app.mediapipe_chunk_cache
         )
     )
 
@@ -282,7 +442,11 @@ async def reprocess_video_endpoint(video_id: str, app: ApplicationDependency):
             app.videos_repository,
             video_folder,
             app.sign_llava_cache,
-            force_all=True
+            force_all=True,
+            settings=app.processing_settings,
+            mediapipe_worker_pool=app.mediapipe_worker_pool,
+            mediapipe_memory_budget=app.mediapipe_memory_budget,
+            mediapipe_chunk_cache=app.mediapipe_chunk_cache
         )
     )
 
@@ -299,22 +463,39 @@ async def retranslate_clip_endpoint(
     video = get_video_or_fail(video_id, app)
     video_folder = app.video_folder_repository_factory.get_repository(video.id)
 
-    clips_collection_file = video_folder.path("clips_collection.json")
-    if not clips_collection_file.exists():
+    if ClipRecordStore.exists(video_folder.CLIPS_FOLDER):
+        clip_store = ClipRecordStore(video_folder.CLIPS_FOLDER)
+        clip_count = clip_store.clip_count()
+        load_clip = clip_store.load_clip
+    elif video_folder.CLIPS_COLLECTION_FILE.exists():
+        # videos processed before the clip records
+        clips_collection = ClipsCollection.load(
+            video_folder.CLIPS_COLLECTION_FILE
+        )
+        clip_count = len(clips_collection.clips)
+        load_clip = lambda clip_index: clips_collection.clips[clip_index]
+    else:
         raise HTTPException(
             status_code=404,
             detail=f"The video has not yet beed sliced up into clips.",
         )
     
-    clips_collection = ClipsCollection.load(clips_collection_file)
-    if clip_id >= len(clips_collection.clips) or clip_id < 0:
+    if clip_id >= clip_count or clip_id < 0:
         raise HTTPException(
             status_code=404,
             detail=f"There is no clip with the given ID in the video.",
         )
     
-    clip = clips_collection.clips[clip_id]
-    
+    clip = load_clip(clip_id)
+
+    # skipped clips have no visual features computed
+    if clip.skip_reason is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"The clip was skipped ({clip.skip_reason}), "
+                "it has no visual features to translate.",
+        )
+
     # NOTE: here we DO await, beacuse we want to wait for the result
     llm_response = await asyncio.get_event_loop().run_in_executor(
         app.executor,
@@ -1,5 +1,6 @@
 import logging
 from .Application import Application
+from .services.VideoProcessingSettings import VideoProcessingSettings
 from pathlib import Path
 from dotenv import load_dotenv
 from .add_venv_bin_to_path import add_venv_bin_to_path
@@ -29,5 +30,6 @@ def bootstrap() -> Application:
 
     # create the instance    
     return Application(
-        storage_folder=storage_path
+        storage_folder=storage_path,
+        processing_settings=VideoProcessingSettings.from_environment()
     )
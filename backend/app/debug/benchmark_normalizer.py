@@ -0,0 +1,125 @@
+import os
+import time
+import argparse
+import ffmpeg
+from pathlib import Path
+from typing import Tuple
+from ..preprocessing.VideoNormalizer import VideoNormalizer, \
+    SEGMENTED_FILTER_GRAPH
+from ..add_venv_bin_to_path import add_venv_bin_to_path
+add_venv_bin_to_path()
+
+
+BENCHMARK_FOLDER = Path("models/ffmpeg/benchmark")
+
+
+def create_synthetic_video(duration_seconds: int, size: str) -> Path:
+    """Renders a test pattern video (or reuses an already rendered one)"""
+    file_path = BENCHMARK_FOLDER / f"synthetic_{size}_{duration_seconds}s.mp4"
+
+    if not file_path.exists():
+        print(f"Rendering {file_path}...")
+        (
+            ffmpeg
+            .input(
+                f"testsrc2=size={size}:rate=30:duration={duration_seconds}",
+                f="lavfi"
+            )
+            .output(
+                str(file_path),
+                pix_fmt="yuv420p",
+                vcodec="libx264",
+                preset="ultrafast",
+                g=60
+            )
+            .overwrite_output()
+            .global_args("-loglevel", "error")
+            .run()
+        )
+
+    return file_path
+
+
+def count_frames(video_path: Path) -> int:
+    probe = ffmpeg.probe(
+        str(video_path), select_streams="v:0", count_packets=None
+    )
+    return int(probe["streams"][0]["nb_read_packets"])
+
+
+def get_framerate(video_path: Path) -> str:
+    probe = ffmpeg.probe(str(video_path), select_streams="v:0")
+    return probe["streams"][0]["r_frame_rate"]
+
+
+def normalize(
+    input_path: Path,
+    segment_workers: int
+) -> Tuple[float, Path, str]:
+    """
+    Normalizes the video, returns the wall time in seconds, the output
+    and the transcoding path the normalizer took
+    """
+    output_path = input_path.with_suffix(f".normalized_{segment_workers}.mp4")
+    normalizer = VideoNormalizer(
+        input_video_path=str(input_path),
+        output_video_path=str(output_path),
+        fps_lower_bound=23,
+        fps_higher_bound=30,
+        allow_remux=False, # the synthetic videos would just be remuxed
+        segment_workers=segment_workers
+    )
+    start = time.perf_counter()
+    normalizer.process_video()
+    normalizer.close_output()
+    elapsed = time.perf_counter() - start
+    return elapsed, output_path, normalizer.transcoding_path
+
+
+def benchmark_normalizer(durations, sizes, workers):
+    BENCHMARK_FOLDER.mkdir(parents=True, exist_ok=True)
+
+    print(f"{'video':<34} {'serial':>9} {'parallel':>9} {'speedup':>8}")
+    for size in sizes:
+        for duration in durations:
+            video_path = create_synthetic_video(duration, size)
+            serial_time, serial_output, _ = normalize(video_path, 1)
+            parallel_time, parallel_output, parallel_path = normalize(
+                video_path, workers
+            )
+
+            # a fallback to the serial transcoding would be no comparison
+            assert parallel_path == SEGMENTED_FILTER_GRAPH, \
+                f"The parallel run fell back to {parallel_path}."
+
+            # the parallel output must be frame-exact with the serial one
+            assert count_frames(serial_output) == count_frames(parallel_output)
+            assert get_framerate(serial_output) == get_framerate(parallel_output)
+
+            print(
+                f"{video_path.name:<34} {serial_time:>8.1f}s " +
+                f"{parallel_time:>8.1f}s {serial_time / parallel_time:>7.2f}x"
+            )
+
+            serial_output.unlink()
+            parallel_output.unlink()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compares serial and segment-parallel normalization"
+    )
+    parser.add_argument(
+        "--durations", type=int, nargs="+", default=[120, 300, 600],
+        help="Lengths of the synthetic videos in seconds"
+    )
+    parser.add_argument(
+        "--sizes", nargs="+", default=["1280x720", "1920x1080"],
+        help="Resolutions of the synthetic videos"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() // 4 or 2,
+        help="Number of parallel segment transcoding processes"
+    )
+    args = parser.parse_args()
+    benchmark_normalizer(args.durations, args.sizes, args.workers)
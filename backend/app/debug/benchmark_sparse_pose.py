@@ -0,0 +1,166 @@
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+from typing import List, Tuple
+from ..preprocessing.sparse_pose import (
+    select_keyframes, interpolate_prediction, LANDMARK_KEYS
+)
+from .test_mediapipe import download_and_load_test_video
+
+
+sys.path.append("models/PoseEstimation")
+from predict_pose import predict_pose, create_mediapipe_models
+
+
+TEST_VIDEO_PATH = "checkpoints/PoseEstimation/testing-video.mp4"
+
+
+def load_frames(frame_count: int) -> List[np.ndarray]:
+    """Loads the first frames of the test video as RGB images"""
+    download_and_load_test_video() # makes sure the video is downloaded
+    video_capture = cv2.VideoCapture(TEST_VIDEO_PATH)
+    frames = []
+    while len(frames) < frame_count:
+        ok, frame = video_capture.read()
+        if not ok:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    video_capture.release()
+    return frames
+
+
+def run_sparse(
+    images: List[np.ndarray],
+    models,
+    chunk_length: int,
+    keyframe_interval: int,
+    motion_threshold: float
+) -> Tuple[dict, int]:
+    """Runs the sparse pose estimation chunk by chunk like the workers do"""
+    prediction = {}
+    keyframe_count = 0
+    for start in range(0, len(images), chunk_length):
+        chunk = images[start:start + chunk_length]
+        keyframes = select_keyframes(chunk, keyframe_interval, motion_threshold)
+        keyframe_count += len(keyframes)
+        chunk_prediction = interpolate_prediction(
+            predict_pose([chunk[i] for i in keyframes], models),
+            keyframes,
+            chunk
+        )
+        for key, values in chunk_prediction.items():
+            prediction.setdefault(key, []).extend(values)
+    return prediction, keyframe_count
+
+
+def landmark_error(reference: dict, prediction: dict, key: str):
+    """
+    Mean pixel distance of the landmarks (in pixel coordinates already)
+    over frames where both have them, and the fraction of frames where
+    the presence of the landmarks agrees
+    """
+    distances = []
+    agreements = []
+    for expected, actual in zip(reference["keypoints"], prediction["keypoints"]):
+        has_expected = expected[key] is not None and len(expected[key]) > 0
+        has_actual = actual[key] is not None and len(actual[key]) > 0
+        agreements.append(has_expected == has_actual)
+        if has_expected and has_actual:
+            delta = np.asarray(expected[key])[:, :2] \
+                - np.asarray(actual[key])[:, :2]
+            distances.append(np.linalg.norm(delta, axis=1).mean())
+    mean_distance = float(np.mean(distances)) if distances else float("nan")
+    return mean_distance, float(np.mean(agreements))
+
+
+def bbox_iou(reference: dict, prediction: dict, key: str) -> float:
+    """Mean intersection over union of the boxes present in both"""
+    ious = []
+    for a, b in zip(reference[key], prediction[key]):
+        if a is None or b is None or len(a) == 0 or len(b) == 0:
+            continue
+        width = min(a[2], b[2]) - max(a[0], b[0])
+        height = min(a[3], b[3]) - max(a[1], b[1])
+        intersection = max(0, width) * max(0, height)
+        union = (a[2] - a[0]) * (a[3] - a[1]) \
+            + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+        if union > 0:
+            ious.append(intersection / union)
+    return float(np.mean(ious)) if ious else float("nan")
+
+
+def benchmark_sparse_pose(
+    frame_count: int,
+    chunk_length: int,
+    intervals: List[int],
+    thresholds: List[float]
+):
+    print("Loading mediapipe models...")
+    models = create_mediapipe_models("checkpoints/PoseEstimation")
+    images = load_frames(frame_count)
+    image_size = (images[0].shape[1], images[0].shape[0])
+    print(f"Loaded {len(images)} frames of {image_size[0]}x{image_size[1]}")
+
+    start = time.perf_counter()
+    reference, _ = run_sparse(images, models, chunk_length, 1, 0)
+    full_time = time.perf_counter() - start
+
+    parts = [key.replace("_landmarks", "") for key in LANDMARK_KEYS]
+    print(
+        f"{'k':>3} {'motion':>6} {'keyfr.':>7} {'speedup':>8} " +
+        " ".join(f"{part + ' px':>15}" for part in parts) +
+        f" {'presence':>9} {'hand IoU':>9}"
+    )
+    for interval in intervals:
+        for threshold in thresholds:
+            start = time.perf_counter()
+            prediction, keyframe_count = run_sparse(
+                images, models, chunk_length, interval, threshold
+            )
+            sparse_time = time.perf_counter() - start
+
+            errors = [
+                landmark_error(reference, prediction, key)
+                for key in LANDMARK_KEYS
+            ]
+            hand_iou = np.nanmean([
+                bbox_iou(reference, prediction, "bbox_right_hand"),
+                bbox_iou(reference, prediction, "bbox_left_hand")
+            ])
+            print(
+                f"{interval:>3} {threshold:>6g} " +
+                f"{keyframe_count / len(images):>6.0%} " +
+                f"{full_time / sparse_time:>7.2f}x " +
+                " ".join(f"{error:>15.1f}" for error, _ in errors) +
+                f" {np.mean([agreement for _, agreement in errors]):>8.1%}" +
+                f" {hand_iou:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compares keyframe-sparse pose estimation " +
+            "with running mediapipe on every frame"
+    )
+    parser.add_argument(
+        "--frames", type=int, default=250,
+        help="Number of frames of the test video to process"
+    )
+    parser.add_argument(
+        "--chunk-length", type=int, default=25,
+        help="Frames per chunk (1 second at 25 fps, like the processor)"
+    )
+    parser.add_argument(
+        "--intervals", type=int, nargs="+", default=[2, 3, 5, 8],
+        help="Keyframe intervals to try"
+    )
+    parser.add_argument(
+        "--thresholds", type=float, nargs="+", default=[0, 12],
+        help="Motion thresholds to try (0 disables motion keyframes)"
+    )
+    args = parser.parse_args()
+    benchmark_sparse_pose(
+        args.frames, args.chunk_length, args.intervals, args.thresholds
+    )
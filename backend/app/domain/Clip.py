@@ -32,6 +32,12 @@ class Clip:
     embedding_neighbor_tokens_s2v: Optional[List[str]] = None
     "For each projected embedding, contains the closest textual token"
 
+    skip_reason: Optional[str] = None
+    """
+    Why the clip is skipped by the encoders and the translation
+    (e.g. "idle" when no one signs in it), None if it is processed
+    """
+
     @property
     def end_frame(self) -> int:
         """Index of the first frame after the last frame in the clip"""
@@ -52,6 +58,7 @@ class Clip:
             "embedding_neighbor_tokens_mae": self.embedding_neighbor_tokens_mae,
             "embedding_neighbor_tokens_dino": self.embedding_neighbor_tokens_dino,
             "embedding_neighbor_tokens_s2v": self.embedding_neighbor_tokens_s2v,
+            "skip_reason": self.skip_reason,
         }
     
     @staticmethod
@@ -79,4 +86,8 @@ class Clip:
             embedding_neighbor_tokens_mae=decode_neighbor("mae"),
             embedding_neighbor_tokens_dino=decode_neighbor("dino"),
             embedding_neighbor_tokens_s2v=decode_neighbor("s2v"),
+            skip_reason=(
+                None if json.get("skip_reason") is None
+                else str(json["skip_reason"])
+            ),
         )
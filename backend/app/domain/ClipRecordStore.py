@@ -0,0 +1,127 @@
+from .Clip import Clip
+from .ClipsCollection import ClipsCollection
+from typing import Optional
+from pathlib import Path
+import shutil
+import json
+import uuid
+import os
+
+
+CLIP_STORE_FORMAT_VERSION = 1
+LAYOUT_FILE_NAME = "layout.json"
+
+
+def _write_json_atomically(file: Path, json_data: dict):
+    """Readers see either the previous or the new content, never a part"""
+    temp_file = file.parent / (file.name + ".tmp")
+    with open(temp_file, "w") as f:
+        json.dump(json_data, f)
+    os.replace(temp_file, file)
+
+
+class ClipRecordStore:
+    """
+    Stores the clips of a video as a folder with one JSON record per clip,
+    so that a single clip (e.g. its translation) can be updated without
+    rewriting the others. Each record is replaced atomically.
+
+    The layout file holds the clip frame intervals and is written after
+    all the records, marking the store as complete.
+    """
+    def __init__(self, folder: Path):
+        self.folder = folder
+        "Folder with the layout file and the clip records"
+
+    @staticmethod
+    def exists(folder: Path) -> bool:
+        """True if the folder contains completely written clips"""
+        return (folder / LAYOUT_FILE_NAME).is_file()
+
+    def _record_file(self, clip_index: int) -> Path:
+        return self.folder / f"clip_{clip_index}.json"
+
+    def save(self, clips_collection: ClipsCollection):
+        """
+        Replaces all the clips previously stored in the folder; the new
+        clips are written into a temporary sibling folder first and then
+        renamed into place, so a failed save keeps the previous clips
+        """
+        self.folder.parent.mkdir(parents=True, exist_ok=True)
+        temp_folder = self.folder.parent / \
+            f".{self.folder.name}.{uuid.uuid4().hex}.tmp"
+        temp_folder.mkdir()
+        try:
+            temp_store = ClipRecordStore(temp_folder)
+            for clip in clips_collection.clips:
+                temp_store.save_clip(clip)
+
+            # the layout file marks the clips as complete
+            _write_json_atomically(temp_folder / LAYOUT_FILE_NAME, {
+                "version": CLIP_STORE_FORMAT_VERSION,
+                "clip_count": len(clips_collection.clips),
+                "clip_frame_intervals": [
+                    [start, end]
+                    for start, end in clips_collection.clip_frame_intervals
+                ]
+            })
+        except:
+            shutil.rmtree(temp_folder, ignore_errors=True)
+            raise
+
+        # a directory cannot be atomically replaced by another,
+        # so the previous clips are moved aside first
+        old_folder = None
+        if self.folder.exists():
+            old_folder = self.folder.parent / \
+                f".{self.folder.name}.{uuid.uuid4().hex}.old"
+            os.rename(self.folder, old_folder)
+        os.rename(temp_folder, self.folder)
+        if old_folder is not None:
+            shutil.rmtree(old_folder, ignore_errors=True)
+
+    def save_clip(self, clip: Clip):
+        """Atomically replaces the record of the clip"""
+        _write_json_atomically(
+            self._record_file(clip.clip_index), clip.to_json()
+        )
+
+    def load_clip(self, clip_index: int) -> Clip:
+        with open(self._record_file(clip_index), "r") as f:
+            return Clip.from_json(json.load(f))
+
+    def _load_layout(self) -> dict:
+        with open(self.folder / LAYOUT_FILE_NAME, "r") as f:
+            layout = json.load(f)
+        if layout["version"] != CLIP_STORE_FORMAT_VERSION:
+            raise Exception("Unsupported version of the clip store format.")
+        return layout
+
+    def clip_count(self) -> int:
+        return int(self._load_layout()["clip_count"])
+
+    def load(self) -> ClipsCollection:
+        """Reads the clips together with their latest updates"""
+        layout = self._load_layout()
+        return ClipsCollection.from_json({
+            "clips": [
+                self.load_clip(clip_index).to_json()
+                for clip_index in range(layout["clip_count"])
+            ],
+            "clip_frame_intervals": layout["clip_frame_intervals"]
+        })
+
+    @staticmethod
+    def load_any(
+        folder: Path,
+        legacy_json_file: Optional[Path] = None
+    ) -> ClipsCollection:
+        """
+        Loads the clips from the folder, falling back to the older
+        single JSON file for videos processed before the folder existed
+        """
+        if ClipRecordStore.exists(folder):
+            return ClipRecordStore(folder).load()
+        if legacy_json_file is not None and legacy_json_file.is_file():
+            return ClipsCollection.load(legacy_json_file)
+        raise Exception("The video has not yet been sliced up into clips.")
@@ -1,6 +1,8 @@
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from .Clip import Clip
+import numpy as np
+import bisect
 import json
 from pathlib import Path
 
@@ -12,32 +14,108 @@ class ClipsCollection:
     clips: List[Clip] = field(default_factory=lambda: [])
     "List of all clips ordered by their index"
 
-    clip_index_lookup: List[int] = field(default_factory=lambda: [])
-    "Mapping from frame index to clip index"
-    
+    clip_frame_intervals: List[Tuple[int, int]] = field(
+        default_factory=lambda: []
+    )
+    """
+    The [start, end) frames that map to each clip (by the clip index),
+    frames shared by overlapping clips belong to the later clip,
+    so an interval ends where the next clip starts
+    """
+
+    _interval_starts: List[int] = field(
+        default_factory=lambda: [], init=False, repr=False, compare=False
+    )
+
+    _clip_index_lookup: Optional[np.ndarray] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self._interval_starts = [
+            start for start, _ in self.clip_frame_intervals
+        ]
+        self._clip_index_lookup = None
+
+    @property
+    def frame_count(self) -> int:
+        """Number of frames covered by the clips"""
+        if len(self.clip_frame_intervals) == 0:
+            return 0
+        return self.clip_frame_intervals[-1][1]
+
     def clip_index_for_frame(self, frame_index: int) -> int:
-        return self.clip_index_lookup[frame_index]
+        if frame_index < 0 or frame_index >= self.frame_count:
+            raise IndexError("The frame is not covered by any clip.")
+        return bisect.bisect_right(self._interval_starts, frame_index) - 1
+
+    @property
+    def clip_index_lookup(self) -> np.ndarray:
+        """(T,) mapping from frame index to clip index, built lazily"""
+        if self._clip_index_lookup is None:
+            lengths = [end - start for start, end in self.clip_frame_intervals]
+            self._clip_index_lookup = np.repeat(
+                np.arange(len(lengths), dtype=np.int32), lengths
+            )
+        return self._clip_index_lookup
 
     def recompute_lookup_table(self):
-        lookup = []
-        for clip_index, clip in enumerate(self.clips):
-            assert clip.start_frame == len(lookup), "Clips don't meet properly"
-            lookup += [clip_index] * clip.frame_count
-        self.clip_index_lookup = lookup
+        intervals = []
+        for clip in self.clips:
+            if len(intervals) > 0:
+                previous_start, previous_end = intervals[-1]
+                assert clip.start_frame <= previous_end, \
+                    "Clips don't meet properly"
+                assert clip.end_frame >= previous_end, \
+                    "Clips don't meet properly"
+                assert clip.start_frame >= previous_start, \
+                    "Clips don't meet properly"
+                # overlap with the previous clip
+                intervals[-1] = (previous_start, clip.start_frame)
+            else:
+                assert clip.start_frame == 0, "Clips don't meet properly"
+            intervals.append((clip.start_frame, clip.end_frame))
+        self.clip_frame_intervals = intervals
+        self.__post_init__()
+
+    def get_skipped_frames(self) -> np.ndarray:
+        """
+        (T,) mask of frames that belong to skipped clips only,
+        they need no visual features
+        """
+        is_skipped = np.ones(self.frame_count, dtype=bool)
+        for clip in self.clips:
+            if clip.skip_reason is None:
+                is_skipped[clip.start_frame:clip.end_frame] = False
+        return is_skipped
 
     def to_json(self) -> dict:
         return {
             "clips": [clip.to_json() for clip in self.clips],
-            "clip_index_lookup": self.clip_index_lookup
+            "clip_frame_intervals": [
+                [start, end] for start, end in self.clip_frame_intervals
+            ]
         }
-    
+
     @staticmethod
     def from_json(json_data: dict) -> "ClipsCollection":
+        if "clip_frame_intervals" in json_data:
+            intervals = [
+                (int(start), int(end))
+                for start, end in json_data["clip_frame_intervals"]
+            ]
+        else:
+            # older files store the clip index of every frame
+            lookup = np.asarray(json_data["clip_index_lookup"], dtype=np.int64)
+            clip_indices = np.arange(len(json_data["clips"]))
+            starts = np.searchsorted(lookup, clip_indices, side="left")
+            ends = np.searchsorted(lookup, clip_indices, side="right")
+            intervals = list(zip(starts.tolist(), ends.tolist()))
         return ClipsCollection(
             clips=[Clip.from_json(clip) for clip in json_data["clips"]],
-            clip_index_lookup=json_data["clip_index_lookup"]
+            clip_frame_intervals=intervals
         )
-    
+
     def store(self, file: Path):
         with open(file, "w") as f:
             json_data = self.to_json()
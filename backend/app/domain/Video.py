@@ -39,3 +39,9 @@ class Video:
     This is set to true when video processing begins and back to false when
     processing finishes. It controls the processing log following.
     """
+
+    normalization_decision: Optional[str] = None
+    """
+    Whether the normalized file was remuxed from the upload or transcoded
+    (see VideoNormalizer). Is None until the video has been normalized.
+    """
@@ -0,0 +1,300 @@
+from dataclasses import dataclass, fields
+from .FrameGeometry import FrameGeometry
+from typing import List, Iterable, Optional, Dict
+from pathlib import Path
+import numpy as np
+import shutil
+import json
+import os
+
+
+GEOMETRY_FORMAT_VERSION = 1
+META_FILE_NAME = "meta.json"
+
+
+def _landmarks_or_none(
+    landmarks: np.ndarray,
+    is_present: np.bool_
+) -> Optional[np.ndarray]:
+    if not is_present:
+        return None
+    return np.array(landmarks, dtype=np.float64)
+
+
+def _bbox_or_none(bbox: np.ndarray, is_present: np.bool_) -> Optional[List[int]]:
+    if not is_present:
+        return None
+    return [int(i) for i in bbox]
+
+
+@dataclass
+class VideoGeometry:
+    """
+    Geometry of all the frames of a video (see FrameGeometry), stored
+    column-wise: one array per attribute with frames along the first axis.
+    Missing landmarks and bounding boxes are zeros, with their presence
+    given by the boolean mask arrays.
+
+    It is stored as a folder of .npy files (one per attribute), which are
+    memory-mapped when loaded, so that a frame range can be sliced out
+    without reading (or parsing) the rest of the video.
+    """
+
+    pose_landmarks: np.ndarray
+    "(T, 33, 4) float32 pose landmarks, see FrameGeometry.pose_landmarks"
+
+    right_hand_landmarks: np.ndarray
+    "(T, 21, 4) float32 right hand landmarks"
+
+    left_hand_landmarks: np.ndarray
+    "(T, 21, 4) float32 left hand landmarks"
+
+    face_landmarks: np.ndarray
+    "(T, 478, 4) float32 face mesh landmarks"
+
+    pose_present: np.ndarray
+    "(T,) bool, whether the pose was detected in the frame"
+
+    right_hand_present: np.ndarray
+    "(T,) bool, whether the right hand was detected in the frame"
+
+    left_hand_present: np.ndarray
+    "(T,) bool, whether the left hand was detected in the frame"
+
+    face_present: np.ndarray
+    "(T,) bool, whether the face was detected in the frame"
+
+    sign_space: np.ndarray
+    "(T, 4) int32 signing space rectangles [X_min, Y_min, X_max, Y_max]"
+
+    right_hand_bbox: np.ndarray
+    "(T, 4) int32 right hand bounding boxes"
+
+    left_hand_bbox: np.ndarray
+    "(T, 4) int32 left hand bounding boxes"
+
+    face_bbox: np.ndarray
+    "(T, 4) int32 face bounding boxes"
+
+    right_hand_bbox_present: np.ndarray
+    "(T,) bool, whether the right hand bounding box exists"
+
+    left_hand_bbox_present: np.ndarray
+    "(T,) bool, whether the left hand bounding box exists"
+
+    face_bbox_present: np.ndarray
+    "(T,) bool, whether the face bounding box exists"
+
+    # shape of a single frame and dtype of each array
+    ARRAY_SPECS = {
+        "pose_landmarks": ((33, 4), "float32"),
+        "right_hand_landmarks": ((21, 4), "float32"),
+        "left_hand_landmarks": ((21, 4), "float32"),
+        "face_landmarks": ((478, 4), "float32"),
+        "pose_present": ((), "bool"),
+        "right_hand_present": ((), "bool"),
+        "left_hand_present": ((), "bool"),
+        "face_present": ((), "bool"),
+        "sign_space": ((4,), "int32"),
+        "right_hand_bbox": ((4,), "int32"),
+        "left_hand_bbox": ((4,), "int32"),
+        "face_bbox": ((4,), "int32"),
+        "right_hand_bbox_present": ((), "bool"),
+        "left_hand_bbox_present": ((), "bool"),
+        "face_bbox_present": ((), "bool"),
+    }
+
+    def __post_init__(self):
+        frame_count = len(self.pose_landmarks)
+        for name, (frame_shape, dtype) in VideoGeometry.ARRAY_SPECS.items():
+            array: np.ndarray = getattr(self, name)
+            assert array.shape == (frame_count, *frame_shape), name
+            assert str(array.dtype) == dtype, name
+
+    def __len__(self) -> int:
+        return self.pose_landmarks.shape[0]
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    # construction
+
+    @staticmethod
+    def allocate(frame_count: int) -> "VideoGeometry":
+        """Creates in-memory geometry of the given length, with nothing present"""
+        return VideoGeometry(**{
+            name: np.zeros((frame_count, *frame_shape), dtype=dtype)
+            for name, (frame_shape, dtype) in VideoGeometry.ARRAY_SPECS.items()
+        })
+
+    @staticmethod
+    def from_frame_geometries(
+        frame_geometries: List[FrameGeometry]
+    ) -> "VideoGeometry":
+        geometry = VideoGeometry.allocate(len(frame_geometries))
+        for i, frame_geometry in enumerate(frame_geometries):
+            geometry.set_frame(i, frame_geometry)
+        return geometry
+
+    def set_frame(self, frame_index: int, frame_geometry: FrameGeometry):
+        """Stores a single frame geometry at the given index"""
+        i = frame_index
+        g = frame_geometry
+
+        def set_landmarks(name: str, landmarks: Optional[np.ndarray]):
+            getattr(self, name + "_present")[i] = landmarks is not None
+            getattr(self, name + "_landmarks")[i] = (
+                0 if landmarks is None else landmarks
+            )
+
+        def set_bbox(name: str, bbox: Optional[List[int]]):
+            getattr(self, name + "_bbox_present")[i] = bbox is not None
+            getattr(self, name + "_bbox")[i] = 0 if bbox is None else bbox
+
+        set_landmarks("pose", g.pose_landmarks)
+        set_landmarks("right_hand", g.right_hand_landmarks)
+        set_landmarks("left_hand", g.left_hand_landmarks)
+        set_landmarks("face", g.face_landmarks)
+        self.sign_space[i] = g.sign_space
+        set_bbox("right_hand", g.right_hand_bbox)
+        set_bbox("left_hand", g.left_hand_bbox)
+        set_bbox("face", g.face_bbox)
+
+    # access
+
+    def slice(self, start_frame: int, end_frame: int) -> "VideoGeometry":
+        """Geometry of the given frame range, the arrays are views (no copy)"""
+        return VideoGeometry(**{
+            name: array[start_frame:end_frame]
+            for name, array in self._arrays().items()
+        })
+
+    def frame(self, frame_index: int) -> FrameGeometry:
+        """Builds the FrameGeometry object of a single frame"""
+        i = frame_index
+        return FrameGeometry(
+            pose_landmarks=_landmarks_or_none(
+                self.pose_landmarks[i], self.pose_present[i]
+            ),
+            right_hand_landmarks=_landmarks_or_none(
+                self.right_hand_landmarks[i], self.right_hand_present[i]
+            ),
+            left_hand_landmarks=_landmarks_or_none(
+                self.left_hand_landmarks[i], self.left_hand_present[i]
+            ),
+            face_landmarks=_landmarks_or_none(
+                self.face_landmarks[i], self.face_present[i]
+            ),
+            sign_space=[int(v) for v in self.sign_space[i]],
+            right_hand_bbox=_bbox_or_none(
+                self.right_hand_bbox[i], self.right_hand_bbox_present[i]
+            ),
+            left_hand_bbox=_bbox_or_none(
+                self.left_hand_bbox[i], self.left_hand_bbox_present[i]
+            ),
+            face_bbox=_bbox_or_none(
+                self.face_bbox[i], self.face_bbox_present[i]
+            )
+        )
+
+    def to_frame_geometries(self) -> List[FrameGeometry]:
+        return [self.frame(i) for i in range(len(self))]
+
+    # storage
+
+    @staticmethod
+    def exists(folder: Path) -> bool:
+        """True if the folder contains completely written geometry"""
+        return (folder / META_FILE_NAME).is_file()
+
+    def save(self, folder: Path):
+        VideoGeometry.write(folder, len(self), (
+            self.frame(i) for i in range(len(self))
+        ))
+
+    @staticmethod
+    def write(
+        folder: Path,
+        frame_count: int,
+        frame_geometries: Iterable[FrameGeometry]
+    ):
+        """
+        Writes the geometry of the given number of frames into the folder,
+        consuming the frames one by one, so the whole video does not have
+        to be in memory. Replaces any geometry previously stored there.
+        """
+        if folder.exists():
+            shutil.rmtree(folder)
+        folder.mkdir(parents=True)
+
+        geometry = VideoGeometry(**{
+            name: np.lib.format.open_memmap(
+                folder / (name + ".npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(frame_count, *frame_shape)
+            )
+            for name, (frame_shape, dtype) in VideoGeometry.ARRAY_SPECS.items()
+        })
+
+        written_frames = 0
+        for i, frame_geometry in enumerate(frame_geometries):
+            geometry.set_frame(i, frame_geometry)
+            written_frames += 1
+        if written_frames != frame_count:
+            raise Exception("The number of geometry frames does not match.")
+
+        for array in geometry._arrays().values():
+            array.flush()
+        del geometry
+
+        # the meta file marks the geometry as complete
+        meta_file = folder / META_FILE_NAME
+        temp_file = folder / (META_FILE_NAME + ".tmp")
+        with open(temp_file, "w") as f:
+            json.dump({
+                "version": GEOMETRY_FORMAT_VERSION,
+                "frame_count": frame_count
+            }, f)
+        os.replace(temp_file, meta_file)
+
+    @staticmethod
+    def load(folder: Path, memory_map=True) -> "VideoGeometry":
+        """
+        Loads the geometry, by default memory-mapped, so only the frames
+        that are accessed get read from the disk
+        """
+        with open(folder / META_FILE_NAME, "r") as f:
+            meta = json.load(f)
+        if meta["version"] != GEOMETRY_FORMAT_VERSION:
+            raise Exception("Unsupported version of the geometry format.")
+
+        return VideoGeometry(**{
+            name: np.load(
+                folder / (name + ".npy"),
+                mmap_mode="r" if memory_map else None
+            )
+            for name in VideoGeometry.ARRAY_SPECS.keys()
+        })
+
+    @staticmethod
+    def load_json(geometry_file: Path) -> "VideoGeometry":
+        """Loads geometry stored in the older JSON format"""
+        return VideoGeometry.from_frame_geometries(
+            FrameGeometry.list_from_json(geometry_file)
+        )
+
+    @staticmethod
+    def load_any(
+        folder: Path,
+        legacy_json_file: Optional[Path] = None
+    ) -> "VideoGeometry":
+        """
+        Loads the geometry from the folder, falling back to the older
+        JSON format file for videos processed before the folder existed
+        """
+        if VideoGeometry.exists(folder):
+            return VideoGeometry.load(folder)
+        if legacy_json_file is not None and legacy_json_file.is_file():
+            return VideoGeometry.load_json(legacy_json_file)
+        raise Exception("The video geometry has not been extracted yet.")
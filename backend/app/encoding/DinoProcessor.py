@@ -1,10 +1,13 @@
 import torch
 import sys
 from pathlib import Path
-from ..video.FolderJpgFrameStream import FolderJpgFrameStream
+from ..video.crop_storage import open_crop_stream
 from ..video.FrameStreamChunker import FrameStreamChunker
 from ..domain.VideoVisualFeatures \
     import VideoVisualFeatures, DINO_FEATURES_DIMENSION
+from ..domain.VideoGeometry import VideoGeometry
+from ..domain.ClipRecordStore import ClipRecordStore
+from typing import Dict, List, Optional
 import numpy as np
 import logging
 
@@ -18,6 +21,41 @@ DINO_FACE_CHECKPOINT = \
 DINO_HAND_CHECKPOINT = \
     "checkpoints/DINOv2/hand_dinov2_vits14_reg_teacher_checkpoint.pth"
 
+ABSENT_CROP = np.zeros(shape=(56, 56, 3), dtype=np.uint8)
+"The crop stored for frames where the hand or the face was not detected"
+
+_absent_embeddings: Dict[str, np.ndarray] = {}
+"Embedding of the absent crop, computed once per checkpoint"
+
+
+def get_absent_embedding(checkpoint: str, model, device) -> np.ndarray:
+    if checkpoint not in _absent_embeddings:
+        _absent_embeddings[checkpoint] = predict_dino.dino_predict(
+            [ABSENT_CROP], model, predict_dino.transform_dino, device
+        )[0]
+    return _absent_embeddings[checkpoint]
+
+
+def predict_present(
+    images: List[np.ndarray],
+    is_present: np.ndarray,
+    absent_embedding: np.ndarray,
+    model,
+    device
+) -> np.ndarray:
+    """
+    Runs DINO only on the images where the part was detected,
+    the other frames get the absent embedding
+    """
+    features = np.tile(absent_embedding, (len(images), 1))
+    present_indices = np.nonzero(is_present)[0]
+    if len(present_indices) > 0:
+        features[present_indices] = predict_dino.dino_predict(
+            [images[i] for i in present_indices], model,
+            predict_dino.transform_dino, device
+        )
+    return features
+
 
 class DinoProcessor:
     def __init__(
@@ -28,7 +66,11 @@ class DinoProcessor:
         cropped_right_hand_folder: Path,
         dino_features_file: Path,
         logger: logging.Logger,
-        batching_period_seconds=1.0
+        batching_period_seconds=1.0,
+        geometry_folder: Optional[Path] = None,
+        legacy_geometry_file: Optional[Path] = None,
+        clips_folder: Optional[Path] = None,
+        legacy_clips_file: Optional[Path] = None
     ):
         self.device = device
         self.cropped_face_folder = cropped_face_folder
@@ -38,21 +80,40 @@ class DinoProcessor:
         self.logger = logger
         self.batching_period_seconds = batching_period_seconds
 
+        self.geometry_folder = geometry_folder
+        """
+        Geometry of the video, telling which frames contain the hands
+        and the face. Without it, DINO runs on all the frames.
+        """
+
+        self.legacy_geometry_file = legacy_geometry_file
+
+        self.clips_folder = clips_folder
+        "Clips of the video, frames of the skipped clips are not DINOed"
+
+        self.legacy_clips_file = legacy_clips_file
+
     def run(self):
         self.logger.info("Loading the DINO models...")
         face_model = predict_dino.create_dino_model(DINO_FACE_CHECKPOINT)
         hand_model = predict_dino.create_dino_model(DINO_HAND_CHECKPOINT)
         face_model.to(self.device)
         hand_model.to(self.device)
+        face_absent = get_absent_embedding(
+            DINO_FACE_CHECKPOINT, face_model, self.device
+        )
+        hand_absent = get_absent_embedding(
+            DINO_HAND_CHECKPOINT, hand_model, self.device
+        )
 
-        # load the cropped images folder
-        cropped_face_stream = FolderJpgFrameStream.open(
+        # open the cropped images storage
+        cropped_face_stream = open_crop_stream(
             self.cropped_face_folder
         )
-        cropped_left_hand_stream = FolderJpgFrameStream.open(
+        cropped_left_hand_stream = open_crop_stream(
             self.cropped_left_hand_folder
         )
-        cropped_right_hand_stream = FolderJpgFrameStream.open(
+        cropped_right_hand_stream = open_crop_stream(
             self.cropped_right_hand_folder
         )
 
@@ -61,6 +122,36 @@ class DinoProcessor:
         assert len(cropped_left_hand_stream) == total_frames
         assert len(cropped_right_hand_stream) == total_frames
 
+        # which frames contain the parts, frames without them are not DINOed
+        if self.geometry_folder is not None:
+            geometry = VideoGeometry.load_any(
+                self.geometry_folder, self.legacy_geometry_file
+            )
+            assert len(geometry) == total_frames
+            face_present = geometry.face_bbox_present
+            left_hand_present = geometry.left_hand_bbox_present
+            right_hand_present = geometry.right_hand_bbox_present
+        else:
+            face_present = np.ones(total_frames, dtype=bool)
+            left_hand_present = face_present
+            right_hand_present = face_present
+        if self.clips_folder is not None:
+            clips_collection = ClipRecordStore.load_any(
+                self.clips_folder, self.legacy_clips_file
+            )
+            assert clips_collection.frame_count == total_frames
+            is_processed = ~clips_collection.get_skipped_frames()
+            face_present = face_present & is_processed
+            left_hand_present = left_hand_present & is_processed
+            right_hand_present = right_hand_present & is_processed
+        self.logger.info(
+            f"DINO skips {np.sum(~face_present)} faces, " +
+            f"{np.sum(~left_hand_present)} left " +
+            f"and {np.sum(~right_hand_present)} right hands " +
+            f"of {total_frames} frames, as they were not detected " +
+            "or belong to skipped clips."
+        )
+
         # prepare the output matrix
         visual_features = VideoVisualFeatures(
             dino_features=np.zeros(
@@ -73,15 +164,18 @@ class DinoProcessor:
         self.logger.info("Processing frames with DINO...")
         face_chunker = FrameStreamChunker(
             in_stream=cropped_face_stream,
-            target_clip_length_seconds=self.batching_period_seconds
+            target_clip_length_seconds=self.batching_period_seconds,
+            reused_buffer_count=1
         )
         left_hand_chunker = FrameStreamChunker(
             in_stream=cropped_left_hand_stream,
-            target_clip_length_seconds=self.batching_period_seconds
+            target_clip_length_seconds=self.batching_period_seconds,
+            reused_buffer_count=1
         )
         right_hand_chunker = FrameStreamChunker(
             in_stream=cropped_right_hand_stream,
-            target_clip_length_seconds=self.batching_period_seconds
+            target_clip_length_seconds=self.batching_period_seconds,
+            reused_buffer_count=1
         )
         chunk_start_frame = 0
         for face_chunk_stream, left_hand_chunk_stream, right_hand_chunk_stream \
@@ -89,35 +183,42 @@ class DinoProcessor:
             face_images = [frame.img for frame in face_chunk_stream]
             left_hand_images = [frame.img for frame in left_hand_chunk_stream]
             right_hand_images = [frame.img for frame in right_hand_chunk_stream]
-            
-            face_features = predict_dino.dino_predict(
-                face_images, face_model,
-                predict_dino.transform_dino, self.device
+
+            chunk_size = len(face_chunk_stream)
+            assert chunk_size == len(left_hand_chunk_stream)
+            assert chunk_size == len(right_hand_chunk_stream)
+
+            frame_from = chunk_start_frame
+            frame_to = chunk_start_frame + chunk_size
+
+            face_features = predict_present(
+                face_images, face_present[frame_from:frame_to],
+                face_absent, face_model, self.device
             )
-            left_features = predict_dino.dino_predict(
-                left_hand_images, hand_model,
-                predict_dino.transform_dino, self.device
+            left_features = predict_present(
+                left_hand_images, left_hand_present[frame_from:frame_to],
+                hand_absent, hand_model, self.device
             )
-            right_features = predict_dino.dino_predict(
-                right_hand_images, hand_model,
-                predict_dino.transform_dino, self.device
+            right_features = predict_present(
+                right_hand_images, right_hand_present[frame_from:frame_to],
+                hand_absent, hand_model, self.device
             )
             chunk_features = np.concatenate(
                 [face_features, left_features, right_features],
                 1
             )
 
-            chunk_size = len(face_chunk_stream)
-            assert chunk_size == len(left_hand_chunk_stream)
-            assert chunk_size == len(right_hand_chunk_stream)
-
-            frame_from = chunk_start_frame
-            frame_to = chunk_start_frame + chunk_size
             visual_features.dino_features[frame_from:frame_to] = chunk_features
             self.logger.info(f"Frames {frame_from}-{frame_to} were DINOed.")
 
             # update the state
             chunk_start_frame += chunk_size
+            face_chunk_stream.release()
+            left_hand_chunk_stream.release()
+            right_hand_chunk_stream.release()
+        cropped_face_stream.close()
+        cropped_left_hand_stream.close()
+        cropped_right_hand_stream.close()
 
         # save the features data
         visual_features.save_dino(self.dino_features_file)
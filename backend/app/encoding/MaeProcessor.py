@@ -1,10 +1,12 @@
 import torch
 import sys
 from pathlib import Path
-from ..video.FolderJpgFrameStream import FolderJpgFrameStream
+from ..video.crop_storage import open_crop_stream
 from ..video.FrameStreamChunker import FrameStreamChunker
 from ..domain.VideoVisualFeatures \
     import VideoVisualFeatures, MAE_FEATURES_DIMENSION
+from ..domain.ClipRecordStore import ClipRecordStore
+from typing import Optional
 import numpy as np
 import logging
 
@@ -25,6 +27,8 @@ class MaeProcessor:
         mae_features_file: Path,
         logger: logging.Logger,
         batching_period_seconds=1.0,
+        clips_folder: Optional[Path] = None,
+        legacy_clips_file: Optional[Path] = None
     ):
         self.device = device
         self.cropped_images_folder = cropped_images_folder
@@ -32,17 +36,38 @@ class MaeProcessor:
         self.logger = logger
         self.batching_period_seconds = batching_period_seconds
 
+        self.clips_folder = clips_folder
+        """
+        Clips of the video, frames of the skipped clips are not MAE'd
+        and get zero features. Without it, MAE runs on all the frames.
+        """
+
+        self.legacy_clips_file = legacy_clips_file
+
     def run(self):
         self.logger.info("Loading the MAE model...")
         model = predict_mae.create_mae_model(MAE_ARCHITECTURE, MAE_CHECKPOINT)
         model = model.to(self.device)
 
-        # load the cropped images folder
-        cropped_images_stream = FolderJpgFrameStream.open(
+        # open the cropped images storage
+        cropped_images_stream = open_crop_stream(
             self.cropped_images_folder
         )
         total_frames: int = len(cropped_images_stream)
 
+        if self.clips_folder is not None:
+            clips_collection = ClipRecordStore.load_any(
+                self.clips_folder, self.legacy_clips_file
+            )
+            assert clips_collection.frame_count == total_frames
+            is_skipped = clips_collection.get_skipped_frames()
+        else:
+            is_skipped = np.zeros(total_frames, dtype=bool)
+        self.logger.info(
+            f"MAE skips {np.sum(is_skipped)} of {total_frames} frames, " +
+            "as they belong to skipped clips."
+        )
+
         # prepare the output matrix
         visual_features = VideoVisualFeatures(
             mae_features=np.zeros(
@@ -55,26 +80,32 @@ class MaeProcessor:
         self.logger.info("Processing frames with MAE...")
         chunker = FrameStreamChunker(
             in_stream=cropped_images_stream,
-            target_clip_length_seconds=self.batching_period_seconds
+            target_clip_length_seconds=self.batching_period_seconds,
+            reused_buffer_count=1
         )
         chunk_start_frame = 0
         for chunk_stream in chunker:
-            images = [frame.img for frame in chunk_stream]
-            chunk_features = predict_mae.mae_predict(
-                images,
-                model,
-                predict_mae.transform_mae,
-                self.device
-            )
-
             chunk_size = len(chunk_stream)
             frame_from = chunk_start_frame
             frame_to = chunk_start_frame + chunk_size
-            visual_features.mae_features[frame_from:frame_to] = chunk_features
+
+            images = [frame.img for frame in chunk_stream]
+            processed_indices = np.nonzero(~is_skipped[frame_from:frame_to])[0]
+            if len(processed_indices) > 0:
+                chunk_features = predict_mae.mae_predict(
+                    [images[i] for i in processed_indices],
+                    model,
+                    predict_mae.transform_mae,
+                    self.device
+                )
+                visual_features.mae_features[frame_from + processed_indices] \
+                    = chunk_features
             self.logger.info(f"Frames {frame_from}-{frame_to} were MAE'd.")
 
             # update the state
             chunk_start_frame += chunk_size
+            chunk_stream.release()
+        cropped_images_stream.close()
 
         # save the features data
         visual_features.save_mae(self.mae_features_file)
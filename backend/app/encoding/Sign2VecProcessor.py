@@ -4,8 +4,8 @@ from pathlib import Path
 import numpy as np
 import sys
 from typing import Optional
-from ..domain.FrameGeometry import FrameGeometry
-from ..domain.ClipsCollection import ClipsCollection
+from ..domain.VideoGeometry import VideoGeometry
+from ..domain.ClipRecordStore import ClipRecordStore
 from ..domain.VideoVisualFeatures \
     import VideoVisualFeatures, S2V_FEATURES_DIMENSION
 import logging
@@ -22,15 +22,19 @@ S2V_MODEL_NAME = "karahansahin/sign2vec-yasl-mc-sc-64-2-d1"
 class Sign2VecProcessor:
     def __init__(
         self,
-        geometry_file: Path,
+        geometry_folder: Path,
         s2v_features_file: Path,
-        clips_collection_file: Path,
+        clips_folder: Path,
         logger: logging.Logger,
-        huggingface_token: Optional[str] = None
+        huggingface_token: Optional[str] = None,
+        legacy_geometry_file: Optional[Path] = None,
+        legacy_clips_file: Optional[Path] = None
     ):
-        self.geometry_file = geometry_file
+        self.geometry_folder = geometry_folder
+        self.legacy_geometry_file = legacy_geometry_file
         self.s2v_features_file = s2v_features_file
-        self.clips_collection_file = clips_collection_file
+        self.clips_folder = clips_folder
+        self.legacy_clips_file = legacy_clips_file
         self.logger = logger
         self.huggingface_token = huggingface_token
 
@@ -43,9 +47,13 @@ class Sign2VecProcessor:
         feature_extractor = Sign2VecFeatureExtractor()
 
         # load the input data
-        frame_geometries = FrameGeometry.list_from_json(self.geometry_file)
-        clips_collection = ClipsCollection.load(self.clips_collection_file)
-        assert len(frame_geometries) == len(clips_collection.clip_index_lookup)
+        geometry = VideoGeometry.load_any(
+            self.geometry_folder, self.legacy_geometry_file
+        )
+        clips_collection = ClipRecordStore.load_any(
+            self.clips_folder, self.legacy_clips_file
+        )
+        assert len(geometry) == clips_collection.frame_count
 
         self.logger.info(
             f"There are {len(clips_collection.clips)} clips to be processed."
@@ -54,34 +62,31 @@ class Sign2VecProcessor:
         # prepare the output embeddings matrices
         visual_features = VideoVisualFeatures(s2v_features={})
 
-        def coalesce(landmarks: Optional[np.ndarray], size: int) -> np.ndarray:
-            "Replaces None with zeros matrix"
-            if landmarks is not None:
-                return landmarks
-            return np.zeros(shape=(size, 4), dtype=np.float64)
-
         # run sign2vec for each clip
         for clip_index, clip in enumerate(clips_collection.clips):
-            clip_geometries = frame_geometries[
-                clip.start_frame : clip.start_frame+clip.frame_count
-            ]
+            if clip.skip_reason is not None:
+                visual_features.s2v_features[clip_index] = np.zeros(
+                    shape=(0, S2V_FEATURES_DIMENSION),
+                    dtype=np.float32
+                )
+                self.logger.info(
+                    f"Clip {clip_index} was skipped ({clip.skip_reason})."
+                )
+                continue
+
+            # missing landmarks are already zeros in the geometry arrays
+            clip_geometry = geometry.slice(
+                clip.start_frame, clip.start_frame + clip.frame_count
+            )
             sample_pose = {
-                "pose_landmarks": np.stack(
-                    [coalesce(g.pose_landmarks, 33) for g in clip_geometries],
-                    axis=0
-                ),
-                "right_hand_landmarks": np.stack(
-                    [coalesce(g.right_hand_landmarks, 21) for g in clip_geometries],
-                    axis=0
-                ),
-                "left_hand_landmarks": np.stack(
-                    [coalesce(g.left_hand_landmarks, 21) for g in clip_geometries],
-                    axis=0
-                ),
-                "face_landmarks": np.stack(
-                    [coalesce(g.face_landmarks, 478) for g in clip_geometries],
-                    axis=0
-                ),
+                "pose_landmarks":
+                    clip_geometry.pose_landmarks.astype(np.float64),
+                "right_hand_landmarks":
+                    clip_geometry.right_hand_landmarks.astype(np.float64),
+                "left_hand_landmarks":
+                    clip_geometry.left_hand_landmarks.astype(np.float64),
+                "face_landmarks":
+                    clip_geometry.face_landmarks.astype(np.float64),
             }
 
             inputs = feature_extractor(sample_pose)
@@ -0,0 +1,188 @@
+from pathlib import Path
+from ..video.Frame import Frame
+from ..video.crop_storage import create_crop_stream
+from ..video.PackedFrameStream import PackedFrameStream
+from ..domain.FrameGeometry import FrameGeometry
+from typing import List, Optional, Callable, Dict, Tuple, Any
+import numpy as np
+import cv2
+import queue
+import threading
+import traceback
+
+
+# NOTE: crops come in the original resolution taken from the frame,
+# so they are heterogenous in resolution (but always square)
+# DINO accepts 56x56 images, so I normalize to those.
+# MAE accepts 224x224 images, so I normalize to those.
+DINO_SIZE = 56
+MAE_SIZE = 224
+
+CROP_KINDS = [
+    ("cropped_left_hand", DINO_SIZE),
+    ("cropped_right_hand", DINO_SIZE),
+    ("cropped_face", DINO_SIZE),
+    ("cropped_images", MAE_SIZE),
+]
+"Crop kinds (keys of the predict_pose result) and their stored sizes"
+
+CROP_WRITER_QUEUE_SIZE = 1
+"""
+Chunks whose crops wait for the writer (besides the one being written),
+a worker blocks when the queue is full, which bounds the memory taken
+by the crops
+"""
+
+# called with the formatted exception, or None when the crops are written
+WrittenCallback = Callable[[Optional[str]], None]
+
+
+def normalize_crops(crops: List[np.ndarray], target_size: int) -> np.ndarray:
+    """
+    Resizes the RGB crops of a chunk produced by mediapipe to the target
+    size and returns them as a (N, S, S, 3) BGR batch
+    """
+    batch = np.empty((len(crops), target_size, target_size, 3), dtype=np.uint8)
+    for i, crop in enumerate(crops):
+        # mediapipe returns the original crop resolution unmodified
+        if crop.shape[:2] != (target_size, target_size):
+            crop = cv2.resize(crop, dsize=(target_size, target_size))
+        batch[i] = crop
+
+    # mediapipe produces RGB, we expect BGR; swapped for the whole batch
+    # at once (and after resizing, so on the smaller images)
+    return np.ascontiguousarray(batch[..., ::-1])
+
+
+def normalize_prediction_crops(
+    prediction: dict,
+    chunk_length: int
+) -> Dict[str, np.ndarray]:
+    """Crop batches of all the crop kinds of a predict_pose result"""
+    return {
+        crop_kind: normalize_crops(prediction[crop_kind][:chunk_length], size)
+        for crop_kind, size in CROP_KINDS
+    }
+
+
+class CropWriter:
+    """
+    Stage that resizes the crops produced by mediapipe and writes them into
+    the crop storage on its own thread, so that the mediapipe worker can
+    continue with the pose estimation of the next chunk in the meantime.
+
+    Chunks of jobs with a cache key are also stored into the chunk cache,
+    together with their frame geometries.
+
+    Chunks are passed through a bounded queue. The crop streams stay open
+    between the chunks of the same mediapipe run (instead of being created
+    for each chunk) and are closed when a chunk of another run arrives
+    or when the writer stops.
+    """
+    def __init__(self, queue_size=CROP_WRITER_QUEUE_SIZE):
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._streams_run_id: Optional[str] = None
+        self._streams: Dict[Tuple[Path, int], Any] = {}
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=lambda: self._write_chunks(),
+            daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self,
+        job,
+        prediction: dict,
+        on_written: WrittenCallback,
+        frame_geometries: Optional[List[FrameGeometry]] = None
+    ):
+        """
+        Enqueues the crops of a ChunkJob (taken from the predict_pose
+        result), blocks while the queue is full
+        """
+        self._queue.put((job, prediction, None, frame_geometries, on_written))
+
+    def submit_batches(
+        self,
+        job,
+        crop_batches: Dict[str, np.ndarray],
+        on_written: WrittenCallback
+    ):
+        """Enqueues already normalized crops (e.g. from the chunk cache)"""
+        self._queue.put((job, None, crop_batches, None, on_written))
+
+    def stop(self):
+        """Writes the enqueued crops, closes the streams and ends the thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_chunks(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._close_streams()
+                return
+
+            job, prediction, crop_batches, frame_geometries, on_written = item
+            try:
+                if crop_batches is None:
+                    crop_batches = normalize_prediction_crops(
+                        prediction, job.chunk_length
+                    )
+                self.write_batches(job, crop_batches)
+                if job.cache_key is not None and frame_geometries is not None:
+                    self._store_into_cache(job, frame_geometries, crop_batches)
+                error = None
+            except Exception:
+                error = traceback.format_exc()
+            # frees the crops before waiting for the next chunk
+            del item, prediction, crop_batches
+            on_written(error)
+
+    def _store_into_cache(
+        self,
+        job,
+        frame_geometries: List[FrameGeometry],
+        crop_batches: Dict[str, np.ndarray]
+    ):
+        try:
+            job.chunk_cache.store(job.cache_key, frame_geometries, crop_batches)
+        except OSError:
+            pass # the cache is an optimization, e.g. a full disk is no error
+
+    def write_batches(self, job, crop_batches: Dict[str, np.ndarray]):
+        """Writes the crop batches of the chunk job into the crop storage"""
+        if job.run_id != self._streams_run_id:
+            self._close_streams()
+            self._streams_run_id = job.run_id
+
+        for crop_kind, size in CROP_KINDS:
+            folder = getattr(job, crop_kind + "_folder")
+            batch = crop_batches[crop_kind]
+            stream = self._get_stream(job, folder, size)
+            if isinstance(stream, PackedFrameStream):
+                stream.write_frames(job.chunk_start_frame, batch)
+            else:
+                for i in range(len(batch)):
+                    stream.write_frame(
+                        Frame(batch[i]), seek_to=job.chunk_start_frame + i
+                    )
+                stream.flush()
+
+    def _get_stream(self, job, folder: Path, size: int):
+        key = (folder, size)
+        if key not in self._streams:
+            self._streams[key] = create_crop_stream(
+                folder, job.crop_storage_format,
+                framerate=job.source_framerate, size=size
+            )
+        return self._streams[key]
+
+    def _close_streams(self):
+        for stream in self._streams.values():
+            stream.close()
+        self._streams.clear()
+        self._streams_run_id = None
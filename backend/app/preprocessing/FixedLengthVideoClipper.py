@@ -1,44 +1,98 @@
 from ..domain.ClipsCollection import ClipsCollection
 from ..domain.Clip import Clip
-from ..video.FileFrameStream import FileFrameStream
-from ..video.FrameStreamChunker import FrameStreamChunker
+from ..video.FrameIndex import FrameIndex
 from pathlib import Path
 
 
 class FixedLengthVideoClipper:
     """
     Creates the clips collection datastructure for a video, i.e. defines the
-    clips to be used during translation.
+    clips to be used during translation. The clips are planned from the frame
+    count and the framerate only, so the video does not have to be decoded.
     """
 
     def __init__(
         self,
-        normalized_video_file: Path,
-        clip_length_seconds: float
+        frame_count: int,
+        framerate: float,
+        clip_length_seconds: float,
+        min_tail_seconds=0.0,
+        overlap_seconds=0.0
     ):
-        self.normalized_video_file = normalized_video_file
+        self.frame_count = frame_count
+        "Number of frames of the video"
+
+        self.framerate = framerate
+        "Frames per second of the video"
+
         self.clip_length_seconds = clip_length_seconds
+        "Length of each clip (the last one may be shorter)"
+
+        self.min_tail_seconds = min_tail_seconds
+        """
+        The last clip is merged into the previous one (making it longer),
+        if it would add fewer seconds of new frames than this
+        """
+
+        self.overlap_seconds = overlap_seconds
+        "Each clip starts this many seconds before the previous one ends"
+
+    @staticmethod
+    def for_video_file(
+        normalized_video_file: Path,
+        frame_index_file: Path,
+        framerate: float,
+        clip_length_seconds: float,
+        min_tail_seconds=0.0,
+        overlap_seconds=0.0
+    ) -> "FixedLengthVideoClipper":
+        """
+        Takes the exact frame count from the sidecar frame index
+        of the video (built by probing the packets if missing)
+        """
+        frame_index = FrameIndex.load_or_build(
+            normalized_video_file, frame_index_file
+        )
+        return FixedLengthVideoClipper(
+            frame_count=len(frame_index),
+            framerate=framerate,
+            clip_length_seconds=clip_length_seconds,
+            min_tail_seconds=min_tail_seconds,
+            overlap_seconds=overlap_seconds
+        )
 
     def run(self) -> ClipsCollection:
-        file_stream = FileFrameStream(self.normalized_video_file)
-        chunker = FrameStreamChunker(file_stream, self.clip_length_seconds)
-        clips_collection = ClipsCollection()
-        
-        clip_starting_frame = 0
-        clip_index = 0
-        for clip_frames in chunker:
-            clip_frame_count = len(clip_frames)
-            
-            clip = Clip(
-                clip_index=clip_index,
-                start_frame=clip_starting_frame,
-                frame_count=clip_frame_count
-            )
-            clips_collection.clips.append(clip)
+        clip_frame_count = int(self.clip_length_seconds * self.framerate)
+        clip_frame_count = max(1, clip_frame_count)
+        overlap_frame_count = int(self.overlap_seconds * self.framerate)
+        if overlap_frame_count >= clip_frame_count:
+            raise Exception("The clip overlap has to be shorter than a clip.")
+        min_tail_frame_count = int(self.min_tail_seconds * self.framerate)
 
-            clip_starting_frame += clip_frame_count
-            clip_index += 1
+        # (start, end) frame ranges
+        ranges = []
+        start = 0
+        while start < self.frame_count:
+            end = min(start + clip_frame_count, self.frame_count)
+            ranges.append((start, end))
+            if end == self.frame_count:
+                break
+            start = end - overlap_frame_count
 
+        # a short tail would be a clip with too little signing to translate
+        if len(ranges) >= 2:
+            tail_frame_count = ranges[-1][1] - ranges[-2][1]
+            if tail_frame_count < min_tail_frame_count:
+                ranges.pop()
+                ranges[-1] = (ranges[-1][0], self.frame_count)
+
+        clips_collection = ClipsCollection()
+        for clip_index, (start, end) in enumerate(ranges):
+            clips_collection.clips.append(Clip(
+                clip_index=clip_index,
+                start_frame=start,
+                frame_count=end - start
+            ))
         clips_collection.recompute_lookup_table()
 
         return clips_collection
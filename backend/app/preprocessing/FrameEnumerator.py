@@ -1,6 +1,31 @@
 import ffmpeg
 import cv2
 import numpy as np
+from ..video.FrameStream import FrameStream
+from ..video.Frame import Frame
+
+
+def add_frame_number(frame: np.ndarray, frame_number: int) -> np.ndarray:
+    """Returns a copy of the frame with the number in the top-left corner"""
+    text = f"{frame_number}"
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.5
+    text_color = (255, 255, 255)
+    thickness = 1
+    position = (5, 13)
+    
+    writable_frame = frame.copy()
+
+    text_size = cv2.getTextSize(text, font, font_scale, thickness)[0]
+    text_w, text_h = text_size
+
+    top_left = (position[0] - 5, position[1] - text_h - 5)
+    bottom_right = (position[0] + text_w + 5, position[1] + 5)
+
+    cv2.rectangle(writable_frame, top_left, bottom_right, (0, 0, 0), cv2.FILLED)
+    cv2.putText(writable_frame, text, position, font, font_scale, text_color, thickness, cv2.LINE_AA)
+    return writable_frame
+
 
 class FrameEnumerator:
     """Writes a frame number to the left top corner of each frame into the video frame"""
@@ -57,24 +82,7 @@ class FrameEnumerator:
 
     def _add_frame_number(self, frame):
         """Adds the frame number to the top-left corner of the frame"""
-        text = f"{self.frame_counter}"
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.5
-        text_color = (255, 255, 255)
-        thickness = 1
-        position = (5, 13)
-        
-        writable_frame = frame.copy()
-
-        text_size = cv2.getTextSize(text, font, font_scale, thickness)[0]
-        text_w, text_h = text_size
-
-        top_left = (position[0] - 5, position[1] - text_h - 5)
-        bottom_right = (position[0] + text_w + 5, position[1] + 5)
-
-        cv2.rectangle(writable_frame, top_left, bottom_right, (0, 0, 0), cv2.FILLED)
-        cv2.putText(writable_frame, text, position, font, font_scale, text_color, thickness, cv2.LINE_AA)
-        return writable_frame
+        return add_frame_number(frame, self.frame_counter)
 
     def close_output(self):
         """Closes the output stream"""
@@ -82,6 +90,30 @@ class FrameEnumerator:
             self.out.stdin.close()
             self.out.wait()
 
+class EnumeratingFrameStream(FrameStream):
+    """Writes a frame number into each frame of the wrapped frame stream"""
+    def __init__(self, in_stream: FrameStream):
+        self.in_stream = in_stream
+        self.frame_counter = 0
+
+    @property
+    def framerate(self) -> float:
+        return self.in_stream.framerate
+
+    @property
+    def width(self) -> int:
+        return self.in_stream.width
+
+    @property
+    def height(self) -> int:
+        return self.in_stream.height
+
+    def __next__(self) -> Frame:
+        frame = next(self.in_stream)
+        frame = Frame(add_frame_number(frame.img, self.frame_counter))
+        self.frame_counter += 1
+        return frame
+
 if __name__ == "__main__":
     input_video_path = 'VideoNormalizer/webm_test_norm.mp4'
     output_video_path = 'VideoNormalizer/webm_test_norm_NO.mp4'
@@ -0,0 +1,191 @@
+from ..domain.FrameGeometry import FrameGeometry
+from ..domain.VideoGeometry import VideoGeometry
+from typing import Dict, List, Optional, Iterator
+from pathlib import Path
+import threading
+import json
+
+
+def partial_geometry_file_for(geometry_folder: Path) -> Path:
+    """Path of the file with the geometry written so far by a running job"""
+    return geometry_folder.with_name(geometry_folder.stem + ".partial.jsonl")
+
+
+def _source_file_header(source_file: Optional[Path]) -> dict:
+    if source_file is None or not source_file.is_file():
+        return {}
+    stat = source_file.stat()
+    return {
+        "source_file_size": stat.st_size,
+        "source_file_modified_time": stat.st_mtime
+    }
+
+
+class GeometryWriter:
+    """
+    Writes frame geometries incrementally, as video chunks finish,
+    instead of keeping all of them in memory until the end.
+
+    Chunks may finish out of order (parallel workers), so they wait in
+    a reorder buffer until all the preceding frames are written. The frames
+    are appended to a partial JSON-lines file (a header line describing
+    the source video, then one frame geometry per line, in frame order),
+    which can be read while the processing is still running
+    (see read_partial_geometry). When all frames are written, the partial
+    file is converted to the final VideoGeometry folder.
+
+    If the processing crashes, the partial file remains and a new writer
+    can resume after its last frame, provided it was made for the same
+    version of the source video file.
+    """
+    def __init__(
+        self,
+        geometry_folder: Path,
+        source_file: Optional[Path] = None,
+        resume=False
+    ):
+        self.geometry_folder = geometry_folder
+        self.partial_file = partial_geometry_file_for(geometry_folder)
+
+        self._lock = threading.Lock()
+        self._pending_chunks: Dict[int, List[FrameGeometry]] = {}
+
+        header = _source_file_header(source_file)
+        self._frame_count = 0
+        if resume and len(header) > 0 and self.partial_file.is_file():
+            self._frame_count = self._open_for_resuming(header)
+        if self._frame_count == 0:
+            self._file = open(self.partial_file, "w", encoding="utf-8")
+            self._file.write(json.dumps(header) + "\n")
+            self._file.flush()
+
+        self.resumed_frame_count = self._frame_count
+        "Frames found in the partial file of an interrupted run"
+
+    def _open_for_resuming(self, header: dict) -> int:
+        """
+        Opens the partial file for appending if it was made for the same
+        source file. Returns the number of complete frames it contains.
+        """
+        with open(self.partial_file, "rb") as f:
+            try:
+                stored_header = json.loads(f.readline())
+            except json.JSONDecodeError:
+                return 0
+            if stored_header != header:
+                return 0
+
+            # count complete lines, drop the one being written during a crash
+            frame_count = 0
+            complete_length = f.tell()
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                frame_count += 1
+                complete_length += len(line)
+
+        with open(self.partial_file, "r+b") as f:
+            f.truncate(complete_length)
+        self._file = open(self.partial_file, "a", encoding="utf-8")
+        return frame_count
+
+    @property
+    def frame_count(self) -> int:
+        """Number of frames written so far"""
+        return self._frame_count
+
+    @property
+    def pending_chunk_count(self) -> int:
+        """Number of chunks waiting in the reorder buffer"""
+        return len(self._pending_chunks)
+
+    def write_chunk(
+        self,
+        chunk_start_frame: int,
+        frame_geometries: List[FrameGeometry]
+    ):
+        """
+        Accepts geometries of a finished chunk, writes it (and the following
+        buffered chunks) once all the preceding frames are written.
+        Can be called from any thread.
+        """
+        with self._lock:
+            if chunk_start_frame < self._frame_count:
+                raise Exception("The chunk frames have already been written.")
+            self._pending_chunks[chunk_start_frame] = frame_geometries
+
+            written_any = False
+            while self._frame_count in self._pending_chunks:
+                chunk = self._pending_chunks.pop(self._frame_count)
+                for frame_geometry in chunk:
+                    self._file.write(json.dumps(frame_geometry.to_json()))
+                    self._file.write("\n")
+                self._frame_count += len(chunk)
+                written_any = True
+
+            if written_any:
+                self._file.flush()
+
+    def finish(self):
+        """
+        Converts the partial file to the final geometry folder,
+        all the chunks must have been written
+        """
+        with self._lock:
+            if len(self._pending_chunks) > 0:
+                raise Exception(
+                    "Some chunks are missing, the geometry has gaps."
+                )
+            self._file.close()
+
+        # stream the lines into the memory-mapped columns,
+        # without holding more than a single frame in memory
+        VideoGeometry.write(
+            self.geometry_folder,
+            self._frame_count,
+            (
+                FrameGeometry.from_json(json.loads(line))
+                for line in read_partial_geometry_lines(self.geometry_folder)
+            )
+        )
+        self.partial_file.unlink()
+
+    def close(self):
+        """Closes the partial file without finishing, so it can be resumed"""
+        with self._lock:
+            self._file.close()
+
+
+def read_partial_geometry(
+    geometry_folder: Path,
+    start_frame=0
+) -> Iterator[FrameGeometry]:
+    """
+    Yields the frame geometries of a video whose geometry is still being
+    computed, from the given frame up to the last written one. If the
+    geometry is already finished, it reads the final folder instead.
+    """
+    partial_file = partial_geometry_file_for(geometry_folder)
+    if VideoGeometry.exists(geometry_folder) or not partial_file.is_file():
+        geometry = VideoGeometry.load(geometry_folder)
+        for i in range(start_frame, len(geometry)):
+            yield geometry.frame(i)
+        return
+
+    for i, line in enumerate(read_partial_geometry_lines(geometry_folder)):
+        if i >= start_frame:
+            yield FrameGeometry.from_json(json.loads(line))
+
+
+def read_partial_geometry_lines(geometry_folder: Path) -> Iterator[str]:
+    """
+    Yields the JSON-serialized frame geometries written so far
+    into the partial file, one string per frame
+    """
+    partial_file = partial_geometry_file_for(geometry_folder)
+    with open(partial_file, "r", encoding="utf-8") as f:
+        f.readline() # header
+        for line in f:
+            if not line.endswith("\n"):
+                break # being written right now
+            yield line[:-1]
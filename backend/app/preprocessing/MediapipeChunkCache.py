@@ -0,0 +1,147 @@
+from ..domain.FrameGeometry import FrameGeometry
+from typing import List, Optional, Dict, Tuple
+from pathlib import Path
+import numpy as np
+import functools
+import hashlib
+import shutil
+import json
+import uuid
+import os
+
+
+CACHE_FORMAT_VERSION = 1
+
+POSE_MODEL_FOLDERS = ["checkpoints/PoseEstimation", "models/PoseEstimation"]
+"Model weights and the predict_pose code, their change invalidates the cache"
+
+GEOMETRIES_FILE_NAME = "frame_geometries.json"
+
+
+@functools.lru_cache(maxsize=None)
+def pose_model_fingerprint() -> str:
+    """Hash of the contents of the pose model files, computed once"""
+    digest = hashlib.blake2b(digest_size=16)
+    for folder in POSE_MODEL_FOLDERS:
+        if not Path(folder).is_dir():
+            continue
+        for path in sorted(Path(folder).rglob("*")):
+            # skip the downloaded testing video and python bytecode
+            if not path.is_file() or path.suffix in [".mp4", ".pyc"]:
+                continue
+            digest.update(str(path).encode("utf-8"))
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+class MediapipeChunkCache:
+    """
+    Disk cache of mediapipe results, so that reprocessing a video
+    (or processing a duplicate upload) does not run mediapipe again.
+
+    An entry holds the frame geometries and the resized crops of one chunk
+    and is keyed by a hash of the decoded chunk frames, the pose model files
+    and the settings affecting the results. Entries are folders, written
+    under a temporary name and renamed, so the cache can be shared by worker
+    processes. The least recently used entries are evicted once the cache
+    exceeds its size.
+    """
+    def __init__(self, folder: Path, max_size_bytes: int):
+        self.folder = folder
+        "Folder with the cache entries"
+
+        self.max_size_bytes = max_size_bytes
+        "Size of the cache above which the oldest entries are evicted"
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def chunk_key(self, frames: np.ndarray, settings: dict) -> str:
+        """
+        Hash of the (N, H, W, 3) chunk frames together with the pose models
+        and the given settings (e.g. the crop sizes and the keyframe interval)
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps({
+            "version": CACHE_FORMAT_VERSION,
+            "models": pose_model_fingerprint(),
+            "settings": settings,
+            "shape": list(frames.shape)
+        }, sort_keys=True).encode("utf-8"))
+        digest.update(np.ascontiguousarray(frames).data)
+        return digest.hexdigest()
+
+    def _entry_folder(self, key: str) -> Path:
+        return self.folder / key
+
+    def load(
+        self,
+        key: str
+    ) -> Optional[Tuple[List[FrameGeometry], Dict[str, np.ndarray]]]:
+        """
+        Returns the frame geometries and the crop batches (by crop kind)
+        of the chunk, None if not cached
+        """
+        entry_folder = self._entry_folder(key)
+        try:
+            with open(entry_folder / GEOMETRIES_FILE_NAME, "r") as f:
+                frame_geometries = [
+                    FrameGeometry.from_json(g) for g in json.load(f)
+                ]
+            crop_batches = {
+                path.stem: np.load(path)
+                for path in entry_folder.glob("*.npy")
+            }
+            os.utime(entry_folder) # marks the entry as recently used
+        except (OSError, ValueError):
+            return None # not cached, or evicted while being read
+        return frame_geometries, crop_batches
+
+    def store(
+        self,
+        key: str,
+        frame_geometries: List[FrameGeometry],
+        crop_batches: Dict[str, np.ndarray]
+    ):
+        """Stores the results of the chunk and evicts old entries if needed"""
+        entry_folder = self._entry_folder(key)
+        if entry_folder.is_dir():
+            return
+
+        temp_folder = self.folder / f".{key}.{uuid.uuid4().hex}.tmp"
+        temp_folder.mkdir()
+        with open(temp_folder / GEOMETRIES_FILE_NAME, "w") as f:
+            json.dump([g.to_json() for g in frame_geometries], f)
+        for crop_kind, batch in crop_batches.items():
+            np.save(temp_folder / (crop_kind + ".npy"), batch)
+
+        try:
+            os.rename(temp_folder, entry_folder)
+        except OSError:
+            # stored by another worker in the meantime
+            shutil.rmtree(temp_folder, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries over the size limit"""
+        entries = []
+        total_size = 0
+        for entry_folder in self.folder.iterdir():
+            if entry_folder.name.startswith("."):
+                continue # being written
+            try:
+                size = sum(f.stat().st_size for f in entry_folder.iterdir())
+                modified_time = entry_folder.stat().st_mtime
+            except OSError:
+                continue # evicted by another worker
+            entries.append((modified_time, size, entry_folder))
+            total_size += size
+
+        entries.sort()
+        for _, size, entry_folder in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            shutil.rmtree(entry_folder, ignore_errors=True)
+            total_size -= size
@@ -0,0 +1,218 @@
+from typing import Optional, Dict, Set
+import threading
+import time
+import os
+
+
+def read_available_memory_bytes() -> Optional[int]:
+    """Returns MemAvailable of the host, None if /proc is not available"""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024 # the value is in kB
+    except OSError:
+        pass
+    return None
+
+
+def read_process_rss_bytes(pid: int) -> Optional[int]:
+    """Returns the resident memory of a process, None if it is not readable"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024 # the value is in kB
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+SCALE_DOWN_RATIO = 0.9
+"Workers are removed when the usage exceeds this fraction of the budget"
+
+SCALE_UP_RATIO = 0.6
+"Workers are added back when one more worker fits under this fraction"
+
+MIN_AVAILABLE_BYTES = 1024 * 1024 * 1024
+"The host is considered out of memory when less than this is available"
+
+ADJUSTMENT_PERIOD_SECONDS = 10.0
+"""
+Minimal time between two worker count changes (of all pools), so that
+the measured memory settles before the next decision
+"""
+
+
+class MediapipeMemoryBudget:
+    """
+    Memory budget for all mediapipe workers of the backend, shared by all
+    the worker pools (i.e. by all videos processed concurrently).
+
+    When a pool starts, it reserves as many workers as fit into the budget
+    and into the available host memory, using the estimated memory of one
+    worker (see docs/hardware-requirements.md). While it runs, the pools
+    report their measured memory usage here and ask whether to remove
+    a worker, add one back, or pause dispatching new chunks.
+    """
+    def __init__(
+        self,
+        budget_bytes: int,
+        worker_estimate_bytes: int
+    ):
+        self.budget_bytes = budget_bytes
+        "Memory that all the mediapipe workers together may take"
+
+        self.worker_estimate_bytes = worker_estimate_bytes
+        "Expected peak memory of a single mediapipe worker"
+
+        self._lock = threading.Condition()
+        self._reserved_workers: Dict[int, int] = {} # pool id -> worker count
+        self._measured_usages: Dict[int, int] = {} # pool id -> bytes
+        self._thread_pool_ids: Set[int] = set() # pools measuring the server
+        self._baseline_rss_bytes: Dict[int, Optional[int]] = {} # pool id -> RSS
+        self._last_adjustment = 0.0
+
+    # reservations
+
+    def _workers_that_fit(self) -> int:
+        free_bytes = self.budget_bytes - self.worker_estimate_bytes * sum(
+            self._reserved_workers.values()
+        )
+        available_bytes = read_available_memory_bytes()
+        if available_bytes is not None:
+            free_bytes = min(free_bytes, available_bytes - MIN_AVAILABLE_BYTES)
+        return max(0, free_bytes // self.worker_estimate_bytes)
+
+    def reserve_workers(self, pool_id: int, requested_count: int) -> int:
+        """
+        Reserves up to the requested number of workers for a pool and returns
+        how many were granted. Blocks while not even one worker fits and
+        other pools hold reservations (one worker is granted when alone).
+        Must be called before the pool starts its workers, the server RSS
+        is taken here as the baseline of thread workers.
+        """
+        with self._lock:
+            while True:
+                count = min(requested_count, self._workers_that_fit())
+                if count > 0 or len(self._reserved_workers) == 0:
+                    count = max(1, count)
+                    self._reserved_workers[pool_id] = count
+                    self._baseline_rss_bytes[pool_id] = \
+                        read_process_rss_bytes(os.getpid())
+                    return count
+                self._lock.wait()
+
+    def release_workers(self, pool_id: int):
+        """Frees all the reservations of a pool"""
+        with self._lock:
+            self._reserved_workers.pop(pool_id, None)
+            self._measured_usages.pop(pool_id, None)
+            self._thread_pool_ids.discard(pool_id)
+            self._baseline_rss_bytes.pop(pool_id, None)
+            self._lock.notify_all()
+
+    # runtime adjustments
+
+    def measure_thread_workers(self, pool_id: int) -> Optional[int]:
+        """
+        Estimates the memory of a pool's workers running as threads of the
+        server, as the growth of the server RSS since the pool reserved its
+        workers. Models kept resident by earlier videos are thus not counted,
+        but anything else the server allocates meanwhile (e.g. the encoders
+        of another video) is.
+        """
+        rss = read_process_rss_bytes(os.getpid())
+        with self._lock:
+            baseline = self._baseline_rss_bytes.get(pool_id)
+        if rss is None or baseline is None:
+            return None
+        return max(0, rss - baseline)
+
+    def report_usage(
+        self,
+        pool_id: int,
+        used_bytes: Optional[int],
+        is_server_process=False
+    ):
+        """
+        Stores the last measured memory usage of a pool's workers.
+        Set is_server_process when the workers are threads of the server,
+        all such pools measure the same process, so it is counted only once.
+        """
+        if used_bytes is None:
+            return
+        with self._lock:
+            self._measured_usages[pool_id] = used_bytes
+            if is_server_process:
+                self._thread_pool_ids.add(pool_id)
+
+    def used_bytes(self) -> int:
+        """Measured memory of all the workers (estimates for unmeasured)"""
+        with self._lock:
+            used_bytes = 0
+            server_process_bytes = 0
+            for pool_id, count in self._reserved_workers.items():
+                pool_bytes = self._measured_usages.get(
+                    pool_id, count * self.worker_estimate_bytes
+                )
+                if pool_id in self._thread_pool_ids:
+                    server_process_bytes = max(server_process_bytes, pool_bytes)
+                else:
+                    used_bytes += pool_bytes
+            return used_bytes + server_process_bytes
+
+    def is_exceeded(self) -> bool:
+        """True when new chunks should not be dispatched for the time being"""
+        available_bytes = read_available_memory_bytes()
+        if available_bytes is not None and available_bytes < MIN_AVAILABLE_BYTES:
+            return True
+        return self.used_bytes() > self.budget_bytes
+
+    def should_remove_worker(self, pool_id: int) -> bool:
+        """
+        Decides whether the pool should stop one of its workers. On success,
+        the caller must stop the worker, its reservation is released here.
+        """
+        available_bytes = read_available_memory_bytes()
+        is_high = (
+            self.used_bytes() > self.budget_bytes * SCALE_DOWN_RATIO
+            or (
+                available_bytes is not None
+                and available_bytes < MIN_AVAILABLE_BYTES
+            )
+        )
+        with self._lock:
+            count = self._reserved_workers.get(pool_id, 0)
+            if not is_high or count <= 1 or not self._may_adjust():
+                return False
+            self._reserved_workers[pool_id] = count - 1
+            self._last_adjustment = time.monotonic()
+            self._lock.notify_all()
+            return True
+
+    def should_add_worker(self, pool_id: int, max_count: int) -> bool:
+        """
+        Decides whether the pool should start another worker (up to
+        max_count). On success, the worker is already reserved.
+        """
+        used_bytes = self.used_bytes()
+        with self._lock:
+            count = self._reserved_workers.get(pool_id, 0)
+            if count >= max_count or not self._may_adjust():
+                return False
+            is_low = (
+                used_bytes + self.worker_estimate_bytes
+                < self.budget_bytes * SCALE_UP_RATIO
+            )
+            if not is_low or self._workers_that_fit() == 0:
+                return False
+            self._reserved_workers[pool_id] = count + 1
+            self._last_adjustment = time.monotonic()
+            return True
+
+    def _may_adjust(self) -> bool:
+        return (
+            time.monotonic() - self._last_adjustment
+            > ADJUSTMENT_PERIOD_SECONDS
+        )
@@ -1,289 +1,467 @@
-import sys
 from pathlib import Path
 from ..video.FileFrameStream import FileFrameStream
-from ..video.InMemoryFrameStream import InMemoryFrameStream
-from ..video.FolderJpgFrameStream import FolderJpgFrameStream
+from ..video.PrefetchingFrameStream import PrefetchingFrameStream
+from ..video.ArrayFrameStream import ArrayFrameStream, FrameBufferPool
+from ..video.SharedFrameBufferPool import SharedFrameBufferPool
+from ..video.crop_storage import clear_crops, PACKED
 from ..video.FrameStreamChunker import FrameStreamChunker
-from ..video.Frame import Frame
+from .MediapipeWorkerPool import MediapipeWorkerPool, ChunkJob, ChunkResult
+from .MediapipeWorkerPool import failed_result
+from .MediapipeChunkCache import MediapipeChunkCache
+from .CropWriter import CropWriter, CROP_KINDS
 from ..domain.FrameGeometry import FrameGeometry
-from typing import List, Any, Optional
-import json
+from .MediapipeMemoryBudget import MediapipeMemoryBudget
+from .GeometryWriter import GeometryWriter
+from typing import List, Optional, Dict
 import numpy as np
-import cv2
-import queue
 import logging
 import threading
+import uuid
 
 
-sys.path.append("models/PoseEstimation")
-from predict_pose import predict_pose, create_mediapipe_models
-
-
-class ChunkJob:
+class MediapipeProcessor:
     def __init__(
         self,
-        source_framerate: float,
-        frame_geometries: List[Optional[FrameGeometry]],
+        input_file: Path,
+        geometry_folder: Path,
         cropped_left_hand_folder: Path,
         cropped_right_hand_folder: Path,
         cropped_face_folder: Path,
         cropped_images_folder: Path,
-        chunk_stream: InMemoryFrameStream,
-        chunk_start_frame: int,
-        logger: logging.Logger
+        logger: logging.Logger,
+        chunking_period_seconds=1.0,
+        parallel_worker_count=2,
+        prefetch_buffer_size=30,
+        crop_storage_format=PACKED,
+        use_worker_processes=False,
+        worker_pool: Optional[MediapipeWorkerPool] = None,
+        memory_budget: Optional[MediapipeMemoryBudget] = None,
+        resume_interrupted_run=False,
+        keyframe_interval=1,
+        motion_threshold=0.0,
+        chunk_cache: Optional[MediapipeChunkCache] = None
     ):
-        self.source_framerate = source_framerate
-        self.frame_geometries = frame_geometries
+        self.input_file = input_file
+        self.geometry_folder = geometry_folder
         self.cropped_left_hand_folder = cropped_left_hand_folder
         self.cropped_right_hand_folder = cropped_right_hand_folder
         self.cropped_face_folder = cropped_face_folder
         self.cropped_images_folder = cropped_images_folder
-        self.chunk_stream = chunk_stream
-        self.chunk_start_frame = chunk_start_frame
         self.logger = logger
+        self.chunking_period_seconds = chunking_period_seconds
+        self.parallel_worker_count = parallel_worker_count
+        self.prefetch_buffer_size = prefetch_buffer_size
+        self.crop_storage_format = crop_storage_format
+        self.use_worker_processes = use_worker_processes
 
-        self.chunk_length = len(self.chunk_stream)
-        self.chunk_end_frame = chunk_start_frame + self.chunk_length
-
-    def run(self, mediapipe_models: Any):
-        images = [
-            # mediapipe expects RGB, not BGR
-            cv2.cvtColor(frame.img, cv2.COLOR_BGR2RGB)
-            for frame in self.chunk_stream
-        ]
-        prediction: dict = predict_pose(
-            images,
-            mediapipe_models
-        )
+        self.worker_pool = worker_pool
+        """
+        Long-lived pool with warm workers, shared with other videos. If None,
+        the processor starts its own workers and stops them when done.
+        """
+        if worker_pool is not None:
+            self.parallel_worker_count = worker_pool.worker_count
+            self.use_worker_processes = worker_pool.use_processes
 
-        # process keypoints
-        for i in range(self.chunk_length):
-            self.frame_geometries[self.chunk_start_frame + i] = (
-                self.get_frame_geometry(prediction, i)
-            )
-        
-        # process crops
-        self.store_crops(prediction)
+        self.memory_budget = memory_budget
+        """
+        Memory budget (shared with other videos) that decides how many of the
+        parallel_worker_count workers actually run. Used only when the
+        processor starts its own workers, a shared pool has its own budget.
+        """
 
-        self.logger.info(
-            f"Frames {self.chunk_start_frame}-{self.chunk_end_frame} " +
-            "were mediapiped."
+        self.resume_interrupted_run = resume_interrupted_run
+        """
+        Continue after the last frame stored by a previous run that crashed
+        (if it processed the same input file), instead of starting over
+        """
+
+        self.keyframe_interval = keyframe_interval
+        """
+        Run mediapipe only on every k-th frame of a chunk and interpolate
+        the frames in between. 1 runs mediapipe on all frames.
+        """
+
+        self.motion_threshold = motion_threshold
+        """
+        With keyframe_interval above 1, frames differing from the previous
+        frame by more than this (mean absolute difference of grayscale
+        pixels, 0-255) are keyframes as well. 0 disables it.
+        """
+
+        self.chunk_cache = chunk_cache
+        """
+        Cache of mediapipe results by chunk content, chunks found there
+        are not sent to the workers. None disables the caching.
+        """
+
+    def run(self):
+        # open the video file
+        frame_stream = FileFrameStream(self.input_file)
+
+        self.start(
+            source_framerate=frame_stream.framerate,
+            resume=self.resume_interrupted_run
         )
-    
-    def get_frame_geometry(
-        self,
-        prediction: dict,
-        chunk_frame_index: int
-    ) -> FrameGeometry:
-        keypoints: dict = prediction["keypoints"][chunk_frame_index]
-
-        def numpyfy(landmarks):
-            if landmarks is None:
-                return None
-            return np.array(landmarks, dtype=np.float64)
-        
-        def nullify(landmarks):
-            if len(landmarks) == 0:
-                return None
-            return landmarks
-        
-        def intify(bbox):
-            if bbox is None:
-                return None
-            # convert to python int from np.int64 and other weird int types
-            return [int(i) for i in bbox]
-        
-        # print(numpyfy(nullify(keypoints["face_landmarks"])))
-        
-        # build up the geometry data
-        return FrameGeometry(
-            pose_landmarks=numpyfy(nullify(keypoints["pose_landmarks"])),
-            right_hand_landmarks=numpyfy(nullify(keypoints["right_hand_landmarks"])),
-            left_hand_landmarks=numpyfy(nullify(keypoints["left_hand_landmarks"])),
-            face_landmarks=numpyfy(nullify(keypoints["face_landmarks"])),
-            sign_space=intify(
-                # no nullify here; is never None
-                prediction["sign_space"][chunk_frame_index]
-            ),
-            right_hand_bbox=intify(
-                nullify(prediction["bbox_right_hand"][chunk_frame_index])
-            ),
-            left_hand_bbox=intify(
-                nullify(prediction["bbox_left_hand"][chunk_frame_index])
-            ),
-            face_bbox=intify(
-                nullify(prediction["bbox_face"][chunk_frame_index])
+        if self._chunk_start_frame > 0:
+            frame_stream.seek(self._chunk_start_frame)
+
+        # decode ahead on a background thread while the chunks are dispatched
+        if self.prefetch_buffer_size > 0:
+            frame_stream = PrefetchingFrameStream(
+                frame_stream,
+                buffer_size=self.prefetch_buffer_size
             )
+
+        # process the video file in fixed-size chunks
+        chunker = FrameStreamChunker(
+            in_stream=frame_stream,
+            target_clip_length_seconds=self.chunking_period_seconds
         )
-    
-    def store_crops(self, prediction: dict):
-        # NOTE: crops come in the original resolution taken from the frame,
-        # so they are heterogenous in resolution (but always square)
-        # DINO accepts 56x56 images, so I normalize to those.
-        # MAE accepts 224x224 images, so I normalize to those.
-        DINO_SIZE = 56
-        MAE_SIZE = 224
-
-        def normalize(img: np.ndarray, target_size: int) -> Frame:
-            # mediapipe produces RGB, we expect BGR
-            img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-            
-            # we resize to the desired size, mediapipe returns the
-            # original crop resolution unmodified
-            img = cv2.resize(img, dsize=(target_size, target_size))
-            
-            return Frame(img)
-
-        # prepare output streams for the crops
-        # (here, for each chunk, because the stream has the current frame state
-        # which would cause race condition if accessed concurrently)
-        cropped_left_hand_stream = FolderJpgFrameStream.create(
-            self.cropped_left_hand_folder,
-            framerate=self.source_framerate,
-            width=DINO_SIZE, height=DINO_SIZE
-        )
-        cropped_right_hand_stream = FolderJpgFrameStream.create(
-            self.cropped_right_hand_folder,
-            framerate=self.source_framerate,
-            width=DINO_SIZE, height=DINO_SIZE
-        )
-        cropped_face_stream = FolderJpgFrameStream.create(
-            self.cropped_face_folder,
-            framerate=self.source_framerate,
-            width=DINO_SIZE, height=DINO_SIZE
+        chunker.buffer_pool = self.create_chunk_buffer_pool(
+            capacity=chunker.target_clip_frame_count,
+            width=frame_stream.width,
+            height=frame_stream.height
         )
-        cropped_images_stream = FolderJpgFrameStream.create(
-            self.cropped_images_folder,
-            framerate=self.source_framerate,
-            width=MAE_SIZE, height=MAE_SIZE
+        try:
+            for chunk_stream in chunker:
+                self.submit_chunk(chunk_stream)
+        except:
+            self.abort()
+            raise
+        finally:
+            if isinstance(frame_stream, PrefetchingFrameStream):
+                frame_stream.close()
+                self.logger.info(
+                    f"Frame prefetching: {frame_stream.statistics}"
+                )
+
+        self.finish()
+
+    def start(self, source_framerate: float, resume=False):
+        """
+        Starts the worker system, after which chunks of the video
+        can be submitted for processing, in the order of the video frames.
+        When resuming an interrupted run, the first submitted chunk has to
+        start at the frame given by resumed_frame_count.
+        """
+        self.logger.info("Starting mediapipe...")
+
+        self._source_framerate = source_framerate
+        self._run_id = uuid.uuid4().hex
+
+        # geometries are written as chunks finish
+        self._geometry_writer = GeometryWriter(
+            geometry_folder=self.geometry_folder,
+            source_file=self.input_file,
+            resume=resume
         )
+        self._chunk_start_frame = self._geometry_writer.resumed_frame_count
 
-        # process each frame in the chunk
-        for i in range(self.chunk_length):
-            cropped_left_hand_stream.write_frame(
-                normalize(prediction["cropped_left_hand"][i], DINO_SIZE),
-                seek_to=self.chunk_start_frame + i
+        if self._chunk_start_frame > 0:
+            self.logger.info(
+                f"Resuming after frame {self._chunk_start_frame}, " +
+                "processed by an interrupted run."
             )
-            cropped_right_hand_stream.write_frame(
-                normalize(prediction["cropped_right_hand"][i], DINO_SIZE),
-                seek_to=self.chunk_start_frame + i
+        else:
+            # remove crops of a previous run, chunks write into the storage
+            # at their frame offsets, so stale frames would remain otherwise
+            for crop_folder in [
+                self.cropped_left_hand_folder, self.cropped_right_hand_folder,
+                self.cropped_face_folder, self.cropped_images_folder
+            ]:
+                clear_crops(crop_folder)
+
+        # start the worker system
+        self._owns_worker_pool = self.worker_pool is None
+        if self._owns_worker_pool:
+            self._worker_pool = MediapipeWorkerPool(
+                worker_count=self.parallel_worker_count,
+                use_processes=self.use_worker_processes,
+                memory_budget=self.memory_budget
             )
-            cropped_face_stream.write_frame(
-                normalize(prediction["cropped_face"][i], DINO_SIZE),
-                seek_to=self.chunk_start_frame + i
+            self._worker_pool.start()
+        else:
+            self._worker_pool = self.worker_pool
+        self.logger.info(
+            "Mediapipe runs with " +
+            f"{self._worker_pool.health().target_worker_count} workers."
+        )
+        self._shared_buffer_pool: Optional[SharedFrameBufferPool] = None
+
+        # tracking of submitted jobs
+        self._jobs_lock = threading.Condition()
+        self._unfinished_job_count = 0
+        self._job_errors: List[str] = []
+
+        # crops of cached chunks are written here, not by the workers
+        self._cached_chunk_count = 0
+        self._cached_crop_writer: Optional[CropWriter] = None
+        if self.chunk_cache is not None:
+            self._cached_crop_writer = CropWriter()
+            self._cached_crop_writer.start()
+
+    @property
+    def resumed_frame_count(self) -> int:
+        """Number of frames processed by an interrupted run, 0 if none"""
+        return self._geometry_writer.resumed_frame_count
+
+    def create_chunk_buffer_pool(
+        self,
+        capacity: int,
+        width: int,
+        height: int
+    ) -> FrameBufferPool:
+        """
+        Creates a pool of buffers for the chunks to be submitted. With worker
+        processes, the buffers are in shared memory, so that filled chunks
+        are passed to the workers without copying. Call at most once per run.
+        """
+        # chunks in flight: one per worker, one queued, one being filled
+        buffer_count = self.parallel_worker_count + 2
+        if not self.use_worker_processes:
+            return FrameBufferPool(
+                capacity=capacity,
+                width=width,
+                height=height,
+                max_retained_buffers=buffer_count
             )
-            cropped_images_stream.write_frame(
-                normalize(prediction["cropped_images"][i], MAE_SIZE),
-                seek_to=self.chunk_start_frame + i
+
+        if self._shared_buffer_pool is not None:
+            raise Exception("The chunk buffer pool has already been created.")
+        self._shared_buffer_pool = SharedFrameBufferPool(
+            capacity=capacity,
+            width=width,
+            height=height,
+            buffer_count=buffer_count
+        )
+        return self._shared_buffer_pool
+
+    def submit_chunk(self, chunk_stream: ArrayFrameStream):
+        """Enqueues the next chunk of video frames to be processed"""
+        cache_key: Optional[str] = None
+        if self.chunk_cache is not None:
+            cache_key = self.chunk_cache.chunk_key(
+                chunk_stream.frames, self._cache_settings()
             )
+            cached = self.chunk_cache.load(cache_key)
+            if cached is not None and self._is_complete(cached, chunk_stream):
+                self._submit_cached_chunk(chunk_stream, *cached)
+                return
 
+        job_frames = {}
+        if self.use_worker_processes:
+            chunk_stream = self._move_to_shared_memory(chunk_stream)
+            job_frames["frames_memory_name"] = \
+                self._shared_buffer_pool.shared_memory_name(chunk_stream.buffer)
+            job_frames["frames_buffer_shape"] = chunk_stream.buffer.shape
+        else:
+            job_frames["chunk_stream"] = chunk_stream
 
-class Worker:
-    def __init__(self, job_queue: queue.Queue):
-        self.job_queue = job_queue
-        self.thread = threading.Thread(
-            target=lambda: self.main(),
-            daemon=True
+        # create a job and enqueue it
+        job = self._create_job(len(chunk_stream), cache_key, job_frames)
+        with self._jobs_lock:
+            self._unfinished_job_count += 1
+
+        def on_predicted(job: ChunkJob):
+            # the frames are not needed while the crops are being written
+            chunk_stream.release()
+        def on_result(job: ChunkJob, result: ChunkResult):
+            self._on_chunk_finished(job, result, chunk_stream)
+        try:
+            # blocks if workers busy
+            self._worker_pool.submit(job, on_result, on_predicted)
+        except:
+            chunk_stream.release()
+            with self._jobs_lock:
+                self._unfinished_job_count -= 1
+            raise
+
+        # update state
+        self._chunk_start_frame += job.chunk_length
+
+    def _create_job(
+        self,
+        chunk_length: int,
+        cache_key: Optional[str],
+        job_frames: dict
+    ) -> ChunkJob:
+        return ChunkJob(
+            source_framerate=self._source_framerate,
+            cropped_left_hand_folder=self.cropped_left_hand_folder,
+            cropped_right_hand_folder=self.cropped_right_hand_folder,
+            cropped_face_folder=self.cropped_face_folder,
+            cropped_images_folder=self.cropped_images_folder,
+            crop_storage_format=self.crop_storage_format,
+            run_id=self._run_id,
+            chunk_start_frame=self._chunk_start_frame,
+            chunk_length=chunk_length,
+            keyframe_interval=self.keyframe_interval,
+            motion_threshold=self.motion_threshold,
+            chunk_cache=self.chunk_cache if cache_key is not None else None,
+            cache_key=cache_key,
+            **job_frames
         )
-    
-    def start(self):
-        self.thread.start()
-
-    def main(self):
-        # load mediapipe models
-        mediapipe_models = create_mediapipe_models("checkpoints/PoseEstimation")
-
-        while True:
-            job: ChunkJob = self.job_queue.get()
-            
-            # stops the worker
-            if job is None:
-                return
-            
-            # runs the job
-            job.run(mediapipe_models)
 
-    def join(self):
-        self.thread.join()
+    def _cache_settings(self) -> dict:
+        """Settings that change the mediapipe results of a chunk"""
+        return {
+            "crop_sizes": CROP_KINDS,
+            "keyframe_interval": self.keyframe_interval,
+            "motion_threshold": (
+                self.motion_threshold if self.keyframe_interval > 1 else 0
+            )
+        }
 
+    @staticmethod
+    def _is_complete(cached: tuple, chunk_stream: ArrayFrameStream) -> bool:
+        """Whether the cache entry was not (partially) evicted meanwhile"""
+        frame_geometries, crop_batches = cached
+        return (
+            len(frame_geometries) == len(chunk_stream)
+            and set(crop_batches.keys()) == set(k for k, _ in CROP_KINDS)
+        )
 
-class MediapipeProcessor:
-    def __init__(
+    def _submit_cached_chunk(
         self,
-        input_file: Path,
-        geometry_file: Path,
-        cropped_left_hand_folder: Path,
-        cropped_right_hand_folder: Path,
-        cropped_face_folder: Path,
-        cropped_images_folder: Path,
-        logger: logging.Logger,
-        chunking_period_seconds=1.0,
-        parallel_worker_count=2
+        chunk_stream: ArrayFrameStream,
+        frame_geometries: List[FrameGeometry],
+        crop_batches: Dict[str, np.ndarray]
     ):
-        self.input_file = input_file
-        self.geometry_file = geometry_file
-        self.cropped_left_hand_folder = cropped_left_hand_folder
-        self.cropped_right_hand_folder = cropped_right_hand_folder
-        self.cropped_face_folder = cropped_face_folder
-        self.cropped_images_folder = cropped_images_folder
-        self.logger = logger
-        self.chunking_period_seconds = chunking_period_seconds
-        self.parallel_worker_count = parallel_worker_count
+        """Finishes the chunk from the cache, without running mediapipe"""
+        job = self._create_job(
+            len(chunk_stream), None, {"chunk_stream": chunk_stream}
+        )
+        chunk_stream.release() # the frames are not needed anymore
+        with self._jobs_lock:
+            self._unfinished_job_count += 1
+            self._cached_chunk_count += 1
 
-    def run(self):
-        self.logger.info("Starting mediapipe...")
+        def on_written(error: Optional[str]):
+            result = ChunkResult(
+                chunk_start_frame=job.chunk_start_frame,
+                frame_geometries=frame_geometries
+            )
+            if error is not None:
+                result = failed_result(job, error)
+            self._on_chunk_finished(job, result, chunk_stream)
+        self._cached_crop_writer.submit_batches(job, crop_batches, on_written)
 
-        # open the video file
-        file_frame_stream = FileFrameStream(self.input_file)
+        self._chunk_start_frame += job.chunk_length
 
-        # prepare the array for all array geometries
-        frame_geometries: List[Optional[FrameGeometry]] = []
+    def _move_to_shared_memory(
+        self,
+        chunk_stream: ArrayFrameStream
+    ) -> ArrayFrameStream:
+        """Copies the chunk into a shared buffer, unless it already is in one"""
+        if self._shared_buffer_pool is None:
+            self.create_chunk_buffer_pool(
+                capacity=chunk_stream.capacity,
+                width=chunk_stream.width,
+                height=chunk_stream.height
+            )
 
-        # start the worker system
-        job_queue = queue.Queue(maxsize=1)
-        workers = [
-            Worker(job_queue) for _ in range(self.parallel_worker_count)
-        ]
-        for w in workers:
-            w.start()
+        if chunk_stream.pool is self._shared_buffer_pool:
+            return chunk_stream
 
-        # process the video file in fixed-size chunks
-        chunker = FrameStreamChunker(
-            in_stream=file_frame_stream,
-            target_clip_length_seconds=self.chunking_period_seconds
+        shared_stream = self._shared_buffer_pool.create_stream(
+            chunk_stream.framerate
         )
-        chunk_start_frame = 0
-        for chunk_stream in chunker:
-            # create a job and enqueue it
-            job = ChunkJob(
-                source_framerate=file_frame_stream.framerate,
-                frame_geometries=frame_geometries,
-                cropped_left_hand_folder=self.cropped_left_hand_folder,
-                cropped_right_hand_folder=self.cropped_right_hand_folder,
-                cropped_face_folder=self.cropped_face_folder,
-                cropped_images_folder=self.cropped_images_folder,
-                chunk_stream=chunk_stream,
-                chunk_start_frame=chunk_start_frame,
-                logger=self.logger
+        for frame in chunk_stream:
+            shared_stream.write_frame(frame)
+        chunk_stream.release()
+        return shared_stream
+
+    def _on_chunk_finished(
+        self,
+        job: ChunkJob,
+        result: ChunkResult,
+        chunk_stream: ArrayFrameStream
+    ):
+        """Called from a worker or collector thread when a job finishes"""
+        chunk_stream.release() # unless already released when predicted
+
+        if result.error is None:
+            self._geometry_writer.write_chunk(
+                job.chunk_start_frame, result.frame_geometries
+            )
+            self.logger.info(
+                f"Frames {job.chunk_start_frame}-{job.chunk_end_frame} " +
+                "were mediapiped."
+            )
+        else:
+            self.logger.error(
+                f"Mediapipe failed on frames " +
+                f"{job.chunk_start_frame}-{job.chunk_end_frame}:\n" +
+                result.error
             )
-            frame_geometries += [None] * len(chunk_stream) # allocate more items
-            job_queue.put(job, block=True) # blocks if all workers busy
-            
-            # update state
-            chunk_start_frame += job.chunk_length
-        
-        # terminate all workers
-        for _ in range(self.parallel_worker_count):
-            job_queue.put(None, block=True)
-        for w in workers:
-            w.join()
-        
-        # check that all frame geometries were created
-        assert all(g is not None for g in frame_geometries)
-
-        # store frames geometry data
-        with open(self.geometry_file, "w") as f:
-            data = [frame.to_json() for frame in frame_geometries]
-            json.dump(data, f)
-        
+
+        with self._jobs_lock:
+            if result.error is not None:
+                self._job_errors.append(result.error)
+            self._unfinished_job_count -= 1
+            self._jobs_lock.notify_all()
+
+    def finish(self):
+        """Waits for all submitted chunks and finalizes the geometry file"""
+        self.stop_workers()
+
+        if len(self._job_errors) > 0:
+            # the frames before the failed chunk remain for resuming
+            self._geometry_writer.close()
+            raise Exception("Mediapipe failed on some of the video chunks.")
+
+        # check that all frame geometries were written
+        assert self._geometry_writer.frame_count == self._chunk_start_frame
+        self._geometry_writer.finish()
+
+        if self.chunk_cache is not None:
+            self.logger.info(
+                f"{self._cached_chunk_count} chunks were taken " +
+                "from the mediapipe cache."
+            )
+
         self.logger.info("Mediapipe done!")
+
+    def stop_workers(self):
+        """
+        Lets the workers finish the submitted jobs and terminates them
+        (unless they come from a shared pool)
+        """
+        if self._owns_worker_pool:
+            self._worker_pool.stop()
+
+        with self._jobs_lock:
+            while self._unfinished_job_count > 0:
+                self._jobs_lock.wait()
+
+        self._stop_cached_crop_writer()
+
+        if self._shared_buffer_pool is not None:
+            self._shared_buffer_pool.close()
+            self._shared_buffer_pool = None
+
+    def _stop_cached_crop_writer(self):
+        if self._cached_crop_writer is not None:
+            self._cached_crop_writer.stop()
+            self._cached_crop_writer = None
+
+    def abort(self):
+        """
+        Stops the workers immediately, abandoning the submitted chunks.
+        Workers of a shared pool cannot be stopped, so their jobs are
+        waited for instead.
+        """
+        if self._owns_worker_pool:
+            self._worker_pool.terminate()
+        else:
+            with self._jobs_lock:
+                while self._unfinished_job_count > 0:
+                    self._jobs_lock.wait()
+
+        self._stop_cached_crop_writer()
+        self._geometry_writer.close()
+
+        if self._shared_buffer_pool is not None:
+            self._shared_buffer_pool.close()
+            self._shared_buffer_pool = None
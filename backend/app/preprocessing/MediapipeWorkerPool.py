@@ -0,0 +1,893 @@
+import sys
+from pathlib import Path
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+from ..video.ArrayFrameStream import ArrayFrameStream
+from ..domain.FrameGeometry import FrameGeometry
+from .CropWriter import CropWriter
+from .MediapipeChunkCache import MediapipeChunkCache
+from .MediapipeMemoryBudget import MediapipeMemoryBudget, read_process_rss_bytes
+from .sparse_pose import select_keyframes, interpolate_prediction
+from typing import List, Any, Optional, Callable, Dict, Tuple, Set
+from multiprocessing.connection import wait as wait_for_connections
+import multiprocessing
+import collections
+import logging
+import pickle
+import numpy as np
+import cv2
+import queue
+import threading
+import traceback
+import time
+
+
+sys.path.append("models/PoseEstimation")
+from predict_pose import predict_pose, create_mediapipe_models
+
+
+MEDIAPIPE_MODELS_FOLDER = "checkpoints/PoseEstimation"
+
+
+@dataclass
+class ChunkResult:
+    """What comes back from a worker after processing a chunk job"""
+
+    chunk_start_frame: int
+    "Index of the first frame of the chunk in the video"
+
+    frame_geometries: List[FrameGeometry]
+    "Geometry of each frame of the chunk, empty if the job failed"
+
+    error: Optional[str] = None
+    "Formatted exception if the job failed"
+
+
+class ChunkJob:
+    """
+    Describes a chunk of video frames to be mediapiped. The frames are either
+    held by an in-memory stream (for thread workers), or live in a shared
+    memory buffer (for process workers), so that the job itself stays small
+    when pickled. Crops are written into the crop storage at the frame
+    offsets of the chunk (by the CropWriter of the worker), geometries
+    are returned in the result.
+
+    With a keyframe interval above 1, mediapipe runs only on the keyframes
+    and the other frames are interpolated (see sparse_pose).
+    """
+    def __init__(
+        self,
+        source_framerate: float,
+        cropped_left_hand_folder: Path,
+        cropped_right_hand_folder: Path,
+        cropped_face_folder: Path,
+        cropped_images_folder: Path,
+        crop_storage_format: str,
+        run_id: str,
+        chunk_start_frame: int,
+        chunk_length: int,
+        chunk_stream: Optional[ArrayFrameStream] = None,
+        frames_memory_name: Optional[str] = None,
+        frames_buffer_shape: Optional[Tuple[int, int, int, int]] = None,
+        keyframe_interval: int = 1,
+        motion_threshold: float = 0,
+        chunk_cache: Optional[MediapipeChunkCache] = None,
+        cache_key: Optional[str] = None
+    ):
+        assert (chunk_stream is None) != (frames_memory_name is None)
+
+        self.source_framerate = source_framerate
+        self.cropped_left_hand_folder = cropped_left_hand_folder
+        self.cropped_right_hand_folder = cropped_right_hand_folder
+        self.cropped_face_folder = cropped_face_folder
+        self.cropped_images_folder = cropped_images_folder
+        self.crop_storage_format = crop_storage_format
+        self.run_id = run_id # the crop writer keeps streams open per run
+        self.chunk_start_frame = chunk_start_frame
+        self.chunk_length = chunk_length
+        self.chunk_end_frame = chunk_start_frame + chunk_length
+
+        self.chunk_stream = chunk_stream
+        self.frames_memory_name = frames_memory_name
+        self.frames_buffer_shape = frames_buffer_shape
+        self.keyframe_interval = keyframe_interval
+        self.motion_threshold = motion_threshold
+        self.chunk_cache = chunk_cache
+        self.cache_key = cache_key # results are cached under it, if set
+
+    def __getstate__(self):
+        # the in-memory stream never travels to another process
+        state = self.__dict__.copy()
+        state["chunk_stream"] = None
+        return state
+
+    @contextmanager
+    def _open_frames(self):
+        """Yields the (N, H, W, 3) array of the chunk frames"""
+        if self.chunk_stream is not None:
+            yield self.chunk_stream.frames
+            return
+
+        memory = SharedMemory(name=self.frames_memory_name)
+        try:
+            buffer = np.ndarray(
+                self.frames_buffer_shape, dtype=np.uint8, buffer=memory.buf
+            )
+            yield buffer[:self.chunk_length]
+            del buffer
+        finally:
+            memory.close()
+
+    def predict(self, mediapipe_models: Any) -> dict:
+        """Runs mediapipe on the chunk, returns the predict_pose result"""
+        with self._open_frames() as frames:
+            images = [
+                # mediapipe expects RGB, not BGR
+                cv2.cvtColor(frames[i], cv2.COLOR_BGR2RGB)
+                for i in range(self.chunk_length)
+            ]
+        if self.keyframe_interval > 1:
+            keyframe_indices = select_keyframes(
+                images, self.keyframe_interval, self.motion_threshold
+            )
+            keyframe_prediction: dict = predict_pose(
+                [images[i] for i in keyframe_indices],
+                mediapipe_models
+            )
+            prediction = interpolate_prediction(
+                keyframe_prediction, keyframe_indices, images
+            )
+        else:
+            prediction: dict = predict_pose(
+                images,
+                mediapipe_models
+            )
+        return prediction
+
+    def get_frame_geometries(self, prediction: dict) -> List[FrameGeometry]:
+        return [
+            self.get_frame_geometry(prediction, i)
+            for i in range(self.chunk_length)
+        ]
+
+    def get_frame_geometry(
+        self,
+        prediction: dict,
+        chunk_frame_index: int
+    ) -> FrameGeometry:
+        keypoints: dict = prediction["keypoints"][chunk_frame_index]
+
+        def numpyfy(landmarks):
+            if landmarks is None:
+                return None
+            return np.array(landmarks, dtype=np.float64)
+
+        def nullify(landmarks):
+            if len(landmarks) == 0:
+                return None
+            return landmarks
+
+        def intify(bbox):
+            if bbox is None:
+                return None
+            # convert to python int from np.int64 and other weird int types
+            return [int(i) for i in bbox]
+
+        # print(numpyfy(nullify(keypoints["face_landmarks"])))
+
+        # build up the geometry data
+        return FrameGeometry(
+            pose_landmarks=numpyfy(nullify(keypoints["pose_landmarks"])),
+            right_hand_landmarks=numpyfy(nullify(keypoints["right_hand_landmarks"])),
+            left_hand_landmarks=numpyfy(nullify(keypoints["left_hand_landmarks"])),
+            face_landmarks=numpyfy(nullify(keypoints["face_landmarks"])),
+            sign_space=intify(
+                # no nullify here; is never None
+                prediction["sign_space"][chunk_frame_index]
+            ),
+            right_hand_bbox=intify(
+                nullify(prediction["bbox_right_hand"][chunk_frame_index])
+            ),
+            left_hand_bbox=intify(
+                nullify(prediction["bbox_left_hand"][chunk_frame_index])
+            ),
+            face_bbox=intify(
+                nullify(prediction["bbox_face"][chunk_frame_index])
+            )
+        )
+
+
+def failed_result(job: ChunkJob, error: str) -> ChunkResult:
+    return ChunkResult(
+        chunk_start_frame=job.chunk_start_frame,
+        frame_geometries=[],
+        error=error
+    )
+
+
+ResultCallback = Callable[[ChunkJob, ChunkResult], None]
+PredictedCallback = Callable[[ChunkJob], None]
+
+
+# messages sent by workers to the pool, as (kind, worker_id, payload) tuples
+READY = "ready" # models are loaded
+STARTED = "started" # payload is the job id
+PREDICTED = "predicted" # payload is the job id, its crops are being written
+FINISHED = "finished" # payload is the (job id, chunk result) pair
+RECYCLED = "recycled" # the worker exits, because it reached its job limit
+STOPPED = "stopped" # the worker exits, because it was told to
+
+
+class _ConnectionQueue:
+    """
+    One end of a pipe between the pool and a single worker process, with
+    the queue methods the worker uses. Each worker has its own pipes, so
+    there is no lock shared by the processes, which a killed worker could
+    leave locked (as with multiprocessing.Queue). Unlike multiprocessing.Queue,
+    put() writes into the pipe synchronously (not from a feeder thread),
+    so the messages of a worker are not lost when the worker dies right after.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def put(self, item: Any):
+        self.connection.send(item)
+
+    def get(self) -> Any:
+        return self.connection.recv()
+
+
+def _worker_main(
+    worker_id: int,
+    job_queue: queue.Queue,
+    message_queue: queue.Queue,
+    max_jobs: Optional[int]
+):
+    """
+    Main function of a worker (thread or process), see MediapipeWorkerPool
+    """
+    mediapipe_models = create_mediapipe_models(MEDIAPIPE_MODELS_FOLDER)
+    crop_writer = CropWriter()
+    crop_writer.start()
+    message_queue.put((READY, worker_id, None))
+
+    processed_jobs = 0
+    while max_jobs is None or processed_jobs < max_jobs:
+        item: Optional[Tuple[int, ChunkJob]] = job_queue.get()
+
+        # stops the worker
+        if item is None:
+            crop_writer.stop()
+            message_queue.put((STOPPED, worker_id, None))
+            return
+
+        job_id, job = item
+        _run_job(
+            worker_id, job_id, job,
+            mediapipe_models, crop_writer, message_queue
+        )
+        processed_jobs += 1
+
+    crop_writer.stop()
+    message_queue.put((RECYCLED, worker_id, None))
+
+
+def _run_job(
+    worker_id: int,
+    job_id: int,
+    job: ChunkJob,
+    mediapipe_models: Any,
+    crop_writer: CropWriter,
+    message_queue: queue.Queue
+):
+    """
+    Runs mediapipe on the chunk and hands its crops over to the crop writer.
+    The job finishes (from the writer thread) once the crops are written.
+    """
+    message_queue.put((STARTED, worker_id, job_id))
+    try:
+        prediction = job.predict(mediapipe_models)
+        result = ChunkResult(
+            chunk_start_frame=job.chunk_start_frame,
+            frame_geometries=job.get_frame_geometries(prediction)
+        )
+    except Exception:
+        result = failed_result(job, traceback.format_exc())
+        message_queue.put((FINISHED, worker_id, (job_id, result)))
+        return
+    message_queue.put((PREDICTED, worker_id, job_id))
+
+    def on_written(error: Optional[str]):
+        job_result = result if error is None else failed_result(job, error)
+        message_queue.put((FINISHED, worker_id, (job_id, job_result)))
+    # blocks if the writer is behind
+    crop_writer.submit(job, prediction, on_written, result.frame_geometries)
+
+
+@dataclass
+class WorkerState:
+    """What the pool knows about one of its workers"""
+
+    worker_id: int
+    handle: Any # threading.Thread or multiprocessing.Process
+    job_inbox: Any # queue.Queue or _ConnectionQueue the worker reads
+    message_reader: Any = None # pipe end with the worker messages (process)
+    is_ready: bool = False
+    current_job_id: Optional[int] = None # given to the worker, not predicted
+    job_started_at: Optional[float] = None
+    writing_job_ids: Set[int] = field(default_factory=set) # writing crops
+    dispatched_job_count: int = 0
+    is_stopping: bool = False # was told to stop, gets no more jobs
+    is_disconnected: bool = False # its message pipe is closed or broken
+    is_recycled: bool = False
+    is_stopped: bool = False
+
+
+@dataclass
+class WorkerPoolHealth:
+    """Snapshot of the worker pool state, see MediapipeWorkerPool.health()"""
+
+    use_processes: bool
+    worker_count: int
+    "Number of running workers"
+
+    target_worker_count: int
+    "Number of workers the pool scales to, given the memory budget"
+
+    worker_memory_bytes: Optional[int]
+    "Last measured memory of the workers, None when not measured"
+
+    is_dispatch_paused: bool
+    "Submitting jobs waits, because the memory budget is exceeded"
+
+    ready_worker_count: int
+    "Number of workers with the models loaded"
+
+    busy_worker_count: int
+    "Number of workers processing a job right now"
+
+    writing_job_count: int
+    "Number of jobs mediapiped already, whose crops are being written"
+
+    pending_job_count: int
+    "Number of submitted jobs that have not finished yet"
+
+    finished_job_count: int
+    "Number of jobs finished since the pool started"
+
+    failed_job_count: int
+    "Number of jobs that finished with an error"
+
+    recycled_worker_count: int
+    "Number of workers replaced after reaching their job limit"
+
+    crashed_worker_count: int
+    "Number of workers replaced after dying or getting stuck"
+
+    @property
+    def is_healthy(self) -> bool:
+        return self.worker_count > 0
+
+
+class MediapipeWorkerPool:
+    """
+    A set of mediapipe workers with loaded models, processing chunk jobs
+    of any number of videos. The workers are either threads of this process
+    (whose python code contends on the GIL), or separate processes, in which
+    case the chunk frames have to be passed via shared memory (see ChunkJob).
+
+    Each worker hands the crops of a mediapiped chunk over to its own
+    CropWriter thread and continues with the next chunk, the job finishes
+    once its crops are written.
+
+    Each worker has its own job inbox, the pool gives the submitted jobs
+    to the workers that are idle. Workers report back through messages
+    (a pipe per worker process), read by a collector thread that calls
+    the result callbacks. The collector also replaces workers
+    that reached their job limit (to cap memory creep), died (e.g. killed by
+    the OOM killer) or got stuck on a job for too long (processes only),
+    failing the job they were processing.
+
+    With a memory budget, the pool starts only as many workers as the budget
+    grants, and the collector measures the memory of the workers, stopping
+    workers as the budget fills up and starting them again once it frees up.
+    Submitting jobs waits while the budget is exceeded.
+    """
+    def __init__(
+        self,
+        worker_count: int,
+        use_processes=False,
+        max_jobs_per_worker: Optional[int] = None,
+        job_timeout_seconds: Optional[float] = None,
+        memory_budget: Optional[MediapipeMemoryBudget] = None
+    ):
+        self.worker_count = worker_count
+        "Maximal number of workers the pool keeps running"
+
+        self.use_processes = use_processes
+        "Workers are processes if True, threads otherwise"
+
+        self.max_jobs_per_worker = max_jobs_per_worker
+        "Workers are recycled after this many jobs, None means never"
+
+        self.job_timeout_seconds = job_timeout_seconds
+        "Worker processes are killed when a job takes longer, None for never"
+
+        self.memory_budget = memory_budget
+        "Budget (shared with other pools) limiting the worker count, if any"
+
+        self._lock = threading.Condition()
+        self._workers: Dict[int, WorkerState] = {}
+        self._next_worker_id = 0
+        self._pending_jobs: Dict[
+            int, Tuple[ChunkJob, ResultCallback, Optional[PredictedCallback]]
+        ] = {}
+        self._predicted_job_ids: Set[int] = set() # released their job slot
+        self._queued_jobs: collections.deque = collections.deque() # no worker
+        self._next_job_id = 0
+        self._is_running = False
+
+        self._finished_job_count = 0
+        self._failed_job_count = 0
+        self._recycled_worker_count = 0
+        self._crashed_worker_count = 0
+        self._target_worker_count = worker_count
+        self._worker_memory_bytes: Optional[int] = None
+        self._is_dispatch_paused = False
+
+    def start(self):
+        """Starts the workers, which start loading their models"""
+        if self.use_processes:
+            # spawn, because forking a process with running threads
+            # (and initialized mediapipe/tensorflow state) is not safe
+            self._context = multiprocessing.get_context("spawn")
+        else:
+            self._message_queue = queue.Queue()
+
+        # jobs waiting in the queue or being mediapiped
+        self._free_job_slots = threading.Semaphore(self.worker_count + 1)
+
+        if self.memory_budget is not None:
+            self._target_worker_count = self.memory_budget.reserve_workers(
+                id(self), self.worker_count
+            )
+
+        with self._lock:
+            self._is_running = True
+            for _ in range(self._target_worker_count):
+                self._start_worker()
+
+        self._collector = threading.Thread(
+            target=lambda: self._collect_messages(),
+            daemon=True
+        )
+        self._collector.start()
+
+    def _start_worker(self):
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+
+        if self.use_processes:
+            job_reader, job_writer = self._context.Pipe(duplex=False)
+            message_reader, message_writer = self._context.Pipe(duplex=False)
+            handle = self._context.Process(
+                target=_worker_main,
+                args=(
+                    worker_id,
+                    _ConnectionQueue(job_reader),
+                    _ConnectionQueue(message_writer),
+                    self.max_jobs_per_worker
+                ),
+                daemon=True
+            )
+            handle.start()
+            # only the worker holds these ends now, so the pipes report EOF
+            # once the worker dies
+            job_reader.close()
+            message_writer.close()
+            worker = WorkerState(
+                worker_id, handle,
+                job_inbox=_ConnectionQueue(job_writer),
+                message_reader=message_reader
+            )
+        else:
+            job_inbox = queue.Queue()
+            handle = threading.Thread(
+                target=_worker_main,
+                args=(
+                    worker_id,
+                    job_inbox,
+                    self._message_queue,
+                    self.max_jobs_per_worker
+                ),
+                daemon=True
+            )
+            handle.start()
+            worker = WorkerState(worker_id, handle, job_inbox=job_inbox)
+        self._workers[worker_id] = worker
+
+    def submit(
+        self,
+        job: ChunkJob,
+        on_result: ResultCallback,
+        on_predicted: Optional[PredictedCallback] = None
+    ):
+        """
+        Enqueues a job, blocking while all workers are busy. The callbacks
+        are called from another thread once mediapipe is done with the job
+        frames (on_predicted, only if it succeeds) and once the job finishes.
+        """
+        self._free_job_slots.acquire()
+        self._wait_for_memory()
+        with self._lock:
+            if not self._is_running:
+                self._free_job_slots.release()
+                raise Exception("The mediapipe worker pool is not running.")
+            job_id = self._next_job_id
+            self._next_job_id += 1
+            self._pending_jobs[job_id] = (job, on_result, on_predicted)
+            self._queued_jobs.append((job_id, job))
+            self._dispatch_jobs()
+
+    def _can_take_job(self, worker: WorkerState) -> bool:
+        return (
+            worker.is_ready
+            and worker.current_job_id is None
+            and not worker.is_stopping
+            and not worker.is_disconnected
+            and (
+                # a worker about to be recycled would not read the job
+                self.max_jobs_per_worker is None
+                or worker.dispatched_job_count < self.max_jobs_per_worker
+            )
+        )
+
+    def _dispatch_jobs(self):
+        """Gives the queued jobs to the idle workers, called under the lock"""
+        for worker in self._workers.values():
+            if len(self._queued_jobs) == 0:
+                return
+            if not self._can_take_job(worker):
+                continue
+            job_id, job = self._queued_jobs.popleft()
+            try:
+                worker.job_inbox.put((job_id, job))
+            except OSError:
+                # the worker died, the job goes to another one
+                self._queued_jobs.appendleft((job_id, job))
+                worker.is_disconnected = True
+                continue
+            worker.current_job_id = job_id
+            worker.job_started_at = None
+            worker.dispatched_job_count += 1
+
+    def _stop_worker(self, worker: WorkerState):
+        """Tells the worker to exit after its jobs, called under the lock"""
+        worker.is_stopping = True
+        try:
+            worker.job_inbox.put(None)
+        except OSError:
+            pass # already dead
+
+    def _wait_for_memory(self):
+        """
+        Pauses dispatching while the memory budget is exceeded, as long as
+        there are jobs in progress, whose workers may free the memory
+        """
+        if self.memory_budget is None:
+            return
+        while self.memory_budget.is_exceeded():
+            with self._lock:
+                if len(self._pending_jobs) == 0 or not self._is_running:
+                    break
+                self._is_dispatch_paused = True
+            time.sleep(0.5)
+        with self._lock:
+            self._is_dispatch_paused = False
+
+    def health(self) -> WorkerPoolHealth:
+        with self._lock:
+            workers = list(self._workers.values())
+            return WorkerPoolHealth(
+                use_processes=self.use_processes,
+                worker_count=len(workers),
+                target_worker_count=self._target_worker_count,
+                worker_memory_bytes=self._worker_memory_bytes,
+                is_dispatch_paused=self._is_dispatch_paused,
+                ready_worker_count=sum(w.is_ready for w in workers),
+                busy_worker_count=sum(
+                    w.current_job_id is not None for w in workers
+                ),
+                writing_job_count=sum(len(w.writing_job_ids) for w in workers),
+                pending_job_count=len(self._pending_jobs),
+                finished_job_count=self._finished_job_count,
+                failed_job_count=self._failed_job_count,
+                recycled_worker_count=self._recycled_worker_count,
+                crashed_worker_count=self._crashed_worker_count
+            )
+
+    def stop(self):
+        """Lets the workers finish the submitted jobs and terminates them"""
+        with self._lock:
+            while len(self._pending_jobs) > 0:
+                self._lock.wait()
+            self._is_running = False
+            workers = list(self._workers.values())
+            for w in workers:
+                if not w.is_stopping:
+                    self._stop_worker(w)
+
+        for w in workers:
+            w.handle.join()
+        self._collector.join()
+        self._release_memory_budget()
+
+    def terminate(self):
+        """Stops the workers immediately, failing the submitted jobs"""
+        if not self.use_processes:
+            self.stop() # threads cannot be killed, let them finish
+            return
+
+        with self._lock:
+            self._is_running = False
+            workers = list(self._workers.values())
+            self._queued_jobs.clear()
+        for w in workers:
+            w.handle.kill()
+            w.handle.join()
+        self._collector.join()
+        self._release_memory_budget()
+        self._fail_jobs(
+            list(self._pending_jobs.keys()),
+            "The worker pool was terminated."
+        )
+
+    # collector thread
+
+    def _collect_messages(self):
+        last_check = time.monotonic()
+        while True:
+            # the pool is shared by all videos, so the collector must not die
+            try:
+                if time.monotonic() - last_check > 1.0:
+                    last_check = time.monotonic()
+                    if not self._check_workers():
+                        return
+
+                for message in self._receive_messages(timeout=0.5):
+                    self._handle_message(message)
+            except Exception:
+                logging.exception("The mediapipe worker pool collector failed:")
+
+    def _receive_messages(self, timeout: float) -> List[tuple]:
+        """Waits for the next messages of the workers"""
+        if not self.use_processes:
+            try:
+                return [self._message_queue.get(timeout=timeout)]
+            except queue.Empty:
+                return []
+
+        with self._lock:
+            readers = {
+                w.message_reader: w for w in self._workers.values()
+                if not w.is_disconnected
+            }
+        if len(readers) == 0:
+            time.sleep(timeout)
+            return []
+
+        messages = []
+        for reader in wait_for_connections(list(readers.keys()), timeout):
+            try:
+                messages.append(reader.recv())
+            except (EOFError, OSError, pickle.UnpicklingError):
+                # the worker exited, or died in the middle of a message
+                self._disconnect_worker(readers[reader])
+        return messages
+
+    def _disconnect_worker(self, worker: WorkerState):
+        """
+        Stops reading the messages of the worker and makes sure it is dead,
+        the next check of the workers replaces it
+        """
+        with self._lock:
+            worker.is_disconnected = True
+        if worker.handle.is_alive():
+            worker.handle.kill()
+        worker.handle.join()
+
+    def _handle_message(self, message: tuple):
+        kind, worker_id, payload = message
+        with self._lock:
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                return # a message from an already replaced worker
+            if kind == READY:
+                worker.is_ready = True
+            elif kind == STARTED:
+                worker.current_job_id = payload
+                worker.job_started_at = time.monotonic()
+            elif kind == PREDICTED:
+                worker.current_job_id = None
+                worker.job_started_at = None
+                worker.writing_job_ids.add(payload)
+            elif kind == FINISHED:
+                job_id, _ = payload
+                worker.writing_job_ids.discard(job_id)
+                if worker.current_job_id == job_id:
+                    worker.current_job_id = None
+                    worker.job_started_at = None
+            elif kind == RECYCLED:
+                worker.is_recycled = True
+            elif kind == STOPPED:
+                worker.is_stopped = True
+            self._dispatch_jobs()
+
+        if kind == PREDICTED:
+            self._on_job_predicted(payload)
+        elif kind == FINISHED:
+            job_id, result = payload
+            self._finish_job(job_id, result)
+
+    def _check_workers(self) -> bool:
+        """
+        Replaces workers that exited or got stuck, returns False when the pool
+        has stopped and the collector should end
+        """
+        with self._lock:
+            for worker in self._workers.values():
+                is_stuck = (
+                    self.use_processes
+                    and self.job_timeout_seconds is not None
+                    and worker.job_started_at is not None
+                    and time.monotonic() - worker.job_started_at
+                        > self.job_timeout_seconds
+                )
+                if is_stuck:
+                    worker.handle.kill()
+                    worker.handle.join()
+            exited_workers = [
+                w for w in self._workers.values() if not w.handle.is_alive()
+            ]
+
+        # everything the exited workers sent is in the pipes by now,
+        # so handle it before deciding what they were doing when exiting
+        while True:
+            messages = self._receive_messages(timeout=0)
+            if len(messages) == 0:
+                break
+            for message in messages:
+                self._handle_message(message)
+
+        failed_job_ids = []
+        with self._lock:
+            for worker in exited_workers:
+                del self._workers[worker.worker_id]
+                if worker.is_recycled:
+                    self._recycled_worker_count += 1
+                elif self._is_running and not worker.is_stopped:
+                    self._crashed_worker_count += 1
+                job_id = worker.current_job_id
+                if job_id is not None:
+                    if worker.job_started_at is None \
+                    and job_id in self._pending_jobs:
+                        # never started, another worker can process it
+                        job = self._pending_jobs[job_id][0]
+                        self._queued_jobs.appendleft((job_id, job))
+                    else:
+                        failed_job_ids.append(job_id)
+                failed_job_ids += worker.writing_job_ids
+                if worker.message_reader is not None:
+                    worker.message_reader.close()
+                    worker.job_inbox.connection.close()
+            while (
+                self._is_running
+                and len(self._workers) < self._target_worker_count
+            ):
+                self._start_worker()
+            self._dispatch_jobs()
+            has_stopped = not self._is_running and len(self._workers) == 0
+
+        self._fail_jobs(
+            failed_job_ids,
+            "The mediapipe worker died while processing the chunk."
+        )
+        self._adjust_to_memory_budget()
+        return not has_stopped
+
+    def _adjust_to_memory_budget(self):
+        """Measures the workers and scales their count within the budget"""
+        if self.memory_budget is None:
+            return
+
+        with self._lock:
+            if not self._is_running:
+                return
+            workers = list(self._workers.values())
+
+        if self.use_processes:
+            worker_rss = [read_process_rss_bytes(w.handle.pid) for w in workers]
+            used_bytes = sum(rss for rss in worker_rss if rss is not None)
+        else:
+            used_bytes = self.memory_budget.measure_thread_workers(id(self))
+        self.memory_budget.report_usage(
+            id(self), used_bytes, is_server_process=not self.use_processes
+        )
+
+        with self._lock:
+            self._worker_memory_bytes = used_bytes
+            if self.memory_budget.should_remove_worker(id(self)):
+                self._target_worker_count -= 1
+                workers = [
+                    w for w in self._workers.values() if not w.is_stopping
+                ]
+                if len(workers) > 0:
+                    # preferably an idle one, it exits after its jobs
+                    self._stop_worker(min(
+                        workers, key=lambda w: w.current_job_id is not None
+                    ))
+            elif self.memory_budget.should_add_worker(
+                id(self), self.worker_count
+            ):
+                # started by the next check of the workers
+                self._target_worker_count += 1
+
+    def _release_memory_budget(self):
+        if self.memory_budget is not None:
+            self.memory_budget.release_workers(id(self))
+
+    def _fail_jobs(self, job_ids: List[int], error: str):
+        for job_id in job_ids:
+            with self._lock:
+                if job_id not in self._pending_jobs:
+                    continue
+                job = self._pending_jobs[job_id][0]
+            self._finish_job(job_id, failed_result(job, error))
+
+    def _on_job_predicted(self, job_id: int):
+        """
+        The worker is done with the job frames and continues with another
+        job, while its crop writer finishes this one
+        """
+        with self._lock:
+            if job_id not in self._pending_jobs:
+                return
+            job, _, on_predicted = self._pending_jobs[job_id]
+            self._predicted_job_ids.add(job_id)
+        self._free_job_slots.release()
+        if on_predicted is not None:
+            try:
+                on_predicted(job)
+            except Exception:
+                logging.exception("Handling a mediapiped job failed:")
+                self._finish_job(
+                    job_id, failed_result(job, traceback.format_exc())
+                )
+
+    def _finish_job(self, job_id: int, result: ChunkResult):
+        with self._lock:
+            if job_id not in self._pending_jobs:
+                return # already failed, when its worker was declared dead
+            job, on_result, _ = self._pending_jobs.pop(job_id)
+            was_predicted = job_id in self._predicted_job_ids
+            self._predicted_job_ids.discard(job_id)
+            self._finished_job_count += 1
+            if result.error is not None:
+                self._failed_job_count += 1
+            self._lock.notify_all()
+        if not was_predicted:
+            self._free_job_slots.release()
+        try:
+            on_result(job, result)
+        except Exception:
+            error = traceback.format_exc()
+            logging.exception("Handling the result of a mediapipe job failed:")
+            if result.error is None:
+                # lets the caller know the job did not make it
+                try:
+                    on_result(job, failed_result(job, error))
+                except Exception:
+                    logging.exception(
+                        "Handling the result of a mediapipe job failed:"
+                    )
@@ -0,0 +1,190 @@
+from pathlib import Path
+from typing import Optional
+from ..video.Frame import Frame
+from ..video.ArrayFrameStream import ArrayFrameStream
+from ..video.FrameStreamTee import FrameStreamTee, FrameConsumer
+from .FixedLengthVideoClipper import FixedLengthVideoClipper
+from ..domain.ClipsCollection import ClipsCollection
+from .VideoNormalizer import VideoNormalizer, TRANSCODED
+from .FrameEnumerator import EnumeratingFrameStream
+from .MediapipeProcessor import MediapipeProcessor
+import numpy as np
+import logging
+import ffmpeg
+
+
+class NormalizedFileWriter(FrameConsumer):
+    """Encodes the consumed frames into the normalized MP4 video file"""
+    def __init__(self, output_video_path: Path):
+        self.output_video_path = output_video_path
+        self._process = None
+
+    def start(self, framerate: float, width: int, height: int):
+        self._process = (
+            ffmpeg
+            .input(
+                "pipe:",
+                format="rawvideo",
+                pix_fmt="bgr24",
+                s=f"{width}x{height}",
+                r=framerate
+            )
+            .output(
+                str(self.output_video_path),
+                pix_fmt="yuv420p",
+                vcodec="libx264",
+                r=framerate
+            )
+            .overwrite_output()
+            .global_args("-loglevel", "error")
+            .run_async(pipe_stdin=True)
+        )
+
+    def consume(self, frame: Frame):
+        self._process.stdin.write(np.ascontiguousarray(frame.img))
+
+    def finish(self):
+        self._process.stdin.close()
+        self._process.wait()
+        if self._process.returncode != 0:
+            raise Exception("Encoding of the normalized video file failed.")
+
+    def abort(self):
+        if self._process is None:
+            return
+        self._process.kill()
+        self._process.wait()
+
+
+class FixedLengthClipPlanner(FrameConsumer):
+    """
+    Counts the frames as they pass by and plans the clips with the
+    FixedLengthVideoClipper once the frame count is known
+    """
+    def __init__(
+        self,
+        clip_length_seconds: float,
+        min_tail_seconds=0.0,
+        overlap_seconds=0.0
+    ):
+        self.clip_length_seconds = clip_length_seconds
+        self.min_tail_seconds = min_tail_seconds
+        self.overlap_seconds = overlap_seconds
+        self.clips_collection = ClipsCollection()
+        self._frame_count = 0
+
+    def start(self, framerate: float, width: int, height: int):
+        self._framerate = framerate
+
+    def consume(self, frame: Frame):
+        self._frame_count += 1
+
+    def finish(self):
+        self.clips_collection = FixedLengthVideoClipper(
+            frame_count=self._frame_count,
+            framerate=self._framerate,
+            clip_length_seconds=self.clip_length_seconds,
+            min_tail_seconds=self.min_tail_seconds,
+            overlap_seconds=self.overlap_seconds
+        ).run()
+
+
+class MediapipeFeeder(FrameConsumer):
+    """Groups consumed frames into chunks and submits them to mediapipe"""
+    def __init__(self, mediapipe: MediapipeProcessor):
+        self.mediapipe = mediapipe
+        self._chunk: Optional[ArrayFrameStream] = None
+
+    def start(self, framerate: float, width: int, height: int):
+        self._framerate = framerate
+        self._chunk_frame_count = int(
+            self.mediapipe.chunking_period_seconds * framerate
+        )
+        self.mediapipe.start(source_framerate=framerate)
+        self._buffer_pool = self.mediapipe.create_chunk_buffer_pool(
+            capacity=self._chunk_frame_count,
+            width=width,
+            height=height
+        )
+
+    def consume(self, frame: Frame):
+        if self._chunk is None:
+            self._chunk = self._buffer_pool.create_stream(self._framerate)
+        self._chunk.write_frame(frame) # copies, other consumers share the frame
+
+        if len(self._chunk) == self._chunk_frame_count:
+            self._submit_chunk()
+
+    def finish(self):
+        if self._chunk is not None:
+            self._submit_chunk()
+        self.mediapipe.finish()
+
+    def abort(self):
+        self.mediapipe.abort()
+
+    def _submit_chunk(self):
+        self._chunk.seek(0)
+        self.mediapipe.submit_chunk(self._chunk)
+        self._chunk = None
+
+
+class SingleDecodeIngest:
+    """
+    Performs normalization, frame enumeration, clip planning and mediapipe
+    in one pass over the uploaded video. The video is decoded only once
+    (with the normalization done by ffmpeg filters during decoding) and each
+    frame is then handed to the normalized file encoder, the clip planner
+    and the mediapipe job queue.
+    """
+    def __init__(
+        self,
+        normalizer: VideoNormalizer,
+        normalized_video_file: Path,
+        mediapipe: MediapipeProcessor,
+        clip_length_seconds: float,
+        logger: logging.Logger,
+        write_frame_numbers=True,
+        clip_min_tail_seconds=0.0,
+        clip_overlap_seconds=0.0
+    ):
+        self.normalizer = normalizer
+        self.normalized_video_file = normalized_video_file
+        self.mediapipe = mediapipe
+        self.clip_length_seconds = clip_length_seconds
+        self.logger = logger
+        self.write_frame_numbers = write_frame_numbers
+        self.clip_min_tail_seconds = clip_min_tail_seconds
+        self.clip_overlap_seconds = clip_overlap_seconds
+
+    def run(self) -> ClipsCollection:
+        """Runs the ingest and returns the planned clips collection"""
+        decoded_stream = self.normalizer.open_normalized_frame_stream()
+        frame_stream = decoded_stream
+        if self.write_frame_numbers:
+            frame_stream = EnumeratingFrameStream(frame_stream)
+
+        clip_planner = FixedLengthClipPlanner(
+            self.clip_length_seconds,
+            self.clip_min_tail_seconds,
+            self.clip_overlap_seconds
+        )
+        consumers = [clip_planner, MediapipeFeeder(self.mediapipe)]
+
+        # without the frame numbers, a compliant upload is just remuxed
+        # and the frames are decoded only for the other consumers
+        if not self.write_frame_numbers and self.normalizer.can_remux():
+            self.normalizer.remux()
+        else:
+            self.normalizer.decision = TRANSCODED
+            consumers.insert(0, NormalizedFileWriter(self.normalized_video_file))
+
+        tee = FrameStreamTee(in_stream=frame_stream, consumers=consumers)
+        try:
+            frame_count = tee.run()
+        finally:
+            decoded_stream.close()
+
+        self.logger.info(f"Ingested {frame_count} frames in a single decode.")
+
+        return clip_planner.clips_collection
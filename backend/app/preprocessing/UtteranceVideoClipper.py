@@ -0,0 +1,134 @@
+from ..domain.ClipsCollection import ClipsCollection
+from ..domain.Clip import Clip
+from ..domain.VideoGeometry import VideoGeometry
+from .idle_detection import hand_positions, is_hand_raised
+from typing import List, Optional
+from pathlib import Path
+import numpy as np
+
+
+PAUSE_SPEED = 0.15
+"Hands slower than this (signing space widths per second) are not signing"
+
+SMOOTHING_SECONDS = 0.3
+"Window of the moving average smoothing the hand speed"
+
+MIN_PAUSE_SECONDS = 0.3
+"Shortest pause between two utterances"
+
+
+def _moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    if window <= 1 or len(values) == 0:
+        return values
+    kernel = np.ones(window) / window
+    padded = np.pad(values, (window // 2, window - 1 - window // 2), mode="edge")
+    return np.convolve(padded, kernel, mode="valid")
+
+
+class UtteranceVideoClipper:
+    """
+    Splits the video into variable-length clips at the pauses between
+    utterances, found from the geometry: a frame is a pause when both hands
+    rest (are not detected or are at the bottom of the signing space)
+    or barely move. Each clip is cut in the middle of its latest pause,
+    keeping its length between the minimum and the maximum; a clip
+    with no pause is cut as late as possible where the hands move
+    the least.
+    """
+
+    def __init__(
+        self,
+        geometry_folder: Path,
+        framerate: float,
+        min_clip_seconds: float,
+        max_clip_seconds: float,
+        legacy_geometry_file: Optional[Path] = None
+    ):
+        self.geometry_folder = geometry_folder
+        self.framerate = framerate
+        self.min_clip_seconds = min_clip_seconds
+        self.max_clip_seconds = max_clip_seconds
+        self.legacy_geometry_file = legacy_geometry_file
+
+    def run(self) -> ClipsCollection:
+        geometry = VideoGeometry.load_any(
+            self.geometry_folder, self.legacy_geometry_file
+        )
+        activity = self.measure_activity(geometry)
+        boundaries = self.find_boundaries(activity)
+
+        clips_collection = ClipsCollection()
+        for clip_index, (start, end) in enumerate(
+            zip(boundaries, boundaries[1:])
+        ):
+            clips_collection.clips.append(Clip(
+                clip_index=clip_index,
+                start_frame=start,
+                frame_count=end - start
+            ))
+        clips_collection.recompute_lookup_table()
+
+        return clips_collection
+
+    def measure_activity(self, geometry: VideoGeometry) -> np.ndarray:
+        """
+        Smoothed speed (signing space widths per second) of the faster
+        non-resting hand in each frame, 0 where both hands rest
+        """
+        sign_space = geometry.sign_space.astype(np.float64)
+        scale = np.maximum(sign_space[:, 2] - sign_space[:, 0], 1)
+
+        hand_speeds = []
+        for hand in ["right_hand", "left_hand"]:
+            positions, is_known = hand_positions(geometry, hand)
+            is_raised = is_hand_raised(geometry, positions, is_known)
+
+            speed = np.zeros(len(geometry))
+            if len(geometry) > 1:
+                distance = np.linalg.norm(np.diff(positions, axis=0), axis=1)
+                speed[1:] = distance / scale[1:] * self.framerate
+                speed[1:][~(is_known[1:] & is_known[:-1])] = 0
+            hand_speeds.append(np.where(is_raised, speed, 0))
+
+        window = int(round(SMOOTHING_SECONDS * self.framerate))
+        return _moving_average(np.maximum(*hand_speeds), window)
+
+    def find_boundaries(self, activity: np.ndarray) -> List[int]:
+        """Frame indices where the clips start, plus the video end"""
+        frame_count = len(activity)
+        if frame_count == 0:
+            return [0]
+        min_length = max(1, int(self.min_clip_seconds * self.framerate))
+        max_length = max(min_length, int(self.max_clip_seconds * self.framerate))
+
+        # centers of the pauses long enough to separate utterances
+        is_pause = np.concatenate([[False], activity < PAUSE_SPEED, [False]])
+        edges = np.diff(is_pause.astype(np.int8))
+        pause_starts = np.nonzero(edges == 1)[0]
+        pause_ends = np.nonzero(edges == -1)[0]
+        is_long = pause_ends - pause_starts >= MIN_PAUSE_SECONDS * self.framerate
+        cuts = ((pause_starts + pause_ends) // 2)[is_long]
+
+        boundaries = [0]
+        while frame_count - boundaries[-1] > max_length:
+            start = boundaries[-1]
+            # leave at least the minimum length for the rest of the video
+            window_end = min(start + max_length, frame_count - min_length)
+            if window_end < start + min_length:
+                window_end = start + max_length
+            window_cuts = cuts[
+                (cuts >= start + min_length) & (cuts <= window_end)
+            ]
+            if len(window_cuts) > 0:
+                cut = int(window_cuts[-1])
+            else:
+                # no pause, cut where the hands move the least,
+                # the latest such frame on ties
+                window = activity[start + min_length:window_end + 1]
+                cut = start + min_length + len(window) - 1 \
+                    - int(np.argmin(window[::-1]))
+            boundaries.append(cut)
+
+        # the rest fits into one clip
+        boundaries.append(frame_count)
+        return boundaries
@@ -1,18 +1,78 @@
 import os
 import math
 import ffmpeg
+import shutil
+import tempfile
 import warnings
-import numpy as np
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from ..video.FfmpegFrameStream import FfmpegFrameStream
+
+ENGINES = ['ffmpeg', 'python']
+"""
+The 'ffmpeg' engine runs the whole normalization as one ffmpeg filter graph,
+the 'python' engine pipes decoded frames through python into a second ffmpeg
+process and is only kept as a fallback.
+"""
+
+REMUXED = 'remuxed'
+"The input was already compliant, its video stream was copied without re-encoding"
+
+TRANSCODED = 'transcoded'
+"The input was decoded and encoded again with the normalized parameters"
+
+SEGMENTED_FILTER_GRAPH = 'segmented_filter_graph'
+"Transcoded by ffmpeg in parallel keyframe-aligned segments"
+
+FILTER_GRAPH = 'filter_graph'
+"Transcoded by a single ffmpeg filter graph"
+
+PYTHON_PIPE = 'python_pipe'
+"Transcoded by piping the frames through python"
+
+def _transcode_segment(input_path, output_path, filters, fps, threads):
+    """Transcodes one segment of the video with the normalization filters"""
+    stream = ffmpeg.input(str(input_path)).video
+    for filter_name, filter_kwargs in filters:
+        stream = stream.filter(filter_name, **filter_kwargs)
+    (
+        stream
+        .output(str(output_path), pix_fmt='yuv420p', vcodec='libx264', r=fps, threads=threads)
+        .overwrite_output()
+        .global_args('-loglevel', 'error')
+        .run(capture_stderr=True)
+    )
+
+def _count_video_packets(video_path):
+    """Counts frames of the first video stream without decoding them"""
+    probe = ffmpeg.probe(str(video_path), select_streams='v:0', count_packets=None)
+    return int(probe['streams'][0]['nb_read_packets'])
 
 class VideoNormalizer:
     """Normalizes fps and resolution of demo input video"""
-    def __init__(self, input_video_path, output_video_path, target_size=1280, sum_pixels=921600, fps_lower_bound=24, fps_higher_bound=30):
+    def __init__(self, input_video_path, output_video_path, target_size=1280, sum_pixels=921600, fps_lower_bound=24, fps_higher_bound=30, engine='ffmpeg', allow_remux=True, segment_workers=1, segment_seconds=30, min_segmented_duration=120):
         self.target_size = target_size
         self.sum_pixels = sum_pixels
         self.input_video_path = input_video_path
         self.output_video_path = output_video_path
         self.fps_lower_bound = fps_lower_bound
         self.fps_higher_bound = fps_higher_bound
+        self.engine = engine
+        self.allow_remux = allow_remux
+        self.segment_workers = segment_workers
+        self.segment_seconds = segment_seconds
+        self.min_segmented_duration = min_segmented_duration
+        self.decision = None
+        "Either REMUXED or TRANSCODED, set once the video is processed"
+        self.transcoding_path = None
+        """
+        How the video was transcoded, one of SEGMENTED_FILTER_GRAPH,
+        FILTER_GRAPH or PYTHON_PIPE (None when remuxed), as the segmented
+        and the filter graph transcoding fall back to the slower ones
+        """
+
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown normalization engine '{engine}', use one of {ENGINES}.")
 
         if not os.path.exists(self.input_video_path):
             raise FileNotFoundError(f"Input video file '{self.input_video_path}' does not exist.")
@@ -24,6 +84,7 @@ class VideoNormalizer:
         if not video_stream:
             raise ValueError("Error: Could not find video stream in input video.")
         
+        self.video_stream = video_stream
         self.original_fps = eval(video_stream['r_frame_rate'])
 
         self.frame_width = int(video_stream['width'])
@@ -34,79 +95,273 @@ class VideoNormalizer:
 
     def process_video(self):
         """Defines what to do with the input video"""
+        if self.allow_remux and self.can_remux():
+            try:
+                self.remux()
+                return
+            except ffmpeg.Error as e:
+                stderr = e.stderr.decode('utf-8', errors='replace') if e.stderr else ''
+                warnings.warn(f"Warning: remuxing failed, transcoding instead. {stderr}")
+
+        self.decision = TRANSCODED
+
+        if self.engine == 'ffmpeg' and self.can_transcode_in_segments():
+            try:
+                if self._run_segmented_filter_graph():
+                    self.transcoding_path = SEGMENTED_FILTER_GRAPH
+                    return
+            except ffmpeg.Error as e:
+                stderr = e.stderr.decode('utf-8', errors='replace') if e.stderr else ''
+                warnings.warn(f"Warning: segmented transcoding failed, transcoding serially instead. {stderr}")
+
+        if self.engine == 'ffmpeg':
+            try:
+                self._run_filter_graph()
+                self.transcoding_path = FILTER_GRAPH
+                return
+            except ffmpeg.Error as e:
+                stderr = e.stderr.decode('utf-8', errors='replace') if e.stderr else ''
+                warnings.warn(f"Warning: ffmpeg filter graph normalization failed, falling back to the python engine. {stderr}")
+
+        self.transcoding_path = PYTHON_PIPE
         if self.original_fps >= self.fps_lower_bound and self.original_fps <= self.fps_higher_bound:
             self._copy_frames()
         elif self.original_fps > self.fps_higher_bound:
             self._reduce_fps()
         else:
             self._increase_fps()
-    
-    def _copy_frames(self):
-        """Copies video frames in case of keeping the frame rate"""
-        process = (
+
+    def can_remux(self):
+        """
+        True if the input already is what normalization would produce,
+        so its video stream can be copied into the output without re-encoding
+        """
+        if self.video_stream.get('codec_name') != 'h264':
+            return False
+        if self.video_stream.get('pix_fmt') != 'yuv420p':
+            return False
+        if 'mp4' not in self.probe['format'].get('format_name', '').split(','):
+            return False
+        if (self.frame_height * self.frame_width) > self.sum_pixels:
+            return False
+        if not (self.fps_lower_bound <= self.original_fps <= self.fps_higher_bound):
+            return False
+
+        # variable frame rate videos are turned to constant ones by transcoding
+        if not self._is_constant_frame_rate():
+            return False
+
+        # rotated videos (typically phone recordings) are transcoded upright
+        rotate_tag = self.video_stream.get('tags', {}).get('rotate', '0')
+        if int(rotate_tag) % 360 != 0:
+            return False
+        for side_data in self.video_stream.get('side_data_list', []):
+            if int(side_data.get('rotation', 0)) % 360 != 0:
+                return False
+
+        return True
+
+    def _is_constant_frame_rate(self):
+        """True if the average frame rate matches the nominal frame rate"""
+        avg_fps_fraction = self.video_stream.get('avg_frame_rate', '0/0')
+        if avg_fps_fraction.endswith('/0'):
+            return False
+        avg_fps = eval(avg_fps_fraction)
+        return abs(avg_fps - self.original_fps) <= 0.01 * self.original_fps
+
+    def can_transcode_in_segments(self):
+        """
+        True if the video is long enough to be transcoded in parallel segments
+        and the segmented output is guaranteed to have the same frames as the
+        serial one. That only holds when no fps filter is needed, because
+        the fps filter resamples frames relative to the start of its input,
+        which differs for each segment.
+        """
+        if self.segment_workers <= 1:
+            return False
+        duration = float(self.probe['format'].get('duration', 0))
+        if duration < self.min_segmented_duration:
+            return False
+        if self.output_fps != self.original_fps:
+            return False
+        return self._is_constant_frame_rate()
+
+    def remux(self):
+        """Copies the video stream into the output file without re-encoding"""
+        (
             ffmpeg
             .input(self.input_video_path)
-            .output('pipe:', format='rawvideo', pix_fmt='rgb24')
-            .run_async(pipe_stdout=True)
+            .video
+            .output(self.output_video_path, vcodec='copy', movflags='+faststart')
+            .overwrite_output()
+            .global_args('-loglevel', 'error')
+            .run(capture_stderr=True)
         )
+        self.decision = REMUXED
 
-        frame_size = self.frame_width * self.frame_height * 3
-        while True:
-            in_bytes = process.stdout.read(frame_size)
-            if not in_bytes:
-                break
+    def _normalization_filters(self):
+        """Lists the ffmpeg filters that turn the input into the normalized video"""
+        filters = []
+        if self.output_fps != self.original_fps:
+            filters.append(('fps', {'fps': self.fps_lower_bound, 'round': 'down'}))
 
-            self._write_frame_to_output(in_bytes, self.original_fps)
+        width, height = self.output_dimensions
+        if (width, height) != (self.frame_width, self.frame_height):
+            filters.append(('scale', {'w': width, 'h': height}))
 
-        process.stdout.close()
-        process.wait()
+        return filters
 
-    def _reduce_fps(self):
-        """Reduces the frame rate"""
-        process = (
-            ffmpeg
-            .input(self.input_video_path)
-            .filter('fps', fps=self.fps_lower_bound, round='down')
-            .output('pipe:', format='rawvideo', pix_fmt='rgb24')
-            .global_args('-loglevel', 'quiet')  # Suppress ffmpeg console output
-            .run_async(pipe_stdout=True)
+    def _run_filter_graph(self):
+        """Decodes, filters and encodes the video in a single ffmpeg process"""
+        stream = ffmpeg.input(self.input_video_path).video
+        for filter_name, filter_kwargs in self._normalization_filters():
+            stream = stream.filter(filter_name, **filter_kwargs)
+        (
+            stream
+            .output(self.output_video_path, pix_fmt='yuv420p', vcodec='libx264', r=self.output_fps)
+            .overwrite_output()
+            .global_args('-loglevel', 'error')
+            .run(capture_stderr=True)
         )
 
-        frame_size = self.frame_width * self.frame_height * 3
-        while True:
-            in_bytes = process.stdout.read(frame_size)
-            if not in_bytes:
-                break
+    def _run_segmented_filter_graph(self):
+        """
+        Splits the input at keyframes, transcodes the segments in parallel
+        ffmpeg processes and concatenates them into the output file.
+        Returns False if the result would not match the serial transcoding.
+        """
+        output_path = Path(self.output_video_path)
+        work_folder = Path(tempfile.mkdtemp(
+            prefix='segments_', dir=output_path.parent
+        ))
+        try:
+            # split at keyframes without re-encoding
+            (
+                ffmpeg
+                .input(self.input_video_path)
+                .video
+                .output(
+                    str(work_folder / 'input_%05d.mkv'),
+                    vcodec='copy',
+                    f='segment',
+                    segment_time=self.segment_seconds,
+                    reset_timestamps=1
+                )
+                .global_args('-loglevel', 'error')
+                .run(capture_stderr=True)
+            )
+            input_segments = sorted(work_folder.glob('input_*.mkv'))
+            output_segments = [
+                segment.with_name(segment.name.replace('input_', 'output_'))
+                for segment in input_segments
+            ]
 
-            self._write_frame_to_output(in_bytes, self.fps_lower_bound)
+            # transcode the segments in parallel, each ffmpeg gets its share
+            # of the cores, since libx264 would use all of them by default
+            filters = self._normalization_filters()
+            threads = max(1, (os.cpu_count() or 1) // self.segment_workers)
+            with ThreadPoolExecutor(max_workers=self.segment_workers) as pool:
+                list(pool.map(
+                    lambda paths: _transcode_segment(
+                        paths[0], paths[1], filters, self.output_fps, threads
+                    ),
+                    zip(input_segments, output_segments)
+                ))
 
-        process.stdout.close()
-        process.wait()
+            # concatenate the transcoded segments
+            list_file = work_folder / 'segments.txt'
+            list_file.write_text(''.join(
+                f"file '{segment.name}'\n" for segment in output_segments
+            ))
+            (
+                ffmpeg
+                .input(str(list_file), f='concat', safe=0)
+                .output(self.output_video_path, c='copy', movflags='+faststart')
+                .overwrite_output()
+                .global_args('-loglevel', 'error')
+                .run(capture_stderr=True)
+            )
+
+            # open GOPs could make frames at segment boundaries undecodable
+            expected_frames = _count_video_packets(self.input_video_path)
+            actual_frames = _count_video_packets(self.output_video_path)
+            if expected_frames != actual_frames:
+                warnings.warn(f"Warning: segmented transcoding produced {actual_frames} frames instead of {expected_frames}, transcoding serially instead.")
+                return False
+
+            return True
+        finally:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    def _copy_frames(self):
+        """Copies video frames in case of keeping the frame rate"""
+        self._pipe_frames(self.original_fps, fps_filter=False)
+
+    def _reduce_fps(self):
+        """Reduces the frame rate"""
+        self._pipe_frames(self.fps_lower_bound, fps_filter=True)
 
     def _increase_fps(self):
         """Increases the frame rate"""
+        self._pipe_frames(self.fps_lower_bound, fps_filter=True)
+
+    def _pipe_frames(self, fps, fps_filter):
+        """Pipes decoded frames through python into the output encoder"""
+        stream = ffmpeg.input(self.input_video_path)
+        if fps_filter:
+            stream = stream.filter('fps', fps=self.fps_lower_bound, round='down')
         process = (
-            ffmpeg
-            .input(self.input_video_path)
-            .filter('fps', fps=self.fps_lower_bound, round='down')
+            stream
             .output('pipe:', format='rawvideo', pix_fmt='rgb24')
             .global_args('-loglevel', 'quiet')  # Suppress ffmpeg console output
             .run_async(pipe_stdout=True)
         )
 
+        # one preallocated buffer is reused for all the frames
         frame_size = self.frame_width * self.frame_height * 3
+        frame_buffer = bytearray(frame_size)
         while True:
-            in_bytes = process.stdout.read(frame_size)
-            if not in_bytes:
+            read_bytes = process.stdout.readinto(frame_buffer)
+            if read_bytes != frame_size:
                 break
 
-            self._write_frame_to_output(in_bytes, self.fps_lower_bound)
+            self._write_frame_to_output(frame_buffer, fps)
 
         process.stdout.close()
         process.wait()
 
+    @property
+    def output_fps(self):
+        """Frame rate of the normalized video"""
+        if self.original_fps >= self.fps_lower_bound and self.original_fps <= self.fps_higher_bound:
+            return self.original_fps
+        return self.fps_lower_bound
+
+    @property
+    def output_dimensions(self):
+        """Width and height of frames in the normalized video"""
+        if (self.frame_height * self.frame_width) > self.sum_pixels:
+            return self._calculate_dimensions()
+        return self.frame_width, self.frame_height
+
+    def open_normalized_frame_stream(self):
+        """Decodes the input video with normalization applied by ffmpeg filters"""
+        width, height = self.output_dimensions
+        return FfmpegFrameStream(
+            file_path=Path(self.input_video_path),
+            framerate=self.output_fps,
+            width=width,
+            height=height,
+            filters=self._normalization_filters()
+        )
+
     def _calculate_size(self):
         """Computes downscale size for any aspect ratio if more than HD number of pixels"""
+        w, h = self._calculate_dimensions()
+        return f"{w}x{h}"
+
+    def _calculate_dimensions(self):
+        """Computes downscale width and height if more than HD number of pixels"""
         gcd = math.gcd(self.frame_width, self.frame_height)
         aspect_width = self.frame_width // gcd
         aspect_height = self.frame_height // gcd
@@ -122,24 +377,21 @@ class VideoNormalizer:
         elif self.frame_height == self.frame_width:
             w = h = self.target_size
         
-        size = f"{int(w)}x{int(h)}"
-        return size
+        return int(w), int(h)
 
     def _write_frame_to_output(self, frame_bytes, fps):
         """Writes frames to the output file"""
-        frame = np.frombuffer(frame_bytes, np.uint8).reshape((self.frame_height, self.frame_width, 3))
-        
-        frame_bytes = frame.tobytes()
-
         if not hasattr(self, 'out'):
+            # the input rate has to be given, otherwise ffmpeg assumes 25 FPS
+            # for the raw frames and drops or duplicates them at the output
             if (self.frame_height * self.frame_width) > self.sum_pixels:
                 s = self._calculate_size()
                 
-                self.out = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='rgb24', s='{}x{}'.format(self.frame_width, self.frame_height))
+                self.out = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='rgb24', s='{}x{}'.format(self.frame_width, self.frame_height), r=fps)
                 self.out = ffmpeg.output(self.out, self.output_video_path, pix_fmt='yuv420p', vcodec='libx264', r=fps, s=s)
                 self.out = self.out.overwrite_output().run_async(pipe_stdin=True)
             else:
-                self.out = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='rgb24', s='{}x{}'.format(self.frame_width, self.frame_height))
+                self.out = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='rgb24', s='{}x{}'.format(self.frame_width, self.frame_height), r=fps)
                 self.out = ffmpeg.output(self.out, self.output_video_path, pix_fmt='yuv420p', vcodec='libx264', r=fps)
                 self.out = self.out.overwrite_output().run_async(pipe_stdin=True)
 
@@ -0,0 +1,77 @@
+from ..domain.ClipsCollection import ClipsCollection
+from ..domain.VideoGeometry import VideoGeometry
+from typing import Tuple
+import numpy as np
+
+
+IDLE_SKIP_REASON = "idle"
+"Skip reason of the clips in which no one signs"
+
+REST_ZONE_RATIO = 0.2
+"A hand in this bottom fraction of the signing space is resting"
+
+IDLE_CLIP_RATIO = 0.95
+"A clip is idle when at least this fraction of its frames is idle"
+
+
+def hand_positions(
+    geometry: VideoGeometry,
+    hand: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (T, 2) pixel position of the hand ("right_hand" or "left_hand")
+    in each frame (mean of its landmarks, or the center of its bounding box)
+    and a (T,) mask of the frames where the position is known
+    """
+    is_present = getattr(geometry, hand + "_present")
+    is_bbox_present = getattr(geometry, hand + "_bbox_present")
+    landmarks = getattr(geometry, hand + "_landmarks")
+    bbox = getattr(geometry, hand + "_bbox").astype(np.float64)
+
+    positions = landmarks[:, :, :2].astype(np.float64).mean(axis=1)
+    bbox_centers = (bbox[:, :2] + bbox[:, 2:]) / 2
+    positions = np.where(is_present[:, None], positions, bbox_centers)
+    return positions, is_present | is_bbox_present
+
+
+def is_hand_raised(
+    geometry: VideoGeometry,
+    positions: np.ndarray,
+    is_known: np.ndarray
+) -> np.ndarray:
+    """(T,) mask of frames where the hand is above the rest zone"""
+    sign_space = geometry.sign_space.astype(np.float64)
+    rest_line = sign_space[:, 3] - REST_ZONE_RATIO * (
+        sign_space[:, 3] - sign_space[:, 1]
+    )
+    return is_known & (positions[:, 1] < rest_line)
+
+
+def detect_idle_frames(geometry: VideoGeometry) -> np.ndarray:
+    """
+    (T,) mask of frames where no one signs, i.e. there is no pose
+    or both hands rest (are not detected or are in the rest zone)
+    """
+    is_signing = np.zeros(len(geometry), dtype=bool)
+    for hand in ["right_hand", "left_hand"]:
+        positions, is_known = hand_positions(geometry, hand)
+        is_signing |= is_hand_raised(geometry, positions, is_known)
+    return ~(geometry.pose_present & is_signing)
+
+
+def mark_idle_clips(
+    clips_collection: ClipsCollection,
+    geometry: VideoGeometry
+) -> int:
+    """
+    Sets the idle skip reason on the clips that are (nearly) all idle
+    frames, returns the number of idle clips
+    """
+    is_idle = detect_idle_frames(geometry)
+    idle_count = 0
+    for clip in clips_collection.clips:
+        clip_idle = is_idle[clip.start_frame:clip.end_frame]
+        if len(clip_idle) > 0 and np.mean(clip_idle) >= IDLE_CLIP_RATIO:
+            clip.skip_reason = IDLE_SKIP_REASON
+            idle_count += 1
+    return idle_count
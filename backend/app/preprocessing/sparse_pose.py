@@ -0,0 +1,148 @@
+from typing import List, Optional
+import numpy as np
+import cv2
+
+
+MOTION_THUMBNAIL_WIDTH = 64
+"Frames are compared for motion at this width, in grayscale"
+
+LANDMARK_KEYS = [
+    "pose_landmarks", "right_hand_landmarks",
+    "left_hand_landmarks", "face_landmarks"
+]
+BBOX_CROP_KEYS = {
+    "sign_space": "cropped_images",
+    "bbox_right_hand": "cropped_right_hand",
+    "bbox_left_hand": "cropped_left_hand",
+    "bbox_face": "cropped_face",
+}
+"Boxes of the predict_pose output and the crops cut out of them"
+
+MISSING_CROP_SIZE = 56
+"Size of the black crop used when the interpolated box is missing"
+
+
+def measure_motion(images: List[np.ndarray]) -> np.ndarray:
+    """
+    Mean absolute difference (0-255) of each frame from the previous one,
+    measured on small grayscale thumbnails. The first frame gets 0.
+    """
+    motion = np.zeros(len(images), dtype=np.float32)
+    previous: Optional[np.ndarray] = None
+    for i, image in enumerate(images):
+        height, width = image.shape[:2]
+        thumbnail_size = (
+            MOTION_THUMBNAIL_WIDTH,
+            max(1, height * MOTION_THUMBNAIL_WIDTH // width)
+        )
+        thumbnail = cv2.resize(
+            image, dsize=thumbnail_size, interpolation=cv2.INTER_AREA
+        )
+        gray = cv2.cvtColor(thumbnail, cv2.COLOR_RGB2GRAY).astype(np.float32)
+        if previous is not None:
+            motion[i] = np.abs(gray - previous).mean()
+        previous = gray
+    return motion
+
+
+def select_keyframes(
+    images: List[np.ndarray],
+    keyframe_interval: int,
+    motion_threshold: float = 0
+) -> List[int]:
+    """
+    Chooses the frames of a chunk to run mediapipe on: every k-th frame,
+    the last frame (so that all frames are between two keyframes) and
+    frames that differ from the previous one by more than the motion
+    threshold (0 disables the motion detection)
+    """
+    frame_count = len(images)
+    if frame_count == 0:
+        return []
+    keyframes = set(range(0, frame_count, keyframe_interval))
+    keyframes.add(frame_count - 1)
+    if motion_threshold > 0 and keyframe_interval > 1:
+        motion = measure_motion(images)
+        keyframes.update(np.nonzero(motion > motion_threshold)[0].tolist())
+    return sorted(keyframes)
+
+
+def _is_missing(value) -> bool:
+    return value is None or len(value) == 0
+
+
+def _interpolate(a, b, t: float, round_to_int=False):
+    """Blends two landmark lists or boxes, if any is missing takes the nearer"""
+    if _is_missing(a) or _is_missing(b):
+        return a if t < 0.5 else b
+    blended = (1 - t) * np.asarray(a, dtype=np.float64) \
+        + t * np.asarray(b, dtype=np.float64)
+    if round_to_int:
+        return [int(v) for v in np.rint(blended)]
+    return blended.tolist()
+
+
+def crop_box(image: np.ndarray, bbox) -> np.ndarray:
+    """
+    Cuts the [X_min, Y_min, X_max, Y_max] box out of the image,
+    the parts outside of the image are black
+    """
+    if _is_missing(bbox):
+        return np.zeros(
+            (MISSING_CROP_SIZE, MISSING_CROP_SIZE, 3), dtype=image.dtype
+        )
+    x_min, y_min, x_max, y_max = [int(v) for v in bbox]
+    width = max(1, x_max - x_min)
+    height = max(1, y_max - y_min)
+    crop = np.zeros((height, width, 3), dtype=image.dtype)
+
+    image_height, image_width = image.shape[:2]
+    source_x = slice(max(0, x_min), min(image_width, x_min + width))
+    source_y = slice(max(0, y_min), min(image_height, y_min + height))
+    if source_x.start < source_x.stop and source_y.start < source_y.stop:
+        crop[
+            source_y.start - y_min:source_y.stop - y_min,
+            source_x.start - x_min:source_x.stop - x_min
+        ] = image[source_y, source_x]
+    return crop
+
+
+def interpolate_prediction(
+    keyframe_prediction: dict,
+    keyframe_indices: List[int],
+    images: List[np.ndarray]
+) -> dict:
+    """
+    Expands a predict_pose result computed on the keyframes only
+    into a result for all the images of the chunk, in the same format.
+    The first and the last image have to be keyframes.
+    """
+    frame_count = len(images)
+    assert keyframe_indices[0] == 0
+    assert keyframe_indices[-1] == frame_count - 1
+
+    keys = ["keypoints"] + list(BBOX_CROP_KEYS.keys()) \
+        + list(BBOX_CROP_KEYS.values())
+    prediction = {key: [None] * frame_count for key in keys}
+    for j, i in enumerate(keyframe_indices):
+        for key in keys:
+            prediction[key][i] = keyframe_prediction[key][j]
+
+    for a, b in zip(keyframe_indices, keyframe_indices[1:]):
+        keypoints_a = prediction["keypoints"][a]
+        keypoints_b = prediction["keypoints"][b]
+        for i in range(a + 1, b):
+            t = (i - a) / (b - a)
+            prediction["keypoints"][i] = {
+                key: _interpolate(keypoints_a[key], keypoints_b[key], t)
+                for key in LANDMARK_KEYS
+            }
+            for bbox_key, crop_key in BBOX_CROP_KEYS.items():
+                bbox = _interpolate(
+                    prediction[bbox_key][a], prediction[bbox_key][b], t,
+                    round_to_int=True
+                )
+                prediction[bbox_key][i] = bbox
+                prediction[crop_key][i] = crop_box(images[i], bbox)
+
+    return prediction
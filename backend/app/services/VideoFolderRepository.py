@@ -16,12 +16,15 @@ class VideoFolderRepository:
         # define common file paths
         self.LOG_FILE = self.path("log.txt")
         self.NORMALIZED_FILE = self.path("normalized_file.mp4") # always mp4
-        self.GEOMETRY_FILE = self.path("geometry.json")
+        self.FRAME_INDEX_FILE = self.path("normalized_file_index.npz")
+        self.GEOMETRY_FOLDER = self.path("geometry") # see VideoGeometry
+        self.GEOMETRY_FILE = self.path("geometry.json") # legacy format
         self.CROPPED_LEFT_HAND_FOLDER = self.path("cropped_left_hand")
         self.CROPPED_RIGHT_HAND_FOLDER = self.path("cropped_right_hand")
         self.CROPPED_FACE_FOLDER = self.path("cropped_face")
         self.CROPPED_IMAGES_FOLDER = self.path("cropped_images")
-        self.CLIPS_COLLECTION_FILE = self.path("clips_collection.json")
+        self.CLIPS_FOLDER = self.path("clips") # see ClipRecordStore
+        self.CLIPS_COLLECTION_FILE = self.path("clips_collection.json") # legacy
         self.MAE_FEATURES_FILE = self.path("mae_features.npy")
         self.S2V_FEATURES_FILE = self.path("s2v_features.npz")
         self.DINO_FEATURES_FILE = self.path("dino_features.npy")
@@ -0,0 +1,253 @@
+from dataclasses import dataclass
+import os
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ["1", "true", "yes", "on"]
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+
+@dataclass
+class VideoProcessingSettings:
+    """
+    Configuration of the video processing pipeline. The defaults reproduce
+    the original behaviour (apart from the crop storage format), the bootstrap
+    function overrides them from environment variables (see the backend README).
+    """
+
+    single_decode_ingest: bool = False
+    """
+    Decode the uploaded video only once and fan the frames out to the
+    normalized file encoder, the clip planner and mediapipe, instead of
+    running normalization, enumeration, clipping and mediapipe as separate
+    passes over the video.
+    """
+
+    normalization_engine: str = "ffmpeg"
+    """
+    Either "ffmpeg" (normalize in a single ffmpeg filter graph) or "python"
+    (pipe raw frames through python between two ffmpeg processes).
+    See VideoNormalizer.ENGINES.
+    """
+
+    normalization_workers: int = 1
+    """
+    Number of parallel ffmpeg processes used to transcode long videos
+    in keyframe-aligned segments during normalization. 1 means serial.
+    """
+
+    prefetch_frames: int = 30
+    """
+    Number of frames decoded ahead on a background thread when mediapipe
+    reads the normalized video, so decoding overlaps with pose estimation.
+    0 disables the prefetching.
+    """
+
+    write_frame_numbers: bool = True
+    """
+    Write the frame number into the corner of each normalized video frame.
+    This requires re-encoding the video, so the remuxing fast path
+    of normalization only saves the full cost when this is disabled.
+    """
+
+    crop_storage: str = "packed"
+    """
+    How mediapipe stores the cropped hands, face and images. Either "packed"
+    (one memory-mapped file of raw pixels per crop kind) or "jpg"
+    (a folder of JPEG images per crop kind, one file per frame).
+    See crop_storage.CROP_STORAGE_FORMATS. Both formats can be read.
+    """
+
+    mediapipe_workers: int = 2
+    "Number of mediapipe workers processing chunks of the video in parallel"
+
+    mediapipe_processes: bool = False
+    """
+    Run the mediapipe workers as separate processes (frames are passed to them
+    through shared memory) instead of threads sharing the GIL of the server.
+    """
+
+    mediapipe_persistent_pool: bool = False
+    """
+    Keep one pool of mediapipe workers with loaded models for the whole
+    lifetime of the server and share it by all the processed videos, instead
+    of starting (and loading the models in) new workers for each video.
+    The workers then hold their memory even when idle.
+    """
+
+    mediapipe_recycle_after_jobs: int = 0
+    """
+    Replace a worker of the persistent pool by a fresh one after it processes
+    this many chunks, to cap memory creep. 0 means never.
+    """
+
+    mediapipe_job_timeout_seconds: int = 0
+    """
+    Kill and replace a worker process of the persistent pool that is stuck
+    on a single chunk for longer than this. 0 means never.
+    """
+
+    mediapipe_memory_budget_mb: int = 0
+    """
+    Memory (in MB) that all the mediapipe workers together may take.
+    The worker count is then chosen to fit into it (and into the available
+    memory of the host), up to mediapipe_workers, and adjusted while running
+    from the measured memory of the workers. 0 disables the budget.
+    Worker processes are measured exactly; worker threads only as the growth
+    of the server memory since their pool started, which also counts
+    whatever else the server loads meanwhile (e.g. the encoders of another
+    video), so the budget is best used with mediapipe_processes.
+    """
+
+    mediapipe_worker_memory_mb: int = 10_000
+    "Expected peak memory of one mediapipe worker, used with the budget"
+
+    mediapipe_keyframe_interval: int = 1
+    """
+    Run mediapipe only on every k-th frame (and on frames with high motion)
+    and interpolate the landmarks, boxes and crops of the frames in between.
+    Trades accuracy for throughput, 1 runs mediapipe on every frame.
+    Measure the accuracy with app.debug.benchmark_sparse_pose.
+    """
+
+    mediapipe_motion_threshold: int = 12
+    """
+    With keyframe interval above 1, frames whose grayscale pixels differ from
+    the previous frame by more than this on average (0-255) are keyframes
+    as well. 0 disables the motion detection.
+    """
+
+    mediapipe_cache_mb: int = 0
+    """
+    Size (in MB) of the disk cache of mediapipe results, keyed by the content
+    of the decoded video chunks, so that reprocessing a video (or processing
+    a duplicate upload) does not run mediapipe again. 0 disables the cache.
+    """
+
+    clip_length_seconds: float = 5.0
+    "Length of the clips the video is split into for translation"
+
+    clip_min_tail_seconds: float = 0.0
+    """
+    The last clip is merged into the previous one, if it would be shorter
+    than this. 0 keeps a tail clip of any length.
+    """
+
+    clip_overlap_seconds: float = 0.0
+    "Each clip starts this many seconds before the previous clip ends"
+
+    clip_segmentation: str = "fixed"
+    """
+    Either "fixed" to split the video into clips of the same length, or
+    "utterance" to cut the clips at the pauses in signing, found from
+    the hand landmarks, which yields fewer clips for the LLM to translate
+    """
+
+    clip_min_seconds: float = 2.0
+    "Shortest clip of the utterance segmentation"
+
+    clip_max_seconds: float = 10.0
+    "Longest clip of the utterance segmentation"
+
+    skip_idle_clips: bool = False
+    """
+    Clips in which no one signs (no pose, or both hands resting) are marked
+    as idle and skipped by the encoders and the LLM translation
+    """
+
+    @staticmethod
+    def from_environment() -> "VideoProcessingSettings":
+        defaults = VideoProcessingSettings()
+        return VideoProcessingSettings(
+            single_decode_ingest=_env_flag(
+                "SINGLE_DECODE_INGEST", defaults.single_decode_ingest
+            ),
+            normalization_engine=os.environ.get(
+                "NORMALIZATION_ENGINE", defaults.normalization_engine
+            ),
+            normalization_workers=_env_int(
+                "NORMALIZATION_WORKERS", defaults.normalization_workers
+            ),
+            prefetch_frames=_env_int(
+                "PREFETCH_FRAMES", defaults.prefetch_frames
+            ),
+            write_frame_numbers=_env_flag(
+                "WRITE_FRAME_NUMBERS", defaults.write_frame_numbers
+            ),
+            crop_storage=os.environ.get(
+                "CROP_STORAGE", defaults.crop_storage
+            ),
+            mediapipe_workers=_env_int(
+                "MEDIAPIPE_WORKERS", defaults.mediapipe_workers
+            ),
+            mediapipe_processes=_env_flag(
+                "MEDIAPIPE_PROCESSES", defaults.mediapipe_processes
+            ),
+            mediapipe_persistent_pool=_env_flag(
+                "MEDIAPIPE_PERSISTENT_POOL", defaults.mediapipe_persistent_pool
+            ),
+            mediapipe_recycle_after_jobs=_env_int(
+                "MEDIAPIPE_RECYCLE_AFTER_JOBS",
+                defaults.mediapipe_recycle_after_jobs
+            ),
+            mediapipe_job_timeout_seconds=_env_int(
+                "MEDIAPIPE_JOB_TIMEOUT_SECONDS",
+                defaults.mediapipe_job_timeout_seconds
+            ),
+            mediapipe_memory_budget_mb=_env_int(
+                "MEDIAPIPE_MEMORY_BUDGET_MB",
+                defaults.mediapipe_memory_budget_mb
+            ),
+            mediapipe_worker_memory_mb=_env_int(
+                "MEDIAPIPE_WORKER_MEMORY_MB",
+                defaults.mediapipe_worker_memory_mb
+            ),
+            mediapipe_keyframe_interval=_env_int(
+                "MEDIAPIPE_KEYFRAME_INTERVAL",
+                defaults.mediapipe_keyframe_interval
+            ),
+            mediapipe_motion_threshold=_env_int(
+                "MEDIAPIPE_MOTION_THRESHOLD",
+                defaults.mediapipe_motion_threshold
+            ),
+            mediapipe_cache_mb=_env_int(
+                "MEDIAPIPE_CACHE_MB", defaults.mediapipe_cache_mb
+            ),
+            clip_length_seconds=_env_float(
+                "CLIP_LENGTH_SECONDS", defaults.clip_length_seconds
+            ),
+            clip_min_tail_seconds=_env_float(
+                "CLIP_MIN_TAIL_SECONDS", defaults.clip_min_tail_seconds
+            ),
+            clip_overlap_seconds=_env_float(
+                "CLIP_OVERLAP_SECONDS", defaults.clip_overlap_seconds
+            ),
+            clip_segmentation=os.environ.get(
+                "CLIP_SEGMENTATION", defaults.clip_segmentation
+            ),
+            clip_min_seconds=_env_float(
+                "CLIP_MIN_SECONDS", defaults.clip_min_seconds
+            ),
+            clip_max_seconds=_env_float(
+                "CLIP_MAX_SECONDS", defaults.clip_max_seconds
+            ),
+            skip_idle_clips=_env_flag(
+                "SKIP_IDLE_CLIPS", defaults.skip_idle_clips
+            )
+        )
@@ -2,15 +2,26 @@ from .VideoFolderRepository import VideoFolderRepository
 from .VideosRepository import VideosRepository
 from ..domain.Video import Video
 from ..domain.VideoFile import VideoFile
-from ..preprocessing.VideoNormalizer import VideoNormalizer
+from ..domain.VideoGeometry import VideoGeometry
+from ..preprocessing.VideoNormalizer import VideoNormalizer, TRANSCODED
 from ..preprocessing.FrameEnumerator import FrameEnumerator
 from ..preprocessing.MediapipeProcessor import MediapipeProcessor
 from ..preprocessing.FixedLengthVideoClipper import FixedLengthVideoClipper
+from ..preprocessing.UtteranceVideoClipper import UtteranceVideoClipper
+from ..preprocessing.idle_detection import mark_idle_clips
+from ..domain.ClipsCollection import ClipsCollection
+from ..domain.ClipRecordStore import ClipRecordStore
+from ..preprocessing.SingleDecodeIngest import SingleDecodeIngest
+from ..video.FrameIndex import FrameIndex
 from ..encoding.MaeProcessor import MaeProcessor
 from ..encoding.DinoProcessor import DinoProcessor
 from ..encoding.Sign2VecProcessor import Sign2VecProcessor
 from ..translation.SignLlavaTranslator import SignLlavaTranslator
 from ..translation.SignLlavaCache import SignLlavaCache
+from .VideoProcessingSettings import VideoProcessingSettings
+from ..preprocessing.MediapipeWorkerPool import MediapipeWorkerPool
+from ..preprocessing.MediapipeMemoryBudget import MediapipeMemoryBudget
+from ..preprocessing.MediapipeChunkCache import MediapipeChunkCache
 import shutil
 import torch
 import logging
@@ -30,7 +41,11 @@ class VideoProcessor:
         video_folder: VideoFolderRepository,
         sign_llava_cache: SignLlavaCache,
         huggingface_token: Optional[str],
-        logger: logging.Logger
+        logger: logging.Logger,
+        settings: Optional[VideoProcessingSettings] = None,
+        mediapipe_worker_pool: Optional[MediapipeWorkerPool] = None,
+        mediapipe_memory_budget: Optional[MediapipeMemoryBudget] = None,
+        mediapipe_chunk_cache: Optional[MediapipeChunkCache] = None
     ):
         self.video = video
         self.videos_repository = videos_repository
@@ -38,6 +53,10 @@ class VideoProcessor:
         self.sign_llava_cache = sign_llava_cache
         self.huggingface_token = huggingface_token
         self.logger = logger
+        self.settings = settings or VideoProcessingSettings()
+        self.mediapipe_worker_pool = mediapipe_worker_pool
+        self.mediapipe_memory_budget = mediapipe_memory_budget
+        self.mediapipe_chunk_cache = mediapipe_chunk_cache
 
         # check upload finished
         if video.uploaded_file is None:
@@ -53,17 +72,33 @@ class VideoProcessor:
         """
         
         # initial preprocessing
-        if not self.video_folder.NORMALIZED_FILE.exists() or force_all:
-            self.normalize_uploaded_file()
-            self.enumerate_normalized_file()
+        needs_normalization = (
+            not self.video_folder.NORMALIZED_FILE.exists() or force_all
+        )
+        if needs_normalization and self.settings.single_decode_ingest:
+            # normalization, enumeration, mediapipe and clip splitting
+            self.run_single_decode_ingest()
+        else:
+            if needs_normalization:
+                self.normalize_uploaded_file()
+                if self.settings.write_frame_numbers:
+                    self.enumerate_normalized_file()
 
-        # mediapipe
-        if not self.video_folder.GEOMETRY_FILE.exists() or force_all:
-            self.run_mediapipe()
+            # mediapipe
+            has_geometry = (
+                VideoGeometry.exists(self.video_folder.GEOMETRY_FOLDER)
+                or self.video_folder.GEOMETRY_FILE.exists()
+            )
+            if not has_geometry or force_all:
+                self.run_mediapipe(resume_interrupted_run=not force_all)
 
-        # clip splitting
-        if not self.video_folder.CLIPS_COLLECTION_FILE.exists() or force_all:
-            self.slice_into_clips()
+            # clip splitting
+            has_clips = (
+                ClipRecordStore.exists(self.video_folder.CLIPS_FOLDER)
+                or self.video_folder.CLIPS_COLLECTION_FILE.exists()
+            )
+            if not has_clips or force_all:
+                self.slice_into_clips()
 
         # encoders
         if not self.video_folder.MAE_FEATURES_FILE.exists() or force_all:
@@ -74,25 +109,60 @@ class VideoProcessor:
             self.run_sign2vec()
 
         # LLaVA
-        self.run_llm_translation()
+        self.run_llm_translation(resume_interrupted_run=not force_all)
 
     def normalize_uploaded_file(self):
         self.logger.info("Normalizing video...")
+        normalizer = self.create_normalizer()
+        normalizer.process_video()
+        normalizer.close_output()
+
+        self.video.normalization_decision = normalizer.decision
+        self.extract_normalized_file_metadata()
+        
+        self.logger.info(f"Normalization done! The video was {normalizer.decision}.")
+
+    def create_normalizer(self) -> VideoNormalizer:
         uploaded_file = self.video_folder.path(
             self.video.uploaded_file.file_path
         )
-        normalizer = VideoNormalizer(
+        return VideoNormalizer(
             input_video_path=str(uploaded_file),
             output_video_path=str(self.video_folder.NORMALIZED_FILE),
             fps_lower_bound=23, # because many videos are 23.98 FPS
-            fps_higher_bound=30 # because many videos are 30 FPS
+            fps_higher_bound=30, # because many videos are 30 FPS
+            engine=self.settings.normalization_engine,
+            segment_workers=self.settings.normalization_workers
         )
-        normalizer.process_video()
-        normalizer.close_output()
+
+    def run_single_decode_ingest(self):
+        self.logger.info(
+            "Ingesting video (normalization, enumeration, mediapipe " +
+            "and clip splitting in a single decode)..."
+        )
+        ingest = SingleDecodeIngest(
+            normalizer=self.create_normalizer(),
+            normalized_video_file=self.video_folder.NORMALIZED_FILE,
+            mediapipe=self.create_mediapipe_processor(),
+            clip_length_seconds=self.settings.clip_length_seconds,
+            logger=self.logger,
+            write_frame_numbers=self.settings.write_frame_numbers,
+            clip_min_tail_seconds=self.settings.clip_min_tail_seconds,
+            clip_overlap_seconds=self.settings.clip_overlap_seconds
+        )
+        clips_collection = ingest.run()
+
+        self.video.normalization_decision = ingest.normalizer.decision
 
         self.extract_normalized_file_metadata()
-        
-        self.logger.info("Normalization done!")
+
+        # the utterances are found from the geometry, known only now
+        if self.settings.clip_segmentation == "utterance":
+            self.slice_into_clips()
+        else:
+            self.store_clips_collection(clips_collection)
+
+        self.logger.info("Ingest done!")
 
     def enumerate_normalized_file(self):
         self.logger.info("Enumerating normalized video...")
@@ -112,6 +182,9 @@ class VideoProcessor:
         self.video_folder.NORMALIZED_FILE.unlink()
         shutil.move(temp_file, self.video_folder.NORMALIZED_FILE)
 
+        # the enumerator re-encodes the frames, so even a remuxed upload
+        # ends up transcoded
+        self.video.normalization_decision = TRANSCODED
         self.extract_normalized_file_metadata()
 
         self.logger.info("Enumeration done!")
@@ -122,33 +195,90 @@ class VideoProcessor:
             file_path=self.video_folder.NORMALIZED_FILE
         )
         self.videos_repository.store(self.video)
+
+        # sidecar index for seeking in the normalized file
+        frame_index = FrameIndex.build(self.video_folder.NORMALIZED_FILE)
+        frame_index.save(self.video_folder.FRAME_INDEX_FILE)
     
-    def run_mediapipe(self):
-        mediapipe = MediapipeProcessor(
+    def create_mediapipe_processor(
+        self,
+        resume_interrupted_run=False
+    ) -> MediapipeProcessor:
+        return MediapipeProcessor(
             input_file=self.video_folder.NORMALIZED_FILE,
-            geometry_file=self.video_folder.GEOMETRY_FILE,
+            geometry_folder=self.video_folder.GEOMETRY_FOLDER,
             cropped_left_hand_folder=self.video_folder.CROPPED_LEFT_HAND_FOLDER,
             cropped_right_hand_folder=self.video_folder.CROPPED_RIGHT_HAND_FOLDER,
             cropped_face_folder=self.video_folder.CROPPED_FACE_FOLDER,
             cropped_images_folder=self.video_folder.CROPPED_IMAGES_FOLDER,
-            logger=self.logger
+            logger=self.logger,
+            prefetch_buffer_size=self.settings.prefetch_frames,
+            crop_storage_format=self.settings.crop_storage,
+            parallel_worker_count=self.settings.mediapipe_workers,
+            use_worker_processes=self.settings.mediapipe_processes,
+            worker_pool=self.mediapipe_worker_pool,
+            memory_budget=self.mediapipe_memory_budget,
+            resume_interrupted_run=resume_interrupted_run,
+            keyframe_interval=self.settings.mediapipe_keyframe_interval,
+            motion_threshold=self.settings.mediapipe_motion_threshold,
+            chunk_cache=self.mediapipe_chunk_cache
         )
+
+    def run_mediapipe(self, resume_interrupted_run=False):
+        mediapipe = self.create_mediapipe_processor(resume_interrupted_run)
         mediapipe.run()
     
     def slice_into_clips(self):
-        # This can later be replaced by a slicer that separates utterances
-        # properly. This is just a minimal implementation to get things going.
-        clip_length_seconds=5.0
+        if self.settings.clip_segmentation == "utterance":
+            self.logger.info(
+                "Slicing the video into utterances of " +
+                f"{self.settings.clip_min_seconds} to " +
+                f"{self.settings.clip_max_seconds} seconds..."
+            )
+            clipper = UtteranceVideoClipper(
+                geometry_folder=self.video_folder.GEOMETRY_FOLDER,
+                framerate=self.video.normalized_file.framerate,
+                min_clip_seconds=self.settings.clip_min_seconds,
+                max_clip_seconds=self.settings.clip_max_seconds,
+                legacy_geometry_file=self.video_folder.GEOMETRY_FILE
+            )
+        elif self.settings.clip_segmentation == "fixed":
+            self.logger.info(
+                "Slicing the video into " +
+                f"{self.settings.clip_length_seconds} second clips..."
+            )
+            clipper = FixedLengthVideoClipper.for_video_file(
+                normalized_video_file=self.video_folder.NORMALIZED_FILE,
+                frame_index_file=self.video_folder.FRAME_INDEX_FILE,
+                framerate=self.video.normalized_file.framerate,
+                clip_length_seconds=self.settings.clip_length_seconds,
+                min_tail_seconds=self.settings.clip_min_tail_seconds,
+                overlap_seconds=self.settings.clip_overlap_seconds
+            )
+        else:
+            raise Exception(
+                "Unknown clip segmentation: " +
+                self.settings.clip_segmentation
+            )
+        clips_collection = clipper.run()
+        self.store_clips_collection(clips_collection)
         self.logger.info(
-            f"Slicing the video into {clip_length_seconds} second clips..."
-        )
-        clipper = FixedLengthVideoClipper(
-            normalized_video_file=self.video_folder.NORMALIZED_FILE,
-            clip_length_seconds=clip_length_seconds
+            f"Clips are now defined! ({len(clips_collection.clips)} clips)"
         )
-        clips_collection = clipper.run()
-        clips_collection.store(self.video_folder.CLIPS_COLLECTION_FILE)
-        self.logger.info("Clips are now defined!")
+
+    def store_clips_collection(self, clips_collection: ClipsCollection):
+        """Marks the idle clips to be skipped (if enabled) and stores them"""
+        if self.settings.skip_idle_clips:
+            geometry = VideoGeometry.load_any(
+                self.video_folder.GEOMETRY_FOLDER,
+                self.video_folder.GEOMETRY_FILE
+            )
+            idle_count = mark_idle_clips(clips_collection, geometry)
+            self.logger.info(
+                f"{idle_count} of {len(clips_collection.clips)} clips " +
+                "are idle and will be skipped."
+            )
+        ClipRecordStore(self.video_folder.CLIPS_FOLDER).save(clips_collection)
 
     def run_mae(self):
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -156,7 +286,9 @@ class VideoProcessor:
             device=device,
             cropped_images_folder=self.video_folder.CROPPED_IMAGES_FOLDER,
             mae_features_file=self.video_folder.MAE_FEATURES_FILE,
-            logger=self.logger
+            logger=self.logger,
+            clips_folder=self.video_folder.CLIPS_FOLDER,
+            legacy_clips_file=self.video_folder.CLIPS_COLLECTION_FILE
         )
         mae.run()
 
@@ -168,27 +300,35 @@ class VideoProcessor:
             cropped_left_hand_folder=self.video_folder.CROPPED_LEFT_HAND_FOLDER,
             cropped_right_hand_folder=self.video_folder.CROPPED_RIGHT_HAND_FOLDER,
             dino_features_file=self.video_folder.DINO_FEATURES_FILE,
-            logger=self.logger
+            logger=self.logger,
+            geometry_folder=self.video_folder.GEOMETRY_FOLDER,
+            legacy_geometry_file=self.video_folder.GEOMETRY_FILE,
+            clips_folder=self.video_folder.CLIPS_FOLDER,
+            legacy_clips_file=self.video_folder.CLIPS_COLLECTION_FILE
         )
         dino.run()
     
     def run_sign2vec(self):
         s2v = Sign2VecProcessor(
-            geometry_file=self.video_folder.GEOMETRY_FILE,
+            geometry_folder=self.video_folder.GEOMETRY_FOLDER,
+            legacy_geometry_file=self.video_folder.GEOMETRY_FILE,
             s2v_features_file=self.video_folder.S2V_FEATURES_FILE,
-            clips_collection_file=self.video_folder.CLIPS_COLLECTION_FILE,
+            clips_folder=self.video_folder.CLIPS_FOLDER,
             logger=self.logger,
-            huggingface_token=self.huggingface_token
+            huggingface_token=self.huggingface_token,
+            legacy_clips_file=self.video_folder.CLIPS_COLLECTION_FILE
         )
         s2v.run()
 
-    def run_llm_translation(self):
+    def run_llm_translation(self, resume_interrupted_run=False):
         translator = SignLlavaTranslator(
-            clips_collection_file=self.video_folder.CLIPS_COLLECTION_FILE,
+            clips_folder=self.video_folder.CLIPS_FOLDER,
             mae_features_file=self.video_folder.MAE_FEATURES_FILE,
             s2v_features_file=self.video_folder.S2V_FEATURES_FILE,
             dino_features_file=self.video_folder.DINO_FEATURES_FILE,
             sign_llava_cache=self.sign_llava_cache,
-            logger=self.logger
+            logger=self.logger,
+            legacy_clips_file=self.video_folder.CLIPS_COLLECTION_FILE,
+            resume_interrupted_run=resume_interrupted_run
         )
         translator.run()
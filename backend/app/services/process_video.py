@@ -3,6 +3,11 @@ from .VideosRepository import VideosRepository
 from ..domain.Video import Video
 from .VideoProcessor import VideoProcessor
 from ..translation.SignLlavaCache import SignLlavaCache
+from .VideoProcessingSettings import VideoProcessingSettings
+from ..preprocessing.MediapipeWorkerPool import MediapipeWorkerPool
+from ..preprocessing.MediapipeMemoryBudget import MediapipeMemoryBudget
+from ..preprocessing.MediapipeChunkCache import MediapipeChunkCache
+from typing import Optional
 import os
 import logging
 import time
@@ -13,7 +18,11 @@ def process_video(
     videos_repository: VideosRepository,
     video_folder: VideoFolderRepository,
     sign_llava_cache: SignLlavaCache,
-    force_all=False
+    force_all=False,
+    settings: Optional[VideoProcessingSettings] = None,
+    mediapipe_worker_pool: Optional[MediapipeWorkerPool] = None,
+    mediapipe_memory_budget: Optional[MediapipeMemoryBudget] = None,
+    mediapipe_chunk_cache: Optional[MediapipeChunkCache] = None
 ):
     """
     Runs all of the processing after the video is uploaded, including
@@ -51,7 +60,11 @@ def process_video(
             video_folder=video_folder,
             sign_llava_cache=sign_llava_cache,
             huggingface_token=os.environ.get("HF_TOKEN"),
-            logger=logger
+            logger=logger,
+            settings=settings,
+            mediapipe_worker_pool=mediapipe_worker_pool,
+            mediapipe_memory_budget=mediapipe_memory_budget,
+            mediapipe_chunk_cache=mediapipe_chunk_cache
         )
         processor.run(force_all=force_all)
     except:
@@ -80,5 +93,9 @@ if __name__ == "__main__":
         video,
         app.videos_repository,
         folder_repo,
-        app.sign_llava_cache
+        app.sign_llava_cache,
+        settings=app.processing_settings,
+        mediapipe_worker_pool=app.mediapipe_worker_pool,
+        mediapipe_memory_budget=app.mediapipe_memory_budget,
+        mediapipe_chunk_cache=app.mediapipe_chunk_cache
     )
@@ -1,5 +1,6 @@
 from pathlib import Path
-from ..domain.ClipsCollection import ClipsCollection
+from ..domain.ClipRecordStore import ClipRecordStore
+from typing import Optional
 from ..domain.VideoVisualFeatures import VideoVisualFeatures
 from .EmbeddingNeighborLookup import EmbeddingNeighborLookup
 from .ContextTracker import ContextTracker
@@ -17,20 +18,29 @@ MAX_CONTEXT_LENGTH = 8_000
 class SignLlavaTranslator:
     def __init__(
         self,
-        clips_collection_file: Path,
+        clips_folder: Path,
         mae_features_file: Path,
         dino_features_file: Path,
         s2v_features_file: Path,
         sign_llava_cache: SignLlavaCache,
-        logger: logging.Logger
+        logger: logging.Logger,
+        legacy_clips_file: Optional[Path] = None,
+        resume_interrupted_run=False
     ):
-        self.clips_collection_file = clips_collection_file
+        self.clips_folder = clips_folder
+        self.legacy_clips_file = legacy_clips_file
         self.mae_features_file = mae_features_file
         self.dino_features_file = dino_features_file
         self.s2v_features_file = s2v_features_file
         self.sign_llava_cache = sign_llava_cache
         self.logger = logger
 
+        self.resume_interrupted_run = resume_interrupted_run
+        """
+        Keeps the translations of the clips that were already translated
+        and stored (e.g. before a crash) and translates only the rest
+        """
+
     def run(self):
         self.logger.info("Loading SignLlava model...")
         sign_llava: SignLlava = self.sign_llava_cache.resolve()
@@ -46,10 +56,38 @@ class SignLlavaTranslator:
             dino_features_file=self.dino_features_file,
             s2v_features_file=self.s2v_features_file
         )
-        clips_collection = ClipsCollection.load(self.clips_collection_file)
+        clips_collection = ClipRecordStore.load_any(
+            self.clips_folder, self.legacy_clips_file
+        )
+
+        # each clip is stored as soon as it is translated
+        clip_store = ClipRecordStore(self.clips_folder)
+        if not ClipRecordStore.exists(self.clips_folder):
+            clip_store.save(clips_collection) # from the legacy file
 
         # perform translation clip-by-clip
         for clip in clips_collection.clips:
+
+            # e.g. idle clips, where no one signs, are not worth the LLM call
+            if clip.skip_reason is not None:
+                clip.translation_context = None
+                clip.translation_result = None
+                clip.embedding_neighbor_tokens_mae = None
+                clip.embedding_neighbor_tokens_dino = None
+                clip.embedding_neighbor_tokens_s2v = None
+                clip_store.save_clip(clip)
+                self.logger.info(
+                    f"Clip {clip.clip_index} was skipped ({clip.skip_reason})."
+                )
+                continue
+
+            if self.resume_interrupted_run \
+            and clip.translation_result is not None:
+                context_tracker.add_next_output(clip.translation_result)
+                self.logger.info(
+                    f"Clip {clip.clip_index} was translated before."
+                )
+                continue
             
             # prepare data for the clip translation
             clip_features = video_features.select_clip(clip)
@@ -81,8 +119,7 @@ class SignLlavaTranslator:
                 llm_output.sign2vec_embeddings
             )
 
+            clip_store.save_clip(clip)
             self.logger.info(f"Clip {clip.clip_index} was translated.")
-        
-        # store the modified clips collection file
-        clips_collection.store(self.clips_collection_file)
+
         self.logger.info(f"The video was translated.")
@@ -0,0 +1,230 @@
+from .FrameStream import FrameStream
+from .Frame import Frame
+from typing import List, Optional
+from pathlib import Path
+import numpy as np
+import threading
+
+
+class FrameBufferPool:
+    """
+    Recycles preallocated (N, H, W, 3) uint8 frame buffers, so that streams
+    of chunks do not allocate (and page-fault) a fresh buffer for each chunk.
+    It is thread-safe, buffers may be released from worker threads.
+    """
+    def __init__(
+        self,
+        capacity: int,
+        width: int,
+        height: int,
+        max_retained_buffers=4
+    ):
+        self.capacity = capacity
+        "Number of frames that fit into one buffer"
+
+        self.width = width
+        self.height = height
+
+        self.max_retained_buffers = max_retained_buffers
+        "How many released buffers are kept for reuse, others are dropped"
+
+        self._free_buffers: List[np.ndarray] = []
+        self._lock = threading.Lock()
+
+    @property
+    def buffer_shape(self):
+        return (self.capacity, self.height, self.width, 3)
+
+    def acquire(self) -> np.ndarray:
+        """Returns a free buffer, allocating a new one if there is none"""
+        with self._lock:
+            if len(self._free_buffers) > 0:
+                return self._free_buffers.pop()
+        return np.empty(self.buffer_shape, dtype=np.uint8)
+
+    def release(self, buffer: np.ndarray):
+        """Returns a buffer obtained by acquire() back to the pool"""
+        assert buffer.shape == self.buffer_shape
+        with self._lock:
+            if len(self._free_buffers) < self.max_retained_buffers:
+                self._free_buffers.append(buffer)
+
+    def create_stream(self, framerate: float) -> "ArrayFrameStream":
+        """Creates an empty stream backed by a buffer from this pool"""
+        return ArrayFrameStream(
+            framerate=framerate,
+            buffer=self.acquire(),
+            pool=self
+        )
+
+
+class ArrayFrameStream(FrameStream):
+    """
+    In-memory frame stream backed by a single contiguous (N, H, W, 3) uint8
+    array, with frames being views into that array. Unlike the
+    InMemoryFrameStream, it allocates no per-frame objects when being filled,
+    dumped or loaded, and frames can be decoded directly into its slots.
+    """
+    def __init__(
+        self,
+        framerate: float,
+        buffer: np.ndarray,
+        frame_count=0,
+        pool: Optional[FrameBufferPool] = None
+    ):
+        assert len(buffer.shape) == 4 and buffer.shape[3] == 3
+        assert str(buffer.dtype) == "uint8"
+        assert frame_count <= buffer.shape[0]
+
+        self._framerate = framerate
+        self._buffer = buffer
+        self._frame_count = frame_count
+        self._pool = pool
+        self._next_frame_index = 0
+
+    @staticmethod
+    def allocate(
+        framerate: float,
+        width: int,
+        height: int,
+        capacity: int
+    ) -> "ArrayFrameStream":
+        """Creates an empty stream with room for the given number of frames"""
+        return ArrayFrameStream(
+            framerate=framerate,
+            buffer=np.empty((capacity, height, width, 3), dtype=np.uint8)
+        )
+
+    @property
+    def framerate(self) -> float:
+        return self._framerate
+
+    @property
+    def width(self) -> int:
+        return self._buffer.shape[2]
+
+    @property
+    def height(self) -> int:
+        return self._buffer.shape[1]
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of frames the stream can hold"""
+        return self._buffer.shape[0]
+
+    @property
+    def buffer(self) -> np.ndarray:
+        """The whole underlying (capacity, H, W, 3) array"""
+        return self._buffer
+
+    @property
+    def pool(self) -> Optional[FrameBufferPool]:
+        """The pool the buffer was borrowed from, if any"""
+        return self._pool
+
+    @property
+    def frames(self) -> np.ndarray:
+        """View of the (N, H, W, 3) array of the frames in the stream"""
+        return self._buffer[:self._frame_count]
+
+    def is_full(self) -> bool:
+        return self._frame_count == self.capacity
+
+    def seek(self, frame_index: int):
+        self._next_frame_index = max(0, min(frame_index, self._frame_count))
+
+    def read_frame(self, advance_pointer=True) -> Optional[Frame]:
+        if self._next_frame_index >= self._frame_count:
+            return None
+
+        frame = Frame(self._buffer[self._next_frame_index])
+
+        if advance_pointer:
+            self._next_frame_index += 1
+
+        return frame
+
+    def write_frame(self, frame: Frame, advance_pointer=True):
+        if frame.width != self.width or frame.height != self.height:
+            raise Exception(
+                "Frame resolution has to match the stream resolution"
+            )
+
+        slot = self._slot_for_writing()
+        if not np.may_share_memory(slot, frame.img):
+            np.copyto(slot, frame.img)
+        self._commit_slot(advance_pointer)
+
+    def fill_from(self, in_stream: FrameStream, max_frames: int) -> int:
+        """
+        Appends up to max_frames frames read from the given stream,
+        decoding them directly into the free slots of the buffer
+        when the stream supports it. Returns the number of frames read.
+        """
+        read_frames = 0
+        while read_frames < max_frames and not self.is_full():
+            if not in_stream.read_into(self._slot_for_writing()):
+                break
+            self._commit_slot(advance_pointer=True)
+            read_frames += 1
+        return read_frames
+
+    def _slot_for_writing(self) -> np.ndarray:
+        if self._next_frame_index > self._frame_count:
+            raise Exception("Pointer points after the end of the video")
+        if self._next_frame_index == self.capacity:
+            raise Exception("The stream buffer is full")
+        return self._buffer[self._next_frame_index]
+
+    def _commit_slot(self, advance_pointer: bool):
+        if self._next_frame_index == self._frame_count:
+            self._frame_count += 1
+        if advance_pointer:
+            self._next_frame_index += 1
+
+    def release(self):
+        """
+        Returns the buffer to its pool (if any). The stream and all frames
+        read from it must not be used afterwards.
+        """
+        if self._pool is not None and self._buffer is not None:
+            self._pool.release(self._buffer)
+        self._buffer = None
+        self._frame_count = 0
+
+    def __iter__(self):
+        self.seek(0)
+        return self
+
+    def __next__(self) -> Frame:
+        frame = self.read_frame()
+
+        if frame is None:
+            raise StopIteration
+
+        return frame
+
+    def __len__(self) -> int:
+        return self._frame_count
+
+    def dump_npz(self, file_path: Path):
+        file_path = file_path.with_suffix(".npz")
+        with open(file_path, "wb") as file:
+            np.savez(
+                file,
+                frames=self.frames, # a view, written without copying
+                framerate=self.framerate
+            )
+
+    @staticmethod
+    def load_npz(file_path: Path) -> "ArrayFrameStream":
+        with open(file_path, "rb") as file:
+            data = np.load(file)
+            frames: np.ndarray = data["frames"]
+            framerate = float(data["framerate"])
+
+        return ArrayFrameStream(
+            framerate=framerate,
+            buffer=frames,
+            frame_count=frames.shape[0]
+        )
@@ -0,0 +1,130 @@
+from .FrameStream import FrameStream
+from .Frame import Frame
+from typing import Optional, List, Tuple
+from pathlib import Path
+import numpy as np
+import threading
+import ffmpeg
+
+
+STDERR_TAIL_BYTES = 16 * 1024
+"How much of the end of ffmpeg's error output is kept for the exception"
+
+
+class FfmpegFrameStream(FrameStream):
+    """
+    Represents a stream of frames decoded from a video file by an ffmpeg
+    subprocess. Unlike the FileFrameStream, the frames can be passed through
+    ffmpeg filters (e.g. framerate and resolution normalization) while being
+    decoded, so the stream yields the frames after the filtering.
+    """
+    def __init__(
+        self,
+        file_path: Path,
+        framerate: float,
+        width: int,
+        height: int,
+        filters: Optional[List[Tuple[str, dict]]] = None
+    ):
+        self.file_path = file_path
+        "Path to the video file being decoded"
+
+        self.filters = filters or []
+        "List of (filter name, filter arguments) applied during decoding"
+
+        self._framerate = framerate
+        self._width = width
+        self._height = height
+
+        self._process = None
+        self._stderr_tail = bytearray()
+        self._stderr_thread = None
+        self.reset()
+
+    def reset(self):
+        """Starts decoding from the beginning of the file"""
+        self.close()
+
+        if not Path(self.file_path).is_file():
+            raise Exception("There is no file at the given path.")
+
+        stream = ffmpeg.input(str(self.file_path))
+        for filter_name, filter_kwargs in self.filters:
+            stream = stream.filter(filter_name, **filter_kwargs)
+        self._process = (
+            stream
+            .output("pipe:", format="rawvideo", pix_fmt="bgr24")
+            .global_args("-loglevel", "error")
+            .run_async(pipe_stdout=True, pipe_stderr=True)
+        )
+
+        # drained continuously, so that ffmpeg never blocks on a full pipe
+        self._stderr_tail = bytearray()
+        self._stderr_thread = threading.Thread(
+            target=self._drain_stderr, args=(self._process.stderr,)
+        )
+        self._stderr_thread.start()
+
+    def _drain_stderr(self, stderr):
+        for line in stderr:
+            self._stderr_tail += line
+            del self._stderr_tail[:-STDERR_TAIL_BYTES]
+
+    @property
+    def framerate(self) -> float:
+        return self._framerate
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @property
+    def frame_bytes_size(self) -> int:
+        return self._width * self._height * 3
+
+    def close(self):
+        """Terminates the decoding process if running"""
+        if self._process is None:
+            return
+
+        self._process.stdout.close()
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._stderr_thread.join()
+        self._process.stderr.close()
+        self._process = None
+
+    def __next__(self) -> Frame:
+        if self._process is None:
+            raise StopIteration
+
+        buffer = bytearray(self.frame_bytes_size)
+        read_bytes = self._process.stdout.readinto(buffer)
+
+        if read_bytes != self.frame_bytes_size:
+            self._process.stdout.close()
+            self._process.wait()
+            self._stderr_thread.join()
+            self._process.stderr.close()
+            returncode = self._process.returncode
+            self._process = None
+
+            # only a clean exit is the end of the video, otherwise
+            # the decoding failed part way (e.g. a corrupted upload)
+            if returncode != 0:
+                stderr = self._stderr_tail.decode("utf-8", errors="replace")
+                raise Exception(
+                    f"Decoding the video failed (ffmpeg exited with "
+                    f"{returncode}). {stderr}"
+                )
+            raise StopIteration
+
+        img = np.frombuffer(buffer, np.uint8).reshape(
+            (self._height, self._width, 3)
+        )
+        return Frame(img)
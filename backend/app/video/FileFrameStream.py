@@ -1,21 +1,32 @@
 from .FrameStream import FrameStream
 from .Frame import Frame
+from .FrameIndex import FrameIndex
 from typing import Optional
 from pathlib import Path
+import numpy as np
 import cv2
 
 
 class FileFrameStream(FrameStream):
     """Represents a frame stream of frames comming from a video file"""
-    def __init__(self, file_path: Path):
+    def __init__(
+        self,
+        file_path: Path,
+        frame_index: Optional[FrameIndex] = None
+    ):
         super().__init__()
         
         self.file_path = file_path
         "Path to the video file being read"
 
+        self.frame_index = frame_index
+        "Keyframe index of the file, makes seeking cost O(GOP) if given"
+
         self.video_capture: Optional[cv2.VideoCapture] = None
         "Open CV video capture instance"
 
+        self._next_frame_index = 0
+
         self.reset()
     
     def reset(self):
@@ -26,6 +37,7 @@ class FileFrameStream(FrameStream):
             raise Exception("There is no file at the given path.")
 
         self.video_capture = cv2.VideoCapture(self.file_path)
+        self._next_frame_index = 0
 
     def _assert_file_open(self):
         if self.video_capture is None:
@@ -46,6 +58,31 @@ class FileFrameStream(FrameStream):
         self._assert_file_open()
         return int(self.video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
+    def seek(self, frame_index: int):
+        """
+        Makes the given frame be the next one read. With a frame index,
+        it jumps to the nearest preceding keyframe and decodes forward from
+        there, without it, it decodes forward from the current position
+        (or from the beginning of the file when seeking backwards).
+        """
+        self._assert_file_open()
+
+        if self.frame_index is not None:
+            keyframe = self.frame_index.keyframe_for(frame_index)
+
+            # decoding forward is cheaper if we are already in the same GOP
+            if not (keyframe <= self._next_frame_index <= frame_index):
+                self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+                self._next_frame_index = keyframe
+
+        elif frame_index < self._next_frame_index:
+            self.reset()
+
+        while self._next_frame_index < frame_index:
+            if not self.video_capture.grab():
+                raise Exception("Cannot seek past the end of the video.")
+            self._next_frame_index += 1
+
     def close(self):
         """Closes the file if open"""
         if self.video_capture is None:
@@ -63,4 +100,20 @@ class FileFrameStream(FrameStream):
         if not success:
             raise StopIteration
 
+        self._next_frame_index += 1
         return Frame(img)
+
+    def read_into(self, img: np.ndarray) -> bool:
+        self._assert_file_open()
+
+        success, decoded = self.video_capture.read(image=img)
+
+        if not success:
+            return False
+
+        # OpenCV allocates a new array if the given one does not fit
+        if not np.may_share_memory(decoded, img):
+            np.copyto(img, decoded)
+
+        self._next_frame_index += 1
+        return True
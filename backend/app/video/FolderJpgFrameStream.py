@@ -1,23 +1,42 @@
 from .FrameStream import FrameStream
 from .Frame import Frame
-from typing import Optional
+from typing import Optional, List, Dict, Tuple
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import numpy as np
 import json
 import shutil
 import cv2
 import glob
+import os
+import zlib
+import fcntl
 
 
 META_FILE = "_FolderJpgFrameStream.json"
+LOCK_FILE = "_FolderJpgFrameStream.lock"
+DEFAULT_DECODING_THREADS = min(8, os.cpu_count() or 1)
 
 
 class FolderJpgFrameStream(FrameStream):
+    """
+    Stores frames as a folder of JPEG files, one file per frame. The meta
+    file in the folder holds the stream parameters and a manifest
+    of the written frames (their count, file sizes and optionally CRC32
+    checksums), so readers do not have to scan the folder. Writers update
+    the manifest on flush() or close(), concurrent writers (threads
+    or processes) are serialized by a lock file.
+    """
     def __init__(
         self,
         framerate: float,
         width: Optional[int],
         height: Optional[int],
-        folder_path: Path
+        folder_path: Path,
+        decoding_threads=DEFAULT_DECODING_THREADS,
+        store_checksums=False,
+        verify_checksums=False
     ):
         self._framerate = framerate
         self._width = width
@@ -25,6 +44,23 @@ class FolderJpgFrameStream(FrameStream):
 
         self._folder_path = folder_path
         self._next_frame_index = 0
+
+        self.store_checksums = store_checksums
+        "Whether written frames get a CRC32 checksum in the manifest"
+
+        self.verify_checksums = verify_checksums
+        "Whether read frames are checked against their manifest checksum"
+
+        # the manifest, None for folders written before it existed
+        self._frame_sizes: Optional[List[Optional[int]]] = None
+        self._frame_checksums: List[Optional[int]] = []
+        self._frame_count = 0 # number of written frames from the start
+        self._pending_entries: Dict[int, Tuple[int, Optional[int]]] = {}
+
+        self.decoding_threads = decoding_threads
+        "Number of threads decoding the JPEG files in read_batch"
+
+        self._executor: Optional[ThreadPoolExecutor] = None
     
     @property
     def is_heterogenous(self) -> bool:
@@ -38,6 +74,7 @@ class FolderJpgFrameStream(FrameStream):
         width: Optional[int] = None,
         height: Optional[int] = None,
         clear_if_exists=False,
+        store_checksums=False
     ) -> "FolderJpgFrameStream":
         # clear the folder if it exists
         if clear_if_exists and folder_path.is_dir():
@@ -52,36 +89,114 @@ class FolderJpgFrameStream(FrameStream):
             framerate=framerate,
             width=width,
             height=height,
-            folder_path=folder_path
+            folder_path=folder_path,
+            store_checksums=store_checksums
         )
 
-        # write the meta file
-        stream._write_meta_file()
+        # write the meta file, keeping the manifest of other writers
+        with stream._meta_file_lock():
+            meta = {}
+            if (folder_path / META_FILE).is_file():
+                meta = FolderJpgFrameStream._read_meta_file(folder_path)
+            meta["framerate"] = framerate
+            meta["width"] = width
+            meta["height"] = height
+            meta["manifest"] = meta.get("manifest", {
+                "frame_count": 0,
+                "frame_sizes": [],
+                "frame_checksums": []
+            })
+            stream._write_meta_file(meta)
+            stream._load_manifest(meta)
 
         return stream
 
     @staticmethod
-    def open(folder_path: Path) -> "FolderJpgFrameStream":
+    def exists(folder_path: Path) -> bool:
+        return (folder_path / META_FILE).is_file()
+
+    @staticmethod
+    def open(
+        folder_path: Path,
+        verify_checksums=False
+    ) -> "FolderJpgFrameStream":
         # read the meta file
-        with open(folder_path / META_FILE, "r") as f:
-            meta: dict = json.load(f)
-            assert type(meta) is dict
+        meta = FolderJpgFrameStream._read_meta_file(folder_path)
         
         # create the stream instance
-        return FolderJpgFrameStream(
+        stream = FolderJpgFrameStream(
             framerate=float(meta["framerate"]),
             width=None if meta["width"] is None else int(meta["width"]),
             height=None if meta["height"] is None else int(meta["height"]),
-            folder_path=folder_path
+            folder_path=folder_path,
+            verify_checksums=verify_checksums
         )
+        stream._load_manifest(meta)
+        return stream
 
-    def _write_meta_file(self):
-        with open(self._folder_path / META_FILE, "w") as f:
-            json.dump({
-                "framerate": self._framerate,
-                "width": self._width,
-                "height": self._height
-            }, f)
+    @staticmethod
+    def _read_meta_file(folder_path: Path) -> dict:
+        with open(folder_path / META_FILE, "r") as f:
+            meta: dict = json.load(f)
+            assert type(meta) is dict
+        return meta
+
+    def _write_meta_file(self, meta: dict):
+        # atomic replace, so readers never see a partially written file
+        temp_file = self._folder_path / (META_FILE + ".tmp")
+        with open(temp_file, "w") as f:
+            json.dump(meta, f)
+        os.replace(temp_file, self._folder_path / META_FILE)
+
+    @contextmanager
+    def _meta_file_lock(self):
+        with open(self._folder_path / LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_manifest(self, meta: dict):
+        manifest = meta.get("manifest")
+        if manifest is None:
+            self._frame_sizes = None
+            return
+        self._frame_sizes = list(manifest["frame_sizes"])
+        self._frame_checksums = list(manifest["frame_checksums"])
+        self._frame_count = int(manifest["frame_count"])
+        self._set_manifest_entries(self._pending_entries)
+
+    def _set_manifest_entries(
+        self,
+        entries: Dict[int, Tuple[int, Optional[int]]]
+    ):
+        for frame_index, (size, checksum) in entries.items():
+            missing = frame_index + 1 - len(self._frame_sizes)
+            if missing > 0:
+                self._frame_sizes += [None] * missing
+                self._frame_checksums += [None] * missing
+            self._frame_sizes[frame_index] = size
+            self._frame_checksums[frame_index] = checksum
+
+        while self._frame_count < len(self._frame_sizes) \
+        and self._frame_sizes[self._frame_count] is not None:
+            self._frame_count += 1
+
+    def flush(self):
+        """Merges the frames written by this stream into the manifest"""
+        if len(self._pending_entries) == 0:
+            return
+        with self._meta_file_lock():
+            meta = FolderJpgFrameStream._read_meta_file(self._folder_path)
+            self._load_manifest(meta)
+            meta["manifest"] = {
+                "frame_count": self._frame_count,
+                "frame_sizes": self._frame_sizes,
+                "frame_checksums": self._frame_checksums
+            }
+            self._write_meta_file(meta)
+        self._pending_entries.clear()
 
     @property
     def framerate(self) -> float:
@@ -105,12 +220,34 @@ class FolderJpgFrameStream(FrameStream):
     def _frame_path(self, frame_index: int) -> Path:
         return self._folder_path / f"frame_{str(frame_index).zfill(6)}.jpg"
     
+    def frame_paths(self) -> List[Path]:
+        """Paths to the files of all the frames in the stream"""
+        return [self._frame_path(i) for i in range(len(self))]
+
+    def _has_frame(self, frame_index: int) -> bool:
+        if self._frame_sizes is None:
+            return self._frame_path(frame_index).is_file()
+        return frame_index < self._frame_count
+
+    def _decode_frame(self, frame_index: int) -> np.ndarray:
+        frame_path = self._frame_path(frame_index)
+        if not self.verify_checksums or self._frame_sizes is None \
+        or self._frame_checksums[frame_index] is None:
+            return cv2.imread(frame_path)
+
+        data = frame_path.read_bytes()
+        if zlib.crc32(data) != self._frame_checksums[frame_index]:
+            raise Exception(f"The frame file {frame_path} is corrupted.")
+        return cv2.imdecode(
+            np.frombuffer(data, dtype=np.uint8),
+            cv2.IMREAD_COLOR
+        )
+
     def read_frame(self, advance_pointer=True) -> Optional[Frame]:
-        frame_path = self._frame_path(self._next_frame_index)
-        if not frame_path.is_file():
+        if not self._has_frame(self._next_frame_index):
             return None
 
-        img = cv2.imread(frame_path)
+        img = self._decode_frame(self._next_frame_index)
         frame = Frame(img)
 
         if self.is_heterogenous:
@@ -124,6 +261,43 @@ class FolderJpgFrameStream(FrameStream):
         
         return frame
 
+    def read_batch(self, start: int, count: int) -> np.ndarray:
+        """
+        Decodes up to count frames starting at the given frame in parallel
+        (OpenCV releases the GIL while decoding) into one contiguous
+        (count, H, W, 3) array. Fewer frames are returned at the end.
+        """
+        if not self.is_heterogenous:
+            raise Exception("Heterogenous stream cannot be read in batches")
+
+        frame_indices = []
+        for frame_index in range(start, start + count):
+            if not self._has_frame(frame_index):
+                break
+            frame_indices.append(frame_index)
+
+        frames = np.empty(
+            (len(frame_indices), self.height, self.width, 3),
+            dtype=np.uint8
+        )
+
+        def decode(i: int):
+            img = self._decode_frame(frame_indices[i])
+            if img is None or img.shape != frames.shape[1:]:
+                raise Exception(
+                    "The loaded frame does not match the stream resolution"
+                )
+            frames[i] = img
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.decoding_threads
+            )
+        # list() re-raises decoding exceptions
+        list(self._executor.map(decode, range(len(frame_indices))))
+
+        return frames
+
     def write_frame(
         self,
         frame: Frame,
@@ -139,14 +313,33 @@ class FolderJpgFrameStream(FrameStream):
         if seek_to is not None:
             self.seek(seek_to)
         
-        cv2.imwrite(
-            self._frame_path(self._next_frame_index),
-            frame.img
+        success, jpg = cv2.imencode(".jpg", frame.img)
+        if not success:
+            raise Exception("Encoding of the frame failed.")
+        data = jpg.tobytes()
+        self._frame_path(self._next_frame_index).write_bytes(data)
+
+        entry = (
+            len(data),
+            zlib.crc32(data) if self.store_checksums else None
         )
+        self._pending_entries[self._next_frame_index] = entry
+        if self._frame_sizes is not None:
+            self._set_manifest_entries({self._next_frame_index: entry})
         
         if advance_pointer:
             self._next_frame_index += 1
     
+    def close(self):
+        """
+        Writes the manifest and stops the batch decoding threads.
+        The stream may still be used afterwards.
+        """
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
     def __iter__(self):
         self.seek(0)
         return self
@@ -160,6 +353,10 @@ class FolderJpgFrameStream(FrameStream):
         return frame
     
     def __len__(self) -> int:
+        if self._frame_sizes is not None:
+            return self._frame_count
+
+        # folders written before the manifest existed
         frame_files = glob.glob(
             pathname="frame_*.jpg",
             root_dir=self._folder_path
@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+import ffmpeg
+
+
+@dataclass
+class FrameIndex:
+    """
+    Sidecar index of a video file, holding the presentation timestamp
+    of every frame and the indices of frames that are keyframes.
+    It is built once per video file (by probing its packets, without
+    decoding) and lets readers jump close to any frame without decoding
+    the video from its beginning.
+    """
+
+    frame_timestamps: np.ndarray
+    "Presentation timestamp of each frame in seconds, float64, sorted"
+
+    keyframe_indices: np.ndarray
+    "Indices of frames that are keyframes, int64, sorted, starts with 0"
+
+    file_size_bytes: int
+    "Size of the indexed file, used to detect that the index is stale"
+
+    file_modified_time: float
+    "Modification time of the indexed file, used to detect a stale index"
+
+    def __post_init__(self):
+        assert str(self.frame_timestamps.dtype) == "float64"
+        assert str(self.keyframe_indices.dtype) == "int64"
+        assert len(self.frame_timestamps.shape) == 1
+        assert len(self.keyframe_indices.shape) == 1
+
+    def __len__(self) -> int:
+        return self.frame_timestamps.shape[0]
+
+    def keyframe_for(self, frame_index: int) -> int:
+        """Index of the last keyframe at or before the given frame"""
+        if frame_index < 0 or frame_index >= len(self):
+            raise IndexError("Frame index is out of the video range")
+        position = np.searchsorted(
+            self.keyframe_indices, frame_index, side="right"
+        ) - 1
+        if position < 0:
+            return 0 # the first frame is always decodable
+        return int(self.keyframe_indices[position])
+
+    def is_valid_for(self, video_file: Path) -> bool:
+        """True if the index was built for the current version of the file"""
+        if not video_file.is_file():
+            return False
+        stat = video_file.stat()
+        return stat.st_size == self.file_size_bytes \
+            and stat.st_mtime == self.file_modified_time
+
+    @staticmethod
+    def build(video_file: Path) -> "FrameIndex":
+        """Builds the index by reading packet metadata of the video stream"""
+        stat = video_file.stat()
+        probe = ffmpeg.probe(
+            str(video_file),
+            select_streams="v:0",
+            show_entries="packet=pts_time,flags"
+        )
+
+        # packets come in the decoding order, frames are indexed
+        # in the presentation order
+        packets = [
+            p for p in probe.get("packets", [])
+            if p.get("pts_time") not in [None, "N/A"]
+        ]
+        timestamps = np.array(
+            [float(p["pts_time"]) for p in packets], dtype=np.float64
+        )
+        is_keyframe = np.array(
+            ["K" in p.get("flags", "") for p in packets], dtype=np.bool_
+        )
+        order = np.argsort(timestamps, kind="stable")
+        timestamps = timestamps[order]
+        keyframe_indices = np.nonzero(is_keyframe[order])[0].astype(np.int64)
+
+        return FrameIndex(
+            frame_timestamps=timestamps,
+            keyframe_indices=keyframe_indices,
+            file_size_bytes=stat.st_size,
+            file_modified_time=stat.st_mtime
+        )
+
+    def save(self, index_file: Path):
+        with open(index_file, "wb") as file:
+            np.savez(
+                file,
+                frame_timestamps=self.frame_timestamps,
+                keyframe_indices=self.keyframe_indices,
+                file_size_bytes=self.file_size_bytes,
+                file_modified_time=self.file_modified_time
+            )
+
+    @staticmethod
+    def load(index_file: Path) -> "FrameIndex":
+        with open(index_file, "rb") as file:
+            data = np.load(file)
+            return FrameIndex(
+                frame_timestamps=data["frame_timestamps"],
+                keyframe_indices=data["keyframe_indices"],
+                file_size_bytes=int(data["file_size_bytes"]),
+                file_modified_time=float(data["file_modified_time"])
+            )
+
+    @staticmethod
+    def load_or_build(video_file: Path, index_file: Path) -> "FrameIndex":
+        """Loads the sidecar index, (re)building it if missing or stale"""
+        if index_file.is_file():
+            index = FrameIndex.load(index_file)
+            if index.is_valid_for(video_file):
+                return index
+
+        index = FrameIndex.build(video_file)
+        index.save(index_file)
+        return index
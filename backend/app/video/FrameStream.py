@@ -1,4 +1,5 @@
 from .Frame import Frame
+import numpy as np
 import abc
 
 
@@ -28,3 +29,16 @@ class FrameStream(abc.ABC):
     @abc.abstractmethod
     def __next__(self) -> Frame:
         raise NotImplementedError
+
+    def read_into(self, img: np.ndarray) -> bool:
+        """
+        Reads the next frame into the given preallocated [H, W, BGR] array.
+        Returns False at the end of the stream. Streams that can decode
+        directly into the array override this to avoid the copy.
+        """
+        try:
+            frame = next(self)
+        except StopIteration:
+            return False
+        np.copyto(img, frame.img)
+        return True
@@ -1,5 +1,5 @@
 from .FrameStream import FrameStream
-from .InMemoryFrameStream import InMemoryFrameStream
+from .ArrayFrameStream import ArrayFrameStream, FrameBufferPool
 from typing import Optional
 
 
@@ -9,6 +9,7 @@ class FrameStreamChunker:
         self,
         in_stream: FrameStream,
         target_clip_length_seconds=10.0,
+        reused_buffer_count=0
     ):
         self.in_stream = in_stream
         "The input stream of frames"
@@ -20,31 +21,66 @@ class FrameStreamChunker:
             self.target_clip_length_seconds * self.in_stream.framerate
         )
         "The maximum length of the clip in frames"
+
+        self.buffer_pool: Optional[FrameBufferPool] = None
+        """
+        Pool of chunk buffers to reuse, present if reused_buffer_count > 0,
+        the consumer then has to release() each chunk when done with it
+        """
+        if reused_buffer_count > 0:
+            self.buffer_pool = FrameBufferPool(
+                capacity=self.target_clip_frame_count,
+                width=self.in_stream.width,
+                height=self.in_stream.height,
+                max_retained_buffers=reused_buffer_count
+            )
+
+        self._next_batch_start = 0
     
-    def get_next_clip(self) -> Optional[InMemoryFrameStream]:
+    def get_next_clip(self) -> Optional[ArrayFrameStream]:
         """Slices off a new clip from the input frame stream"""
-        out_stream = InMemoryFrameStream(
-            framerate=self.in_stream.framerate,
-            width=self.in_stream.width,
-            height=self.in_stream.height
-        )
+        # streams with random access to frame ranges are read in batches,
+        # starting from their first frame
+        if hasattr(self.in_stream, "read_batch"):
+            return self._get_next_batch()
+
+        if self.buffer_pool is not None:
+            out_stream = self.buffer_pool.create_stream(self.in_stream.framerate)
+        else:
+            out_stream = ArrayFrameStream.allocate(
+                framerate=self.in_stream.framerate,
+                width=self.in_stream.width,
+                height=self.in_stream.height,
+                capacity=self.target_clip_frame_count
+            )
 
-        for _ in range(self.target_clip_frame_count):
-            try:
-                frame = next(self.in_stream)
-            except StopIteration:
-                break
-            out_stream.write_frame(frame)
+        out_stream.fill_from(self.in_stream, self.target_clip_frame_count)
         
         if len(out_stream) == 0:
+            out_stream.release()
             return None
         
+        out_stream.seek(0)
         return out_stream
     
+    def _get_next_batch(self) -> Optional[ArrayFrameStream]:
+        frames = self.in_stream.read_batch(
+            self._next_batch_start,
+            self.target_clip_frame_count
+        )
+        if frames.shape[0] == 0:
+            return None
+        self._next_batch_start += frames.shape[0]
+        return ArrayFrameStream(
+            framerate=self.in_stream.framerate,
+            buffer=frames,
+            frame_count=frames.shape[0]
+        )
+    
     def __iter__(self):
         return self
     
-    def __next__(self) -> InMemoryFrameStream:
+    def __next__(self) -> ArrayFrameStream:
         out_stream = self.get_next_clip()
         
         if out_stream is None:
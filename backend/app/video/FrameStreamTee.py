@@ -0,0 +1,75 @@
+from .FrameStream import FrameStream
+from .Frame import Frame
+from typing import List
+import abc
+import logging
+
+
+class FrameConsumer(abc.ABC):
+    """Receives frames from a FrameStreamTee"""
+
+    def start(self, framerate: float, width: int, height: int):
+        """Called before the first frame is consumed"""
+        pass
+
+    @abc.abstractmethod
+    def consume(self, frame: Frame):
+        """Processes the next frame of the stream"""
+        raise NotImplementedError
+
+    def finish(self):
+        """Called after the last frame has been consumed"""
+        pass
+
+    def abort(self):
+        """Called instead of finish, when the tee fails midway"""
+        pass
+
+
+class FrameStreamTee:
+    """
+    Reads a frame stream exactly once and hands each frame to a list of
+    consumers, in the order in which they are given. Consumers must not
+    modify the frames they receive, as the frame is shared by all of them.
+    """
+    def __init__(
+        self,
+        in_stream: FrameStream,
+        consumers: List[FrameConsumer]
+    ):
+        self.in_stream = in_stream
+        "The input stream of frames"
+
+        self.consumers = consumers
+        "Consumers that receive each frame of the input stream"
+
+    def run(self) -> int:
+        """Pumps all frames to the consumers, returns the number of frames"""
+        for consumer in self.consumers:
+            consumer.start(
+                framerate=self.in_stream.framerate,
+                width=self.in_stream.width,
+                height=self.in_stream.height
+            )
+
+        frame_count = 0
+        finished_count = 0
+        try:
+            for frame in self.in_stream:
+                for consumer in self.consumers:
+                    consumer.consume(frame)
+                frame_count += 1
+
+            for consumer in self.consumers:
+                consumer.finish()
+                finished_count += 1
+        except:
+            # consumers that did not finish would leak their resources
+            for consumer in self.consumers[finished_count:]:
+                try:
+                    consumer.abort()
+                except Exception:
+                    logging.exception("Aborting a frame consumer failed:")
+            raise
+
+        return frame_count
@@ -0,0 +1,221 @@
+from .FrameStream import FrameStream
+from .Frame import Frame
+from .FolderJpgFrameStream import FolderJpgFrameStream
+from typing import Optional
+from pathlib import Path
+import numpy as np
+import struct
+import os
+
+
+MAGIC = b"PKFRAMES"
+VERSION = 1
+HEADER_FORMAT = "<8sIIId" # magic, version, width, height, framerate
+HEADER_SIZE = 64 # the header struct padded with zeros
+
+
+class PackedFrameStream(FrameStream):
+    """
+    Stores fixed-resolution frames in a single file as raw BGR uint8 pixels,
+    one frame after another with a fixed stride, behind a small header.
+    Frames are written with positional writes (so multiple writers can fill
+    in different frame ranges concurrently) and read through a memory map
+    (so reads, including batch reads, do not copy the pixels).
+    The number of frames is given by the file size.
+    """
+    def __init__(
+        self,
+        framerate: float,
+        width: int,
+        height: int,
+        file_path: Path,
+        writable: bool
+    ):
+        self._framerate = framerate
+        self._width = width
+        self._height = height
+
+        self._file_path = file_path
+        self._fd = os.open(
+            file_path,
+            os.O_RDWR if writable else os.O_RDONLY
+        )
+        self._memmap: Optional[np.memmap] = None
+        self._next_frame_index = 0
+
+    @staticmethod
+    def create(
+        file_path: Path,
+        framerate: float,
+        width: int,
+        height: int,
+        clear_if_exists=False
+    ) -> "PackedFrameStream":
+        """
+        Opens the file for writing, creating it if it does not exist.
+        Existing frames are kept, unless clear_if_exists is set.
+        """
+        if clear_if_exists and file_path.is_file():
+            file_path.unlink()
+
+        # the header is always the same, so (re)writing it is safe even
+        # when other writers have the file open
+        header = struct.pack(
+            HEADER_FORMAT, MAGIC, VERSION, width, height, framerate
+        ).ljust(HEADER_SIZE, b"\0")
+        fd = os.open(file_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, header, 0)
+        finally:
+            os.close(fd)
+
+        return PackedFrameStream(
+            framerate=framerate,
+            width=width,
+            height=height,
+            file_path=file_path,
+            writable=True
+        )
+
+    @staticmethod
+    def open(file_path: Path) -> "PackedFrameStream":
+        """Opens the file for reading"""
+        with open(file_path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+
+        magic, version, width, height, framerate = struct.unpack_from(
+            HEADER_FORMAT, header
+        )
+        if magic != MAGIC or version != VERSION:
+            raise Exception("The file is not a packed frame stream.")
+
+        return PackedFrameStream(
+            framerate=framerate,
+            width=width,
+            height=height,
+            file_path=file_path,
+            writable=False
+        )
+
+    @property
+    def framerate(self) -> float:
+        return self._framerate
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @property
+    def _frame_stride(self) -> int:
+        return self._width * self._height * 3
+
+    def _frame_offset(self, frame_index: int) -> int:
+        return HEADER_SIZE + frame_index * self._frame_stride
+
+    def _frames(self) -> np.ndarray:
+        """Memory-mapped (N, H, W, 3) array of all the frames in the file"""
+        frame_count = len(self)
+        if self._memmap is None or self._memmap.shape[0] != frame_count:
+            if frame_count == 0:
+                return np.empty(
+                    (0, self._height, self._width, 3), dtype=np.uint8
+                )
+            self._memmap = np.memmap(
+                self._file_path,
+                dtype=np.uint8,
+                mode="r",
+                offset=HEADER_SIZE,
+                shape=(frame_count, self._height, self._width, 3)
+            )
+        return self._memmap
+
+    def seek(self, frame_index: int):
+        self._next_frame_index = frame_index
+
+    def read_frame(self, advance_pointer=True) -> Optional[Frame]:
+        if self._next_frame_index >= len(self):
+            return None
+
+        frame = Frame(self._frames()[self._next_frame_index])
+
+        if advance_pointer:
+            self._next_frame_index += 1
+
+        return frame
+
+    def read_batch(self, start: int, count: int) -> np.ndarray:
+        """
+        Returns the (count, H, W, 3) array of frames starting at the given
+        frame, without copying. Fewer frames are returned at the end.
+        """
+        return self._frames()[start:start + count]
+
+    def write_frame(
+        self,
+        frame: Frame,
+        seek_to: Optional[int] = None,
+        advance_pointer=True,
+    ):
+        if frame.width != self.width or frame.height != self.height:
+            raise Exception(
+                "Frame resolution has to match the stream resolution"
+            )
+
+        if seek_to is not None:
+            self.seek(seek_to)
+
+        self.write_frames(self._next_frame_index, frame.img[np.newaxis])
+
+        if advance_pointer:
+            self._next_frame_index += 1
+
+    def write_frames(self, start: int, frames: np.ndarray):
+        """Writes the (N, H, W, 3) array of frames starting at the given frame"""
+        assert frames.shape[1:] == (self._height, self._width, 3)
+        assert str(frames.dtype) == "uint8"
+        os.pwrite(
+            self._fd,
+            np.ascontiguousarray(frames).data,
+            self._frame_offset(start)
+        )
+
+    def export_jpg(self, folder_path: Path) -> FolderJpgFrameStream:
+        """Exports all the frames as a folder of JPEG images"""
+        jpg_stream = FolderJpgFrameStream.create(
+            folder_path,
+            framerate=self.framerate,
+            width=self.width,
+            height=self.height,
+            clear_if_exists=True
+        )
+        for frame in self:
+            jpg_stream.write_frame(frame)
+        jpg_stream.flush()
+        return jpg_stream
+
+    def close(self):
+        """Closes the underlying file"""
+        self._memmap = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __iter__(self):
+        self.seek(0)
+        return self
+
+    def __next__(self) -> Frame:
+        frame = self.read_frame()
+
+        if frame is None:
+            raise StopIteration
+
+        return frame
+
+    def __len__(self) -> int:
+        file_size = os.fstat(self._fd).st_size
+        return max(0, file_size - HEADER_SIZE) // self._frame_stride
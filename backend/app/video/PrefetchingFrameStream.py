@@ -0,0 +1,135 @@
+from .FrameStream import FrameStream
+from .Frame import Frame
+from dataclasses import dataclass
+import threading
+import queue
+import time
+
+
+_END_OF_STREAM = object()
+
+
+@dataclass
+class PrefetchStatistics:
+    """Describes how well the decoding kept up with the consumer"""
+
+    frames_read: int = 0
+    "Number of frames handed to the consumer"
+
+    starved_reads: int = 0
+    "Number of reads where the consumer had to wait for a frame to be decoded"
+
+    starved_seconds: float = 0.0
+    "Total time the consumer spent waiting for decoding"
+
+    full_buffer_seconds: float = 0.0
+    "Total time the decoding spent waiting for the consumer to make space"
+
+    def __str__(self) -> str:
+        return (
+            f"{self.frames_read} frames read, " +
+            f"starved {self.starved_reads} times " +
+            f"for {self.starved_seconds:.2f}s in total, " +
+            f"decoding waited {self.full_buffer_seconds:.2f}s on a full buffer"
+        )
+
+
+class PrefetchingFrameStream(FrameStream):
+    """
+    Wraps a frame stream and decodes its frames ahead of time on a background
+    thread into a bounded buffer, so that the consumer's own work overlaps
+    with the decoding instead of alternating with it.
+    """
+    def __init__(self, in_stream: FrameStream, buffer_size: int = 30):
+        self.in_stream = in_stream
+        "The wrapped stream, must not be accessed by anyone else"
+
+        self.statistics = PrefetchStatistics()
+        "Queue-starvation statistics, updated as frames are read"
+
+        # read now, because the wrapped stream is used by the thread later
+        self._framerate = in_stream.framerate
+        self._width = in_stream.width
+        self._height = in_stream.height
+
+        self._buffer = queue.Queue(maxsize=buffer_size)
+        self._stop = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(
+            target=lambda: self._decode(),
+            daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def framerate(self) -> float:
+        return self._framerate
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    def _decode(self):
+        while not self._stop.is_set():
+            try:
+                item = next(self.in_stream)
+            except StopIteration:
+                item = _END_OF_STREAM
+            except Exception as e:
+                item = e # re-raised in the consumer thread
+
+            if not self._put(item):
+                return
+            if item is _END_OF_STREAM or isinstance(item, Exception):
+                return
+
+    def _put(self, item) -> bool:
+        """Puts the item into the buffer, returns False if stopped meanwhile"""
+        try:
+            self._buffer.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        wait_start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self._buffer.put(item, timeout=0.1)
+                self.statistics.full_buffer_seconds += \
+                    time.perf_counter() - wait_start
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __next__(self) -> Frame:
+        if self._finished:
+            raise StopIteration
+
+        try:
+            item = self._buffer.get_nowait()
+        except queue.Empty:
+            wait_start = time.perf_counter()
+            item = self._buffer.get()
+            self.statistics.starved_reads += 1
+            self.statistics.starved_seconds += time.perf_counter() - wait_start
+
+        if item is _END_OF_STREAM:
+            self._finished = True
+            raise StopIteration
+        if isinstance(item, Exception):
+            self._finished = True
+            raise item
+
+        self.statistics.frames_read += 1
+        return item
+
+    def close(self):
+        """Stops the background decoding"""
+        self._stop.set()
+        self._thread.join()
+        self._finished = True
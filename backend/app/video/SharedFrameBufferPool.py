@@ -0,0 +1,73 @@
+from .ArrayFrameStream import FrameBufferPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Dict
+import numpy as np
+import threading
+
+
+class SharedFrameBufferPool(FrameBufferPool):
+    """
+    Frame buffer pool with a fixed number of buffers living in shared memory,
+    so that frames can be handed over to worker processes without pickling.
+    acquire() blocks until a buffer is released if all of them are in use.
+    """
+    def __init__(
+        self,
+        capacity: int,
+        width: int,
+        height: int,
+        buffer_count: int
+    ):
+        super().__init__(
+            capacity=capacity,
+            width=width,
+            height=height,
+            max_retained_buffers=buffer_count
+        )
+
+        self._memories: List[SharedMemory] = []
+        self._memory_names: Dict[int, str] = {} # buffer address -> name
+        self._buffer_released = threading.Condition(self._lock)
+        self._closed = False
+
+        byte_size = int(np.prod(self.buffer_shape))
+        for _ in range(buffer_count):
+            memory = SharedMemory(create=True, size=max(1, byte_size))
+            buffer = np.ndarray(
+                self.buffer_shape, dtype=np.uint8, buffer=memory.buf
+            )
+            self._memories.append(memory)
+            self._memory_names[buffer.ctypes.data] = memory.name
+            self._free_buffers.append(buffer)
+
+    def acquire(self) -> np.ndarray:
+        with self._buffer_released:
+            while len(self._free_buffers) == 0:
+                self._buffer_released.wait()
+            return self._free_buffers.pop()
+
+    def release(self, buffer: np.ndarray):
+        if self._closed:
+            return
+        assert buffer.ctypes.data in self._memory_names
+        with self._buffer_released:
+            self._free_buffers.append(buffer)
+            self._buffer_released.notify()
+
+    def shared_memory_name(self, buffer: np.ndarray) -> str:
+        """Name under which other processes can attach the buffer memory"""
+        return self._memory_names[buffer.ctypes.data]
+
+    def close(self):
+        """Frees the shared memory, no buffer may be used afterwards"""
+        with self._lock:
+            self._closed = True
+            self._free_buffers.clear()
+        for memory in self._memories:
+            memory.unlink()
+            try:
+                memory.close()
+            except BufferError:
+                pass # still viewed by a frame, unmapped once garbage collected
+        self._memories.clear()
+        self._memory_names.clear()
@@ -0,0 +1,65 @@
+from .FrameStream import FrameStream
+from .FolderJpgFrameStream import FolderJpgFrameStream
+from .PackedFrameStream import PackedFrameStream
+from pathlib import Path
+import shutil
+
+
+PACKED = "packed"
+JPG = "jpg"
+CROP_STORAGE_FORMATS = [PACKED, JPG]
+
+PACKED_FILE_SUFFIX = ".frames"
+
+
+# Crops of one kind (e.g. the face) are stored either as a folder of JPEG
+# images or as a single packed file next to where that folder would be.
+# Both are identified by the folder path, so callers need not care which.
+
+
+def packed_file_for(crop_folder: Path) -> Path:
+    return crop_folder.with_suffix(PACKED_FILE_SUFFIX)
+
+
+def clear_crops(crop_folder: Path):
+    """Removes stored crops of the kind, in any of the storage formats"""
+    if crop_folder.is_dir():
+        shutil.rmtree(crop_folder)
+    packed_file = packed_file_for(crop_folder)
+    if packed_file.is_file():
+        packed_file.unlink()
+
+
+def crops_exist(crop_folder: Path) -> bool:
+    return packed_file_for(crop_folder).is_file() or crop_folder.is_dir()
+
+
+def create_crop_stream(
+    crop_folder: Path,
+    storage_format: str,
+    framerate: float,
+    size: int
+):
+    """Opens the crop storage for writing, creating it if missing"""
+    if storage_format == PACKED:
+        return PackedFrameStream.create(
+            packed_file_for(crop_folder),
+            framerate=framerate,
+            width=size, height=size
+        )
+    elif storage_format == JPG:
+        return FolderJpgFrameStream.create(
+            crop_folder,
+            framerate=framerate,
+            width=size, height=size
+        )
+    else:
+        raise Exception(f"Unknown crop storage format: {storage_format}")
+
+
+def open_crop_stream(crop_folder: Path) -> FrameStream:
+    """Opens the crop storage for reading, whichever format it is in"""
+    packed_file = packed_file_for(crop_folder)
+    if packed_file.is_file():
+        return PackedFrameStream.open(packed_file)
+    return FolderJpgFrameStream.open(crop_folder)
@@ -1,5 +1,6 @@
 import { Connection } from "./connection/Connection";
 import { ClipsCollection } from "./model/ClipsCollection";
+import { decodeGeometryBinary } from "./decodeGeometryBinary";
 import { FrameGeometry } from "./model/FrameGeometry";
 import { Video } from "./model/Video";
 import { VideoCrops } from "./model/VideoCrops";
@@ -11,6 +12,31 @@ export interface RetranslateRequest {
   prompt: string;
 }
 
+export type GeometryPart = "pose" | "right_hand" | "left_hand" | "face";
+
+export type GeometryFormat = "json" | "float16" | "float32";
+
+export interface GeometryQuery {
+  /** First frame to return (inclusive) */
+  readonly startFrame?: number;
+
+  /** Frame to stop before (exclusive), the end of the video by default */
+  readonly endFrame?: number;
+
+  /** Landmark sets to return, the others come as null, all by default */
+  readonly parts?: GeometryPart[];
+
+  /** Return only every n-th face mesh landmark */
+  readonly faceStep?: number;
+
+  /**
+   * Transfer format, the binary ones send the landmarks as typed arrays
+   * of the given precision, which is smaller and faster to decode than
+   * JSON, "json" by default
+   */
+  readonly format?: GeometryFormat;
+}
+
 export interface LogFollower {
   readonly close: () => void;
   readonly startFollowing: () => Promise<void>;
@@ -51,6 +77,10 @@ export class VideosApi {
     return this.connection.url(`videos/${id}/normalized-file`);
   }
 
+  getFrameUrl(id: string, frameIndex: number): URL {
+    return this.connection.url(`videos/${id}/frames/${frameIndex}`);
+  }
+
   getCropsUrl(id: string, cropName: string): URL {
     return this.connection.url(`videos/${id}/cropped/${cropName}`);
   }
@@ -107,10 +137,29 @@ export class VideosApi {
     return await response.blob();
   }
 
-  async getFrameGeometries(id: string): Promise<FrameGeometry[] | null> {
+  async getFrameGeometries(
+    id: string,
+    query?: GeometryQuery,
+  ): Promise<FrameGeometry[] | null> {
+    const params = new URLSearchParams();
+    if (query?.startFrame !== undefined) {
+      params.set("start", String(query.startFrame));
+    }
+    if (query?.endFrame !== undefined) {
+      params.set("end", String(query.endFrame));
+    }
+    if (query?.parts !== undefined) {
+      params.set("parts", query.parts.join(","));
+    }
+    if (query?.faceStep !== undefined) {
+      params.set("face_step", String(query.faceStep));
+    }
+    if (query?.format !== undefined) {
+      params.set("format", query.format);
+    }
     const response = await this.connection.request(
       "GET",
-      `videos/${id}/geometry`,
+      `videos/${id}/geometry?${params}`,
     );
     if (response.status === 404) {
       return null;
@@ -118,6 +167,9 @@ export class VideosApi {
     if (response.status !== 200) {
       throw response;
     }
+    if (query?.format === "float16" || query?.format === "float32") {
+      return decodeGeometryBinary(await response.arrayBuffer());
+    }
     return (await response.json()) as FrameGeometry[];
   }
 
@@ -0,0 +1,118 @@
+import { FrameGeometry } from "./model/FrameGeometry";
+
+/**
+ * Location of one array in the binary geometry encoding
+ */
+interface BinaryArrayLayout {
+  readonly dtype: "float16" | "float32" | "int32" | "uint8";
+  readonly shape: number[];
+
+  /** Byte offset from the end of the header */
+  readonly offset: number;
+}
+
+interface BinaryGeometryHeader {
+  readonly start_frame: number;
+  readonly frame_count: number;
+  readonly face_step: number;
+  readonly arrays: { [name: string]: BinaryArrayLayout };
+}
+
+function float16ToNumber(bits: number): number {
+  const sign = bits & 0x8000 ? -1 : 1;
+  const exponent = (bits >> 10) & 0x1f;
+  const fraction = bits & 0x3ff;
+  if (exponent === 0) {
+    return sign * Math.pow(2, -14) * (fraction / 1024);
+  }
+  if (exponent === 0x1f) {
+    return fraction ? NaN : sign * Infinity;
+  }
+  return sign * Math.pow(2, exponent - 15) * (1 + fraction / 1024);
+}
+
+/**
+ * Decodes the response of the geometry endpoint in the binary format
+ * (see encode_geometry_binary in the backend) into frame geometries,
+ * with the landmark sets that were not requested set to null
+ */
+export function decodeGeometryBinary(buffer: ArrayBuffer): FrameGeometry[] {
+  const headerLength = new DataView(buffer).getUint32(0, true);
+  const header: BinaryGeometryHeader = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)),
+  );
+  const dataStart = 4 + headerLength;
+
+  // the arrays are little-endian and aligned, so they are viewed
+  // in place (browsers run on little-endian machines)
+  function view(name: string): ArrayLike<number> | null {
+    const layout = header.arrays[name];
+    if (layout === undefined) return null;
+    const offset = dataStart + layout.offset;
+    const length = layout.shape.reduce((a, b) => a * b, 1);
+    switch (layout.dtype) {
+      case "float16":
+        return Array.from(new Uint16Array(buffer, offset, length), (bits) =>
+          float16ToNumber(bits),
+        );
+      case "float32":
+        return new Float32Array(buffer, offset, length);
+      case "int32":
+        return new Int32Array(buffer, offset, length);
+      case "uint8":
+        return new Uint8Array(buffer, offset, length);
+    }
+  }
+
+  function row(values: ArrayLike<number>, start: number, length: number) {
+    return Array.from({ length }, (_, i) => values[start + i]);
+  }
+
+  function landmarksOf(part: string): (i: number) => number[][] | null {
+    const layout = header.arrays[part + "_landmarks"];
+    const landmarks = view(part + "_landmarks");
+    const present = view(part + "_present");
+    if (layout === undefined || landmarks === null || present === null) {
+      return () => null;
+    }
+    const [, landmarkCount, valueCount] = layout.shape;
+    return (i) => {
+      if (!present[i]) return null;
+      const frameStart = i * landmarkCount * valueCount;
+      return Array.from({ length: landmarkCount }, (_, j) =>
+        row(landmarks, frameStart + j * valueCount, valueCount),
+      );
+    };
+  }
+
+  function bboxOf(part: string): (i: number) => number[] | null {
+    const bbox = view(part + "_bbox");
+    const present = view(part + "_bbox_present");
+    if (bbox === null || present === null) {
+      return () => null;
+    }
+    return (i) => (present[i] ? row(bbox, i * 4, 4) : null);
+  }
+
+  const signSpace = view("sign_space")!;
+  const poseLandmarks = landmarksOf("pose");
+  const rightHandLandmarks = landmarksOf("right_hand");
+  const leftHandLandmarks = landmarksOf("left_hand");
+  const faceLandmarks = landmarksOf("face");
+  const rightHandBbox = bboxOf("right_hand");
+  const leftHandBbox = bboxOf("left_hand");
+  const faceBbox = bboxOf("face");
+
+  return Array.from({ length: header.frame_count }, (_, i) => ({
+    pose_landmarks: poseLandmarks(i),
+    right_hand_landmarks: rightHandLandmarks(i),
+    left_hand_landmarks: leftHandLandmarks(i),
+    face_landmarks: faceLandmarks(i),
+
+    sign_space: row(signSpace, i * 4, 4),
+
+    right_hand_bbox: rightHandBbox(i),
+    left_hand_bbox: leftHandBbox(i),
+    face_bbox: faceBbox(i),
+  }));
+}
@@ -7,4 +7,5 @@ export interface Clip {
   readonly embedding_neighbor_tokens_mae: string[] | null;
   readonly embedding_neighbor_tokens_dino: string[] | null;
   readonly embedding_neighbor_tokens_s2v: string[] | null;
+  readonly skip_reason: string | null;
 }
@@ -2,5 +2,11 @@ import { Clip } from "./Clip";
 
 export interface ClipsCollection {
   readonly clips: Clip[];
-  readonly clip_index_lookup: number[];
+  /**
+   * The [start, end) frames that map to each clip (by the clip index),
+   * frames shared by overlapping clips belong to the later clip
+   */
+  readonly clip_frame_intervals?: [number, number][];
+  /** Clip index of each frame, stored by older versions instead */
+  readonly clip_index_lookup?: number[];
 }
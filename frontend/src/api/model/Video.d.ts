@@ -14,4 +14,5 @@ export interface Video {
   created_at: string;
   uploaded_file: VideoFile | null;
   normalized_file: VideoFile | null;
+  normalization_decision: "remuxed" | "transcoded" | null;
 }
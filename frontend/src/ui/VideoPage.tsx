@@ -49,7 +49,11 @@ export function VideoPage() {
       setNormalizedVideoBlob(
         await api.videos.getNormalizedVideoBlob(data.video.id),
       );
-      setFrameGeometries(await api.videos.getFrameGeometries(data.video.id));
+      setFrameGeometries(
+        await api.videos.getFrameGeometries(data.video.id, {
+          format: "float32",
+        }),
+      );
       setVideoCrops(await api.videos.getCrops(data.video.id));
       setClipsCollection(await api.videos.getClipsCollection(data.video.id));
     })();
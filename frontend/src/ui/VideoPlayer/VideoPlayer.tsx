@@ -36,6 +36,36 @@ function fontSizeFromTranslationLength(length: number): string {
   return String(size) + "px";
 }
 
+/**
+ * Finds the index of the clip the frame belongs to by a binary search
+ * over the clip frame intervals, returns -1 for frames outside the clips
+ */
+function clipIndexForFrame(
+  clipsCollection: ClipsCollection,
+  frameIndex: number,
+): number {
+  const intervals = clipsCollection.clip_frame_intervals;
+  if (intervals === undefined) {
+    return clipsCollection.clip_index_lookup?.[frameIndex] ?? -1;
+  }
+  if (intervals.length === 0) return -1;
+  if (frameIndex < 0 || frameIndex >= intervals[intervals.length - 1][1]) {
+    return -1;
+  }
+  // the last interval starting at or before the frame
+  let low = 0;
+  let high = intervals.length - 1;
+  while (low < high) {
+    const middle = Math.ceil((low + high) / 2);
+    if (intervals[middle][0] <= frameIndex) {
+      low = middle;
+    } else {
+      high = middle - 1;
+    }
+  }
+  return low;
+}
+
 export function VideoPlayer(props: VideoPlayerProps) {
   const videoPlayerController = useVideoPlayerController({
     videoFile: props.videoFile,
@@ -58,7 +88,8 @@ export function VideoPlayer(props: VideoPlayerProps) {
     // the rest of the function updates clip-related data
     if (props.clipsCollection === null) return;
 
-    let clipIndex = props.clipsCollection.clip_index_lookup[frameIndex];
+    let clipIndex = clipIndexForFrame(props.clipsCollection, frameIndex);
+    if (clipIndex === -1) return;
     let clip = props.clipsCollection.clips[clipIndex];
 
     // update the clip number